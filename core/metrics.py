@@ -0,0 +1,249 @@
+"""
+Per-route request metrics, exported in the Prometheus text format.
+
+MetricsMiddleware times every request and files it under the URL name that
+served it (e.g. "trips:detail"). For each route it keeps histograms of:
+
+- wall time,
+- database query count and time (an execute_wrapper on every connection the
+  request's thread uses, plus pipeline stage threads, which run inside the
+  request's context),
+- external HTTP call count and time (reported by MapsClient through
+  record_external_call()),
+- template render time (the InstrumentedDjangoTemplates backend).
+
+Histograms live in this process and are never reset, like Prometheus
+counters. Under gunicorn every worker has its own set, so a scrape of
+/metrics sees the worker that answered it; the pid label tells workers apart.
+The cost per request is a few perf_counter() calls, one extra function call
+per query and a short lock when the request finishes.
+"""
+import contextvars
+import os
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+
+# Upper bounds of the histogram buckets
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# name -> (help text, buckets, attribute of RequestStats)
+HISTOGRAMS = {
+    'request_duration_seconds': ('Wall time spent handling the request', SECONDS_BUCKETS, 'duration'),
+    'request_db_queries': ('Database queries run for the request', COUNT_BUCKETS, 'db_queries'),
+    'request_db_seconds': ('Time spent in database queries', SECONDS_BUCKETS, 'db_seconds'),
+    'request_external_calls': ('Outbound HTTP calls made for the request', COUNT_BUCKETS, 'external_calls'),
+    'request_external_seconds': ('Time spent in outbound HTTP calls', SECONDS_BUCKETS, 'external_seconds'),
+    'request_template_seconds': ('Time spent rendering templates', SECONDS_BUCKETS, 'template_seconds'),
+}
+PREFIX = 'globetrek_'
+UNRESOLVED = '<unresolved>'
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+_lock = threading.Lock()
+_histograms = {}  # (name, route) -> Histogram
+_responses = {}  # (route, status) -> count
+_started_at = time.time()
+
+
+class Histogram:
+    """Cumulative bucket counts plus sum and count, as Prometheus expects"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+
+
+class RequestStats:
+    """What one request spent, filled in by the hooks while it runs"""
+
+    def __init__(self):
+        self.duration = 0
+        self.db_queries = 0
+        self.db_seconds = 0
+        self.external_calls = 0
+        self.external_seconds = 0
+        self.template_seconds = 0
+        # Pipeline stage threads add to the same object
+        self.lock = threading.Lock()
+
+    def add(self, count_field, seconds_field, seconds):
+        with self.lock:
+            if count_field:
+                setattr(self, count_field, getattr(self, count_field) + 1)
+            setattr(self, seconds_field, getattr(self, seconds_field) + seconds)
+
+
+def _query_timer(execute, sql, params, many, context):
+    stats = _current.get()
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if stats is not None:
+            stats.add('db_queries', 'db_seconds', time.perf_counter() - started)
+
+
+@contextmanager
+def track_queries():
+    """Time queries made by this thread's connections while the block runs"""
+    if _current.get() is None:
+        yield
+        return
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(_query_timer))
+        yield
+
+
+def record_external_call(seconds):
+    """Count an outbound HTTP call against the current request, if any"""
+    stats = _current.get()
+    if stats is not None:
+        stats.add('external_calls', 'external_seconds', seconds)
+
+
+def record(route, status, stats):
+    with _lock:
+        for name, (_, buckets, field) in HISTOGRAMS.items():
+            histogram = _histograms.get((name, route))
+            if histogram is None:
+                histogram = _histograms[(name, route)] = Histogram(buckets)
+            histogram.observe(getattr(stats, field))
+        _responses[(route, status)] = _responses.get((route, status), 0) + 1
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _responses.clear()
+
+
+class MetricsMiddleware:
+    """Record per-route timings; list it first in MIDDLEWARE so the wall time covers the rest"""
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            with track_queries():
+                response = self.get_response(request)
+        finally:
+            stats.duration = time.perf_counter() - started
+            _current.reset(token)
+
+        match = getattr(request, 'resolver_match', None)
+        record(match.view_name if match else UNRESOLVED, response.status_code, stats)
+        return response
+
+
+class TimedTemplate:
+    """Wraps a backend template so its render time is added to the current request"""
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        stats = _current.get()
+        if stats is None:
+            return self.template.render(context, request)
+        started = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            stats.add(None, 'template_seconds', time.perf_counter() - started)
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, timing each top-level render"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+def _labels(**labels):
+    return ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(extra=()):
+    """The current metrics in the Prometheus text exposition format
+
+    `extra` is an iterable of (name, type, help, [(labels dict, value), ...])
+    for gauges and counters owned by other modules.
+    """
+    with _lock:
+        histograms = {key: (list(h.cumulative()), h.sum, h.count) for key, h in _histograms.items()}
+        responses = dict(_responses)
+
+    pid = os.getpid()
+    lines = [
+        f'# HELP {PREFIX}process_start_time_seconds Start time of this worker since the epoch',
+        f'# TYPE {PREFIX}process_start_time_seconds gauge',
+        f'{PREFIX}process_start_time_seconds{{{_labels(pid=pid)}}} {_started_at}',
+        f'# HELP {PREFIX}responses_total Responses by route and status code',
+        f'# TYPE {PREFIX}responses_total counter',
+    ]
+    for (route, status), count in sorted(responses.items()):
+        lines.append(f'{PREFIX}responses_total{{{_labels(pid=pid, route=route, status=status)}}} {count}')
+
+    for name, (help_text, _, _) in HISTOGRAMS.items():
+        lines.append(f'# HELP {PREFIX}{name} {help_text}')
+        lines.append(f'# TYPE {PREFIX}{name} histogram')
+        for (histogram_name, route), (buckets, total, count) in sorted(histograms.items()):
+            if histogram_name != name:
+                continue
+            for bound, cumulative in buckets:
+                labels = _labels(pid=pid, route=route, le=_number(bound))
+                lines.append(f'{PREFIX}{name}_bucket{{{labels}}} {cumulative}')
+            lines.append(f'{PREFIX}{name}_bucket{{{_labels(pid=pid, route=route, le="+Inf")}}} {count}')
+            lines.append(f'{PREFIX}{name}_sum{{{_labels(pid=pid, route=route)}}} {_number(total)}')
+            lines.append(f'{PREFIX}{name}_count{{{_labels(pid=pid, route=route)}}} {count}')
+
+    for name, kind, help_text, samples in extra:
+        lines.append(f'# HELP {PREFIX}{name} {help_text}')
+        lines.append(f'# TYPE {PREFIX}{name} {kind}')
+        for labels, value in samples:
+            lines.append(f'{PREFIX}{name}{{{_labels(pid=pid, **labels)}}} {_number(value)}')
+    return '\n'.join(lines) + '\n'
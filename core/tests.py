@@ -1,3 +1,26 @@
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from . import metrics
+
+
+class RequestMetricsTests(TestCase):
+    """/metrics reports per-route histograms, and only to staff"""
+
+    def setUp(self):
+        metrics.reset()
+        self.user = User.objects.create_user(username='planner@example.com', password='secret-pass-123')
+        self.client.force_login(self.user)
+
+    def test_staff_only(self):
+        self.assertEqual(self.client.get(reverse('core:metrics')).status_code, 403)
+
+    def test_route_histograms(self):
+        self.client.get(reverse('trips:dashboard'))
+        self.user.is_staff = True
+        self.user.save()
+        body = self.client.get(reverse('core:metrics')).content.decode()
+        self.assertIn('globetrek_request_db_queries_count{pid="', body)
+        self.assertIn('route="trips:dashboard"} 1', body)
+        self.assertIn('globetrek_request_template_seconds_sum', body)
@@ -6,4 +6,5 @@ app_name = 'core'
 urlpatterns = [
     path('', views.home, name='home'),
     path('about/', views.about, name='about'),
+    path('metrics', views.metrics, name='metrics'),  # No trailing slash: the path scrapers expect
 ]
@@ -1,6 +1,14 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.cache import never_cache
 from trips.models import TripPlan
+from trips.services import usercache
+from trips.services.maps import get_client
+from . import metrics as request_metrics
+
 
 def home(request):
     """Home page view"""
@@ -10,12 +18,55 @@ def home(request):
     }
     
     if request.user.is_authenticated:
-        user_trips = TripPlan.objects.filter(user=request.user)
-        context['user_trip_count'] = user_trips.count()
-        context['recent_trips'] = user_trips[:3]  # Last 3 trips
+        context.update(usercache.get_or_build(request.user.id, 'home', lambda: home_context(request.user)))
     
     return render(request, 'core/home.html', context)
 
+
+def home_context(user):
+    """Trip count and last 3 trips for the home page"""
+    user_trips = TripPlan.objects.filter(user=user)
+    return {
+        'user_trip_count': user_trips.count(),
+        'recent_trips': list(user_trips[:3]),  # Last 3 trips
+    }
+
+
 def about(request):
     """About page view"""
     return render(request, 'core/about.html')
+
+
+@never_cache
+def metrics(request):
+    """Prometheus scrape endpoint for this worker, for staff users or a bearer token"""
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get('Authorization', '')
+    allowed = request.user.is_staff or (token and constant_time_compare(authorization, f'Bearer {token}'))
+    if not allowed:
+        return HttpResponseForbidden('Forbidden')
+    
+    body = request_metrics.render_prometheus(extra=service_metrics())
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def service_metrics():
+    """Counters kept by the per-user cache and the Google Maps client, in render_prometheus() form"""
+    cache_stats = usercache.stats()
+    maps_stats = get_client().stats()
+    circuit_state = maps_stats.pop('circuit_state')
+    return [
+        ('user_cache_lookups_total', 'counter', 'Per-user cache lookups by section and outcome', [
+            ({'section': section, 'outcome': outcome}, counters[outcome])
+            for section, counters in sorted(cache_stats.items())
+            for outcome in ('hits', 'misses')
+        ]),
+        ('maps_calls_total', 'counter', 'Google Maps responses and local refusals by endpoint and status', [
+            ({'endpoint': endpoint, 'status': status}, count)
+            for endpoint, counters in sorted(maps_stats.items())
+            for status, count in sorted(counters['statuses'].items())
+        ]),
+        ('maps_circuit_open', 'gauge', '1 while the Google Maps circuit breaker is not closed', [
+            ({}, int(circuit_state != 'closed')),
+        ]),
+    ]
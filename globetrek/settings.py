@@ -46,6 +46,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',  # First, so its wall time covers everything below
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -59,7 +60,7 @@ ROOT_URLCONF = 'globetrek.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.metrics.InstrumentedDjangoTemplates',  # DjangoTemplates that reports render time to /metrics
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -82,6 +83,14 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # The web process and run_trip_worker write concurrently; take the
+            # write lock up front and wait for it instead of failing with
+            # "database is locked" when a read transaction tries to upgrade.
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+            'init_command': 'PRAGMA journal_mode=WAL;',
+        },
     }
 }
 
@@ -148,6 +157,107 @@ DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='')
 GOOGLE_MAPS_API_KEY = config('GOOGLE_MAPS_API_KEY', default='')
 OPENWEATHER_API_KEY = config('OPENWEATHER_API_KEY', default='')
 
+# Google Maps client
+GOOGLE_MAPS_API_BASE = config('GOOGLE_MAPS_API_BASE', default='https://maps.googleapis.com/maps/api/')
+GOOGLE_MAPS_TIMEOUTS = {  # (connect, read) seconds per endpoint
+    'default': (3.05, 5),
+    'geocode': (3.05, 5),
+    'nearbysearch': (3.05, 8),
+}
+GOOGLE_MAPS_MAX_RETRIES = config('GOOGLE_MAPS_MAX_RETRIES', default=2, cast=int)
+GOOGLE_MAPS_RETRY_BACKOFF = 0.25  # Base delay in seconds, doubled per attempt with full jitter
+GOOGLE_MAPS_POOL_SIZE = config('GOOGLE_MAPS_POOL_SIZE', default=10, cast=int)
+GOOGLE_MAPS_CIRCUIT_THRESHOLD = 5  # Consecutive failures before failing fast
+GOOGLE_MAPS_CIRCUIT_RESET = 30  # Seconds before probing Google again
+GOOGLE_MAPS_QUOTAS = {  # Shared by every process: rate in calls/second, burst is the bucket size, daily is calls per quota day
+    'geocode': {
+        'rate': config('GEOCODE_QPS', default=10, cast=float),
+        'burst': 20,
+        'daily': config('GEOCODE_DAILY_QUOTA', default=10000, cast=int),
+    },
+    'nearbysearch': {
+        'rate': config('PLACES_QPS', default=5, cast=float),
+        'burst': 10,
+        'daily': config('PLACES_DAILY_QUOTA', default=5000, cast=int),
+    },
+}
+GOOGLE_MAPS_QUOTA_WAIT = config('GOOGLE_MAPS_QUOTA_WAIT', default=2, cast=float)  # Seconds a call may wait for a token before degrading
+GOOGLE_MAPS_QUOTA_TIMEZONE = 'America/Los_Angeles'  # Google resets daily quotas at midnight Pacific time
+
+# Trip creation pipeline
+TRIP_PIPELINE_DEADLINE = config('TRIP_PIPELINE_DEADLINE', default=10, cast=float)  # Seconds for all external lookups
+TRIP_PIPELINE_WORKERS = config('TRIP_PIPELINE_WORKERS', default=8, cast=int)
+
+# Background trip jobs (processed by `python manage.py run_trip_worker`)
+# Off by default under DEBUG, so a development server works without a worker running next to it
+TRIP_ENRICHMENT_ASYNC = config('TRIP_ENRICHMENT_ASYNC', default=not DEBUG, cast=bool)
+TRIP_WORKER_CONCURRENCY = config('TRIP_WORKER_CONCURRENCY', default=2, cast=int)
+TRIP_JOB_MAX_ATTEMPTS = 3
+TRIP_JOB_RETRY_DELAY = 30  # Seconds, doubled after every failed attempt
+TRIP_JOB_LEASE = 300  # Seconds before a running job with a silent worker is re-queued
+TRIP_JOB_HEARTBEAT = 60  # Seconds between lease renewals of a running job, and between sweeps for stale ones
+
+# Itinerary PDFs, kept outside MEDIA_ROOT so every download goes through the owner check in the view
+TRIP_PDF_ROOT = config('TRIP_PDF_ROOT', default=str(BASE_DIR / 'var' / 'itineraries'))
+TRIP_PDF_ASYNC = config('TRIP_PDF_ASYNC', default=not DEBUG, cast=bool)  # Render in run_trip_worker instead of the request
+TRIP_PDF_WORKERS = config('TRIP_PDF_WORKERS', default=1, cast=int)  # Render processes per web/worker process
+TRIP_PDF_RENDER_TIMEOUT = 120  # Seconds
+TRIP_PDF_TEMPLATE_VERSION = '1'  # Bump when itinerary_pdf.html changes so stored PDFs are rendered again
+
+# Geocoding and Places providers, asked in order until one answers: google, offline (the Destination table),
+# fixture (made-up stable answers, no network), or dotted paths to GeoProvider subclasses
+GEO_PROVIDERS = config('GEO_PROVIDERS', default='offline,google').split(',')
+
+# Geocoding cache
+GEOCODE_CACHE_TTL = config('GEOCODE_CACHE_TTL', default=60 * 60 * 24 * 30, cast=int)  # 30 days
+GEOCODE_NEGATIVE_CACHE_TTL = config('GEOCODE_NEGATIVE_CACHE_TTL', default=60 * 60 * 24, cast=int)  # 1 day for ZERO_RESULTS
+GEOCODE_LRU_SIZE = config('GEOCODE_LRU_SIZE', default=2048, cast=int)
+GEOCODE_REVERSE_PRECISION = 3  # Decimal places of lat/lng used as the reverse-geocode key (~110m)
+
+# Destination autocomplete index
+GAZETTEER_REFRESH_INTERVAL = 60  # Seconds between checks for destinations changed by other processes
+DEPARTURE_SNAP_RADIUS_KM = config('DEPARTURE_SNAP_RADIUS_KM', default=25, cast=float)  # Max distance at which the offline provider resolves coordinates to a known destination
+
+# Places results cache, shared by all trips to the same geohash cell
+PLACES_CACHE_TTL = config('PLACES_CACHE_TTL', default=60 * 60 * 24 * 7, cast=int)  # 7 days
+PLACES_CACHE_MAX_ENTRIES = config('PLACES_CACHE_MAX_ENTRIES', default=5000, cast=int)
+PLACES_CACHE_EVICT_INTERVAL = 300  # Seconds between evictions in each process; the cap may be overshot in between
+PLACES_CACHE_PRECISION = 5  # Geohash length of a cache cell (~4.9km x 4.9km)
+PLACES_SEARCH_RADIUS = 5000  # Meters around the cell center
+
+# Cache (use a shared backend such as Redis in production so every process sees invalidations)
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='globetrek'),
+    }
+}
+
+# Dashboard
+DASHBOARD_PAGE_SIZE = config('DASHBOARD_PAGE_SIZE', default=24, cast=int)
+TRIP_PAGE_CACHE_TTL = config('TRIP_PAGE_CACHE_TTL', default=60 * 60 * 24, cast=int)  # Seconds a rendered trip detail page is kept
+TRIP_PAGE_CACHE_VERSION = '1'  # Bump when detail.html changes so browsers and the page cache drop old copies
+TRIP_ICS_CACHE_TTL = config('TRIP_ICS_CACHE_TTL', default=60 * 60 * 24 * 7, cast=int)  # Seconds a trip's calendar feed block is kept
+USER_CACHE_TTL = config('USER_CACHE_TTL', default=60 * 15, cast=int)  # Seconds a per-user dashboard/home entry lives
+
+# JSON API
+API_PAGE_SIZE = config('API_PAGE_SIZE', default=50, cast=int)
+API_MAX_PAGE_SIZE = 200
+
+# Request metrics, served at /metrics to staff users (or to scrapers sending "Authorization: Bearer <METRICS_TOKEN>")
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# run_benchmarks: stored baseline, and how much slower (0.25 = 25%) a benchmark may get before it counts as a regression
+BENCHMARK_BASELINE = config('BENCHMARK_BASELINE', default=str(BASE_DIR / 'benchmarks' / 'baseline.json'))
+BENCHMARK_THRESHOLDS = {
+    'default': config('BENCHMARK_THRESHOLD', default=0.25, cast=float),
+    # Dominated by SQLite writes, which vary more between runs
+    'generate_itinerary_1d': 0.5,
+    'generate_itinerary_7d': 0.5,
+    'generate_itinerary_30d': 0.5,
+}
+
 # Login/Logout URLs
 LOGIN_URL = '/accounts/login/'
 LOGIN_REDIRECT_URL = '/dashboard/'
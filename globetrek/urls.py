@@ -24,6 +24,7 @@ urlpatterns = [
     path('', include('core.urls')),
     path('accounts/', include('accounts.urls')),
     path('trips/', include('trips.urls')),
+    path('api/', include('trips.api_urls')),
 ]
 
 # Serve media files in development
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Destination, TripPlan, ItineraryDay, HotelSuggestion, PointOfInterest
+from .models import Destination, TripPlan, ItineraryDay, ItineraryActivity, HotelSuggestion, PointOfInterest, GeocodeCacheEntry, TripJob, PlacesCacheEntry, ApiRateBucket, ApiQuotaUsage, CalendarFeedKey
 
 @admin.register(Destination)
 class DestinationAdmin(admin.ModelAdmin):
@@ -25,8 +25,8 @@ class PointOfInterestInline(admin.TabularInline):
 
 @admin.register(TripPlan)
 class TripPlanAdmin(admin.ModelAdmin):
-    list_display = ['title', 'user', 'destination', 'start_date', 'end_date', 'days_count', 'total_budget', 'currency', 'status', 'created_at']
-    list_filter = ['status', 'currency', 'created_at', 'start_date']
+    list_display = ['title', 'user', 'destination', 'start_date', 'end_date', 'days_count', 'total_budget', 'currency', 'status', 'generation_status', 'created_at']
+    list_filter = ['status', 'generation_status', 'currency', 'created_at', 'start_date']
     search_fields = ['title', 'destination', 'user__username', 'user__email']
     readonly_fields = ['created_at', 'updated_at', 'daily_budget']
     inlines = [ItineraryDayInline, HotelSuggestionInline, PointOfInterestInline]
@@ -49,7 +49,7 @@ class TripPlanAdmin(admin.ModelAdmin):
             'fields': ('interests', 'additional_notes')
         }),
         ('Status', {
-            'fields': ('status', 'is_public')
+            'fields': ('status', 'generation_status', 'is_public')
         }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
@@ -57,12 +57,27 @@ class TripPlanAdmin(admin.ModelAdmin):
         })
     )
 
+class ItineraryActivityInline(admin.TabularInline):
+    model = ItineraryActivity
+    extra = 0
+    raw_id_fields = ['point_of_interest']
+    readonly_fields = ['created_at']
+
 @admin.register(ItineraryDay)
 class ItineraryDayAdmin(admin.ModelAdmin):
     list_display = ['trip', 'day_number', 'date', 'title', 'estimated_cost']
     list_filter = ['date', 'created_at']
     search_fields = ['trip__title', 'title']
     readonly_fields = ['created_at']
+    inlines = [ItineraryActivityInline]
+
+@admin.register(ItineraryActivity)
+class ItineraryActivityAdmin(admin.ModelAdmin):
+    list_display = ['title', 'day', 'start_time', 'duration_minutes', 'cost', 'location']
+    list_filter = ['start_time']
+    search_fields = ['title', 'location', 'day__trip__title']
+    raw_id_fields = ['day', 'point_of_interest']
+    readonly_fields = ['created_at']
 
 @admin.register(HotelSuggestion)
 class HotelSuggestionAdmin(admin.ModelAdmin):
@@ -77,3 +92,39 @@ class PointOfInterestAdmin(admin.ModelAdmin):
     list_filter = ['category', 'rating', 'created_at']
     search_fields = ['name', 'description', 'trip__title']
     readonly_fields = ['created_at']
+
+@admin.register(GeocodeCacheEntry)
+class GeocodeCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ['key', 'status', 'city', 'country', 'expires_at', 'updated_at']
+    list_filter = ['status', 'country']
+    search_fields = ['key', 'city', 'country']
+    readonly_fields = ['created_at', 'updated_at']
+
+@admin.register(TripJob)
+class TripJobAdmin(admin.ModelAdmin):
+    list_display = ['trip', 'kind', 'status', 'attempts', 'max_attempts', 'run_after', 'locked_by', 'updated_at']
+    list_filter = ['kind', 'status']
+    search_fields = ['trip__title', 'locked_by']
+    readonly_fields = ['created_at', 'updated_at']
+
+@admin.register(PlacesCacheEntry)
+class PlacesCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ['cell', 'place_type', 'hit_count', 'last_used_at', 'expires_at']
+    list_filter = ['place_type']
+    search_fields = ['cell']
+    readonly_fields = ['created_at']
+
+@admin.register(ApiRateBucket)
+class ApiRateBucketAdmin(admin.ModelAdmin):
+    list_display = ['endpoint', 'tokens', 'refilled_at']
+
+@admin.register(ApiQuotaUsage)
+class ApiQuotaUsageAdmin(admin.ModelAdmin):
+    list_display = ['day', 'endpoint', 'calls', 'throttled', 'over_quota']
+    list_filter = ['endpoint', 'day']
+
+@admin.register(CalendarFeedKey)
+class CalendarFeedKeyAdmin(admin.ModelAdmin):
+    list_display = ['user', 'rotated_at']
+    search_fields = ['user__username']
+    exclude = ['secret']
@@ -0,0 +1,210 @@
+"""
+Read-only JSON API over the signed-in user's trips.
+
+    GET /api/trips/                         trips, newest first
+    GET /api/trips/<id>/                    one trip
+    GET /api/trips/<id>/days/               itinerary days with their activities
+    GET /api/trips/<id>/hotels/             hotel suggestions
+    GET /api/trips/<id>/points-of-interest/ points of interest
+
+Lists are keyset-paginated: follow "next" (a URL with ?cursor=...) until it
+is null; ?limit= sets the page size up to API_MAX_PAGE_SIZE. Sparse
+fieldsets pick the columns returned and loaded: ?fields=title,start_date
+applies to the resource being listed, and fields[<type>]= to any type, e.g.
+fields[activity]=title,start_time. The selection is passed to .only(), so
+columns nobody asked for are never read. Trips can embed their hotels and
+points of interest with ?include=hotels,points_of_interest; every nested
+collection is one prefetch query per page, whatever the page holds.
+Responses are gzip-compressed for clients that accept it.
+"""
+from functools import wraps
+
+from django.conf import settings
+from django.db.models import Prefetch
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_GET
+
+from .models import HotelSuggestion, ItineraryActivity, ItineraryDay, PointOfInterest, TripPlan
+from .services.pagination import decode_cursor, keyset_page
+
+# Resource type -> fields a client may ask for (all of them by default)
+FIELDS = {
+    'trip': (
+        'id', 'title', 'destination', 'destination_country', 'destination_city',
+        'departure_location', 'latitude', 'longitude', 'start_date', 'end_date', 'days_count',
+        'total_budget', 'currency', 'daily_budget', 'flight_budget', 'accommodation_budget',
+        'activity_budget', 'interests', 'additional_notes', 'status', 'generation_status',
+        'created_at', 'updated_at',
+    ),
+    'day': ('id', 'day_number', 'date', 'title', 'estimated_cost', 'notes'),
+    'activity': ('id', 'start_time', 'title', 'location', 'duration_minutes', 'cost', 'point_of_interest_id'),
+    'hotel': (
+        'id', 'name', 'address', 'rating', 'price_per_night', 'latitude', 'longitude',
+        'phone', 'website', 'amenities', 'photos',
+    ),
+    'poi': (
+        'id', 'name', 'category', 'address', 'description', 'rating', 'estimated_cost',
+        'latitude', 'longitude', 'opening_hours', 'phone', 'website', 'photos',
+    ),
+}
+
+# ?include= name -> (trip relation, resource type, model)
+TRIP_INCLUDES = {
+    'hotels': ('hotel_suggestions', 'hotel', HotelSuggestion),
+    'points_of_interest': ('points_of_interest', 'poi', PointOfInterest),
+}
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def api_view(view):
+    """Signed-in, GET-only, gzip-compressed JSON view that reports ApiError as JSON"""
+    @gzip_page
+    @require_GET
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Authentication required'}, status=401)
+        try:
+            return view(request, *args, **kwargs)
+        except ApiError as e:
+            return JsonResponse({'error': str(e)}, status=e.status)
+        except Http404:
+            return JsonResponse({'error': 'Not found'}, status=404)
+    return wrapper
+
+
+def requested_fields(request, resource, primary=False):
+    """Fields of `resource` to return, from fields[resource]= (or fields= for the primary resource)"""
+    raw = request.GET.get(f'fields[{resource}]')
+    if raw is None and primary:
+        raw = request.GET.get('fields')
+    if not raw:
+        return FIELDS[resource]
+    fields = tuple(dict.fromkeys(name.strip() for name in raw.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in FIELDS[resource]]
+    if unknown:
+        raise ApiError(f'Unknown {resource} field(s): {", ".join(unknown)}')
+    return fields
+
+
+def page_size(request):
+    try:
+        limit = int(request.GET.get('limit', settings.API_PAGE_SIZE))
+    except ValueError:
+        raise ApiError('limit must be an integer')
+    return max(1, min(limit, settings.API_MAX_PAGE_SIZE))
+
+
+def serialize(instance, fields):
+    return {name: getattr(instance, name) for name in fields}
+
+
+def paginated(request, queryset, fields, ordering, descending, serializer):
+    cursor = request.GET.get('cursor')
+    # keyset_page() would quietly start over from the first page
+    if cursor and decode_cursor(queryset.model, ordering, cursor) is None:
+        raise ApiError('Invalid cursor')
+    page = keyset_page(
+        queryset,
+        cursor=cursor,
+        fields=ordering,
+        per_page=page_size(request),
+        descending=descending,
+    )
+    next_url = None
+    if page.has_next:
+        params = request.GET.copy()
+        params['cursor'] = page.next_cursor
+        next_url = request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+    return JsonResponse({'results': [serializer(item) for item in page], 'next': next_url})
+
+
+def loaded(queryset, fields, *keys):
+    """Restrict `queryset` to `fields` plus the keys needed for ordering and prefetching"""
+    return queryset.only(*dict.fromkeys((*fields, *keys)))
+
+
+def trip_queryset(request, fields):
+    """The user's trips projected to `fields`, with the requested ?include= relations prefetched"""
+    trips = loaded(TripPlan.objects.filter(user=request.user), fields, 'id', 'created_at')
+    includes = [name.strip() for name in request.GET.get('include', '').split(',') if name.strip()]
+    unknown = [name for name in includes if name not in TRIP_INCLUDES]
+    if unknown:
+        raise ApiError(f'Unknown include(s): {", ".join(unknown)}')
+
+    nested = {}
+    for name in dict.fromkeys(includes):
+        relation, resource, model = TRIP_INCLUDES[name]
+        child_fields = requested_fields(request, resource)
+        nested[name] = (relation, child_fields)
+        trips = trips.prefetch_related(
+            Prefetch(relation, queryset=loaded(model.objects.order_by('id'), child_fields, 'id', 'trip_id'))
+        )
+
+    def serializer(trip):
+        data = serialize(trip, fields)
+        for name, (relation, child_fields) in nested.items():
+            data[name] = [serialize(child, child_fields) for child in getattr(trip, relation).all()]
+        return data
+
+    return trips, serializer
+
+
+def owned_trip(request, trip_id):
+    return get_object_or_404(TripPlan.objects.only('id'), id=trip_id, user=request.user)
+
+
+@api_view
+def trip_list(request):
+    fields = requested_fields(request, 'trip', primary=True)
+    trips, serializer = trip_queryset(request, fields)
+    return paginated(request, trips, fields, ('created_at', 'id'), True, serializer)
+
+
+@api_view
+def trip_detail(request, trip_id):
+    fields = requested_fields(request, 'trip', primary=True)
+    trips, serializer = trip_queryset(request, fields)
+    return JsonResponse(serializer(get_object_or_404(trips, id=trip_id)))
+
+
+@api_view
+def trip_days(request, trip_id):
+    trip = owned_trip(request, trip_id)
+    fields = requested_fields(request, 'day', primary=True)
+    activity_fields = requested_fields(request, 'activity')
+    days = loaded(ItineraryDay.objects.filter(trip=trip), fields, 'id', 'day_number').prefetch_related(
+        Prefetch('activities', queryset=loaded(ItineraryActivity.objects.all(), activity_fields, 'id', 'day_id'))
+    )
+
+    def serializer(day):
+        return {
+            **serialize(day, fields),
+            'activities': [serialize(activity, activity_fields) for activity in day.activities.all()],
+        }
+
+    return paginated(request, days, fields, ('day_number', 'id'), False, serializer)
+
+
+def child_list(request, trip_id, resource, model):
+    trip = owned_trip(request, trip_id)
+    fields = requested_fields(request, resource, primary=True)
+    rows = loaded(model.objects.filter(trip=trip), fields, 'id')
+    return paginated(request, rows, fields, ('id',), False, lambda row: serialize(row, fields))
+
+
+@api_view
+def trip_hotels(request, trip_id):
+    return child_list(request, trip_id, 'hotel', HotelSuggestion)
+
+
+@api_view
+def trip_points_of_interest(request, trip_id):
+    return child_list(request, trip_id, 'poi', PointOfInterest)
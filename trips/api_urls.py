@@ -0,0 +1,12 @@
+from django.urls import path
+from . import api
+
+app_name = 'api'
+
+urlpatterns = [
+    path('trips/', api.trip_list, name='trips'),
+    path('trips/<int:trip_id>/', api.trip_detail, name='trip'),
+    path('trips/<int:trip_id>/days/', api.trip_days, name='trip_days'),
+    path('trips/<int:trip_id>/hotels/', api.trip_hotels, name='trip_hotels'),
+    path('trips/<int:trip_id>/points-of-interest/', api.trip_points_of_interest, name='trip_points_of_interest'),
+]
@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+
+from trips.services.jsondata import JSON_FIELDS, backfill
+
+
+class Command(BaseCommand):
+    help = 'Normalize JSON columns in small batches so they hold valid JSON of the expected shape'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            action='append',
+            choices=sorted(JSON_FIELDS),
+            help='Only this model; repeatable (default: all)',
+        )
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows read and updated per transaction')
+        parser.add_argument('--sleep', type=float, default=0.0, help='Seconds to pause between batches')
+        parser.add_argument('--start-pk', type=int, default=0, help='Resume after this primary key')
+        parser.add_argument('--dry-run', action='store_true', help='Count rows that would change without writing')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        self.verbosity = options['verbosity']
+
+        # Use the models as the database currently looks, so this works both
+        # before the JSONField migration (text columns) and after it
+        loader = MigrationExecutor(connection).loader
+        apps = loader.project_state(list(loader.applied_migrations)).apps
+
+        for model_name in options['model'] or sorted(JSON_FIELDS):
+            model = apps.get_model('trips', model_name)
+            present = {field.name for field in model._meta.get_fields()}
+            fields = {name: kind for name, kind in JSON_FIELDS[model_name].items() if name in present}
+            if not fields:
+                continue
+            self.stdout.write(f'🔧 {model_name}: {", ".join(fields)}')
+            started = time.perf_counter()
+            scanned, fixed = backfill(
+                model,
+                fields,
+                batch_size=options['batch_size'],
+                pause=options['sleep'],
+                start_pk=options['start_pk'],
+                dry_run=options['dry_run'],
+                progress=self.progress,
+            )
+            elapsed = time.perf_counter() - started
+            verb = 'would fix' if options['dry_run'] else 'fixed'
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ {model_name}: {scanned:,} rows scanned, {fixed:,} {verb} in {elapsed:.1f}s'
+            ))
+
+    def progress(self, model, last_pk, scanned, fixed):
+        if self.verbosity > 1:
+            self.stdout.write(f'  {model.__name__} up to pk {last_pk}: {scanned:,} scanned, {fixed:,} fixed')
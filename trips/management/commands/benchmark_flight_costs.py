@@ -0,0 +1,58 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from trips.models import TripPlan
+from trips.services import flights
+
+
+def random_coordinate(limit):
+    return Decimal(f'{random.uniform(-limit, limit):.6f}')
+
+
+class Command(BaseCommand):
+    help = 'Compare per-trip flight estimates with the batch API on synthetic trips (no database access)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trips', type=int, default=100000, help='Number of synthetic trips')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        trips = [
+            TripPlan(
+                departure_latitude=random_coordinate(80),
+                departure_longitude=random_coordinate(180),
+                latitude=random_coordinate(80),
+                longitude=random_coordinate(180),
+            )
+            for _ in range(options['trips'])
+        ]
+        rows = [(t.departure_latitude, t.departure_longitude, t.latitude, t.longitude) for t in trips]
+        self.stdout.write(f'✈️  Estimating flights for {len(trips):,} trips')
+
+        started = time.perf_counter()
+        expected = [(trip.calculate_flight_distance(), trip.estimate_flight_cost()) for trip in trips]
+        baseline = time.perf_counter() - started
+        self.stdout.write(f'  per-instance methods: {baseline:.3f}s')
+
+        backends = [('pure Python', False)]
+        if flights.np is not None:
+            backends.append(('NumPy', True))
+        else:
+            self.stdout.write(self.style.WARNING('  NumPy is not installed, skipping the vectorized backend'))
+
+        for label, use_numpy in backends:
+            started = time.perf_counter()
+            distances, costs = flights.batch_flight_estimates(rows, use_numpy=use_numpy)
+            elapsed = time.perf_counter() - started
+
+            mismatches = sum(
+                1 for (distance, cost), batch_distance, batch_cost in zip(expected, distances, costs)
+                if abs(distance - batch_distance) > 1e-6 or abs(cost - batch_cost) > 0.011
+            )
+            speedup = baseline / elapsed if elapsed else float('inf')
+            line = f'  batch ({label}): {elapsed:.3f}s, {speedup:.1f}x faster, {mismatches} mismatches'
+            self.stdout.write(self.style.SUCCESS(line) if not mismatches else self.style.ERROR(line))
@@ -0,0 +1,71 @@
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from trips.models import TripPlan
+from trips.services import pdf
+from trips.services.materializer import TripMaterializer
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Time itinerary PDF rendering against trip length (synthetic trips, rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            nargs='+',
+            default=[1, 7, 14, 30, 90],
+            help='Trip lengths to render',
+        )
+        parser.add_argument('--repeat', type=int, default=3, help='Renders per trip length (the median is reported)')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1 or min(options['days']) < 1:
+            raise CommandError('--days and --repeat must be at least 1')
+
+        self.stdout.write(f'🖨️  Rendering itinerary PDFs, median of {options["repeat"]} run(s)')
+        self.stdout.write(f'  {"days":>5}  {"queries":>7}  {"html":>8}  {"pdf":>8}  {"size":>9}')
+        try:
+            with transaction.atomic():
+                user = User.objects.create_user(username='pdf-benchmark@example.invalid')
+                for days in options['days']:
+                    self.benchmark(user, days, options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def benchmark(self, user, days, repeat):
+        start = date(2030, 1, 1)
+        trip = TripPlan(
+            user=user, title=f'{days} day benchmark', destination='Lisbon, Portugal',
+            start_date=start, end_date=start + timedelta(days=days - 1), days_count=days,
+            total_budget=150 * days, interests='food, culture',
+        )
+        TripMaterializer(trip).build().save()
+
+        html_times, pdf_times = [], []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                html = pdf.render_html(trip)
+                html_times.append(time.perf_counter() - started)
+
+            # In-process on purpose: this measures the render itself, not pool overhead
+            started = time.perf_counter()
+            content = pdf.html_to_pdf(html)
+            pdf_times.append(time.perf_counter() - started)
+
+        self.stdout.write(
+            f'  {days:>5}  {len(queries):>7}  {statistics.median(html_times):>7.3f}s'
+            f'  {statistics.median(pdf_times):>7.3f}s  {len(content) / 1024:>7.1f}KB'
+        )
@@ -0,0 +1,67 @@
+import sys
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from trips.services import export
+
+
+class Command(BaseCommand):
+    help = "Write a ZIP of all of a user's trips (JSON per trip, optionally PDFs) to a file or stdout"
+
+    def add_arguments(self, parser):
+        parser.add_argument('user', help='Username, email or id of the user to export')
+        parser.add_argument('--output', '-o', help='Archive path, or - for stdout (default: a dated file name)')
+        parser.add_argument(
+            '--pdfs',
+            choices=['existing', 'render'],
+            help='Include PDFs already rendered for the current trip versions, or render missing ones',
+        )
+        parser.add_argument('--chunk-size', type=int, default=100, help='Trips read per round of queries')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+        user = self.find_user(options['user'])
+        output = options['output'] or export.archive_filename(user)
+        # Progress goes to stderr so the archive can be piped from stdout
+        self.log = self.stderr if output == '-' else self.stdout
+
+        started = time.perf_counter()
+        self.trips = size = 0
+        stream = export.stream_zip(user, pdfs=options['pdfs'], chunk_size=options['chunk_size'], progress=self.progress)
+        target = sys.stdout.buffer if output == '-' else open(output, 'wb')
+        try:
+            for chunk in stream:
+                target.write(chunk)
+                size += len(chunk)
+        finally:
+            if output != '-':
+                target.close()
+
+        elapsed = time.perf_counter() - started
+        self.log.write(self.style.SUCCESS(
+            f'✅ Exported {self.trips:,} trip(s) for {user.username} to {output} ({size / 1024:,.1f}KB in {elapsed:.1f}s)'
+        ))
+
+    def find_user(self, identifier):
+        """Match the username first, then the email, then the id, so one lookup can't shadow another"""
+        user = User.objects.filter(username=identifier).first()
+        if user is not None:
+            return user
+        users = list(User.objects.filter(email__iexact=identifier)[:2])
+        if len(users) > 1:
+            raise CommandError(f'More than one user has the email "{identifier}"; give the username or id instead')
+        if users:
+            return users[0]
+        if identifier.isdigit():
+            user = User.objects.filter(pk=int(identifier)).first()
+            if user is not None:
+                return user
+        raise CommandError(f'No user matches "{identifier}"')
+
+    def progress(self, count):
+        self.trips = count
+        if count % 1000 == 0:
+            self.log.write(f'  {count:,} trips written')
@@ -0,0 +1,242 @@
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import time
+import unicodedata
+from functools import partial
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from trips.models import Destination
+from trips.services.spatial import geo_cell_for
+
+# Column layout of the GeoNames "geoname" table dumps (allCountries.txt, cities15000.txt, ...)
+GEONAMES_COLUMNS = [
+    'geonameid', 'name', 'asciiname', 'alternatenames', 'latitude', 'longitude',
+    'feature_class', 'feature_code', 'country_code', 'cc2', 'admin1_code', 'admin2_code',
+    'admin3_code', 'admin4_code', 'population', 'elevation', 'dem', 'timezone', 'modification_date',
+]
+
+UPDATE_FIELDS = ['name', 'city', 'country', 'latitude', 'longitude', 'popularity', 'geo_cell', 'updated_at']
+
+
+def open_text(path):
+    """Open a plain or gzipped text file for streaming"""
+    with open(path, 'rb') as probe:
+        gzipped = probe.read(2) == b'\x1f\x8b'
+    if gzipped:
+        return io.TextIOWrapper(gzip.open(path, 'rb'), encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+
+def normalize_name(value):
+    """NFC-normalize and collapse whitespace in a place name"""
+    value = unicodedata.normalize('NFC', value or '')
+    return re.sub(r'\s+', ' ', value).strip()
+
+
+def parse_coordinate(value):
+    try:
+        return round(float(value), 6)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_int(value):
+    try:
+        return int(value or 0)
+    except ValueError:
+        return 0
+
+
+def read_country_names(path):
+    """Map ISO codes to names from a GeoNames countryInfo.txt file"""
+    names = {}
+    with open_text(path) as handle:
+        for line in handle:
+            if line.startswith('#'):
+                continue
+            columns = line.rstrip('\n').split('\t')
+            if len(columns) > 4:
+                names[columns[0]] = columns[4]
+    return names
+
+
+def parse_geonames(columns, country_names, feature_classes, min_population):
+    """Turn one GeoNames dump line into a destination dict, or None if it is skipped"""
+    if len(columns) < len(GEONAMES_COLUMNS):
+        return None
+    row = dict(zip(GEONAMES_COLUMNS, columns))
+    if feature_classes and row['feature_class'] not in feature_classes:
+        return None
+    population = parse_int(row['population'])
+    if population < min_population:
+        return None
+    name = normalize_name(row['name'])
+    return {
+        'external_id': f"geonames:{row['geonameid']}",
+        'name': name,
+        'city': name,
+        'country': country_names.get(row['country_code'], row['country_code']),
+        'latitude': parse_coordinate(row['latitude']),
+        'longitude': parse_coordinate(row['longitude']),
+        'popularity': population,
+    }
+
+
+def parse_table(row, country_names, min_population):
+    """Turn one CSV/TSV row into a destination dict, or None if it is skipped
+
+    Recognised columns: name, city, country, latitude, longitude, popularity
+    (or population) and optionally external_id.
+    """
+    name = normalize_name(row.get('name'))
+    if not name:
+        return None
+    population = parse_int(row.get('popularity') or row.get('population'))
+    if population < min_population:
+        return None
+    country = normalize_name(row.get('country'))
+    latitude = parse_coordinate(row.get('latitude'))
+    longitude = parse_coordinate(row.get('longitude'))
+    external_id = (row.get('external_id') or '').strip()
+    if not external_id:
+        fingerprint = f'{name.casefold()}|{country.casefold()}|{latitude}|{longitude}'
+        external_id = 'csv:' + hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()[:32]
+    return {
+        'external_id': external_id,
+        'name': name,
+        'city': normalize_name(row.get('city')) or name,
+        'country': country_names.get(country, country),
+        'latitude': latitude,
+        'longitude': longitude,
+        'popularity': population,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Stream a GeoNames-style dump (optionally gzipped) into the Destination table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Dump to import (.txt, .csv, .tsv, optionally .gz)')
+        parser.add_argument(
+            '--format',
+            choices=['geonames', 'csv', 'tsv'],
+            default='geonames',
+            help='geonames: headerless GeoNames table dump; csv/tsv: file with a header row',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows upserted per transaction')
+        parser.add_argument(
+            '--country-info',
+            help='GeoNames countryInfo.txt used to turn country codes into names',
+        )
+        parser.add_argument(
+            '--feature-class',
+            action='append',
+            default=[],
+            help='Only import these GeoNames feature classes (e.g. P for populated places); repeatable',
+        )
+        parser.add_argument('--min-population', type=int, default=0, help='Skip places smaller than this')
+        parser.add_argument(
+            '--checkpoint',
+            help='File recording how many rows were committed (defaults to <path>.checkpoint)',
+        )
+        parser.add_argument('--resume', action='store_true', help='Skip rows committed by a previous run')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'File not found: {path}')
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        checkpoint_path = options['checkpoint'] or f'{path}.checkpoint'
+        skip = self.read_checkpoint(checkpoint_path, path) if options['resume'] else 0
+        country_names = read_country_names(options['country_info']) if options['country_info'] else {}
+
+        self.stdout.write(f'📥 Importing destinations from {path}')
+        if skip:
+            self.stdout.write(f'Resuming after {skip:,} rows')
+
+        consumed = imported = 0
+        batch = []
+        started = time.perf_counter()
+
+        with open_text(path) as handle:
+            if options['format'] == 'geonames':
+                records = csv.reader(handle, delimiter='\t', quoting=csv.QUOTE_NONE)
+                parse = partial(
+                    parse_geonames,
+                    country_names=country_names,
+                    feature_classes=set(options['feature_class']),
+                    min_population=options['min_population'],
+                )
+            else:
+                records = csv.DictReader(handle, delimiter=',' if options['format'] == 'csv' else '\t')
+                parse = partial(parse_table, country_names=country_names, min_population=options['min_population'])
+
+            # The checkpoint counts source rows, imported or not, so rows are counted before parsing
+            for record in records:
+                consumed += 1
+                if consumed <= skip:
+                    continue
+                row = parse(record)
+                if row is None:
+                    continue
+                # bulk_create skips save(), so fill in the spatial cell here
+                batch.append(Destination(geo_cell=geo_cell_for(row['latitude'], row['longitude']), **row))
+                if len(batch) >= batch_size:
+                    imported += self.flush(batch)
+                    batch = []
+                    self.write_checkpoint(checkpoint_path, path, consumed)
+                    self.report(consumed - skip, imported, started)
+
+            if batch:
+                imported += self.flush(batch)
+            self.write_checkpoint(checkpoint_path, path, consumed)
+
+        elapsed = time.perf_counter() - started
+        rate = (consumed - skip) / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Upserted {imported:,} destinations from {consumed - skip:,} rows in {elapsed:.1f}s ({rate:,.0f} rows/sec)'
+        ))
+
+    def flush(self, batch):
+        # Rows can repeat inside one batch; keep the last one per key
+        unique = list({destination.external_id: destination for destination in batch}.values())
+        with transaction.atomic():
+            Destination.objects.bulk_create(
+                unique,
+                update_conflicts=True,
+                unique_fields=['external_id'],
+                update_fields=UPDATE_FIELDS,
+            )
+        return len(unique)
+
+    def report(self, rows, imported, started):
+        elapsed = time.perf_counter() - started
+        rate = rows / elapsed if elapsed else 0
+        self.stdout.write(f'  {rows:,} rows read, {imported:,} upserted, {rate:,.0f} rows/sec')
+        self.stdout.flush()
+
+    def read_checkpoint(self, checkpoint_path, path):
+        try:
+            with open(checkpoint_path) as handle:
+                checkpoint = json.load(handle)
+        except (OSError, ValueError):
+            return 0
+        if checkpoint.get('path') != os.path.abspath(path):
+            raise CommandError(f'{checkpoint_path} belongs to {checkpoint.get("path")}, not {path}')
+        return checkpoint.get('rows', 0)
+
+    def write_checkpoint(self, checkpoint_path, path, rows):
+        temporary = f'{checkpoint_path}.tmp'
+        with open(temporary, 'w') as handle:
+            json.dump({'path': os.path.abspath(path), 'rows': rows}, handle)
+        os.replace(temporary, checkpoint_path)
@@ -0,0 +1,155 @@
+import json
+import secrets
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from trips.models import TripJob
+from trips.services import loadtest
+from trips.services.maps import reset_client
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulate concurrent users logging in, creating trips and browsing them, against a local stub of '
+        'the Google Geocoding and Places APIs; reports throughput and p50/p95/p99 per route'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Concurrent simulated users')
+        parser.add_argument('--duration', type=float, default=30, help='Seconds to run (0: until --iterations are done)')
+        parser.add_argument('--iterations', type=int, default=0, help='Trips each user creates before stopping (0: no limit)')
+        parser.add_argument('--reads', type=int, default=2, help='Dashboard and detail views per trip created')
+        parser.add_argument('--think-time', type=float, default=0, help='Mean seconds a user pauses between requests')
+        parser.add_argument('--destinations', type=int, default=20, help='Distinct destinations to pick from (fewer means more cache hits)')
+        parser.add_argument('--latency', type=float, default=80, help='Mean stub response time in milliseconds')
+        parser.add_argument('--jitter', type=float, default=30, help='Standard deviation of the stub response time in milliseconds')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Share of stub calls answered with HTTP 500')
+        parser.add_argument('--stub-port', type=int, default=0, help='Port for the Google stub (default: any free port)')
+        parser.add_argument(
+            '--job-workers',
+            type=int,
+            default=settings.TRIP_WORKER_CONCURRENCY,
+            help='In-process trip workers generating queued itineraries (0 if a run_trip_worker is already running)',
+        )
+        parser.add_argument(
+            '--target',
+            help='Drive an already running server at this URL instead of an in-process one; it must use the same '
+                 'database and have GOOGLE_MAPS_API_BASE set to the stub URL printed at start-up',
+        )
+        parser.add_argument('--keep-data', action='store_true', help="Don't delete the simulated users and their trips afterwards")
+        parser.add_argument('--json', dest='json_path', help='Also write the report as JSON to this path, or - for stdout')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError('--users must be at least 1')
+        if not options['duration'] and not options['iterations']:
+            raise CommandError('Give a --duration, --iterations, or both')
+        if not 0 <= options['error_rate'] <= 1:
+            raise CommandError('--error-rate must be between 0 and 1')
+        self.log = self.stderr if options['json_path'] == '-' else self.stdout
+
+        run_id = secrets.token_hex(3)
+        prefix = f'loadtest-{run_id}-'
+        password = secrets.token_urlsafe(12)
+        destinations = [f'Loadtest City {run_id}-{n}, Stubland' for n in range(max(1, options['destinations']))]
+
+        stub = loadtest.StubGoogleServer(
+            port=options['stub_port'],
+            latency=options['latency'] / 1000,
+            jitter=options['jitter'] / 1000,
+            error_rate=options['error_rate'],
+        ).start()
+        self.log.write(f'🧪 Google stub at {stub.base_url} ({options["latency"]:.0f}±{options["jitter"]:.0f}ms, {options["error_rate"]:.0%} errors)')
+
+        # The stub must not count against the real daily quotas; the app and
+        # the workers of this process get a MapsClient built for the stub
+        overrides = override_settings(
+            GOOGLE_MAPS_API_BASE=stub.base_url,
+            GOOGLE_MAPS_API_KEY=settings.GOOGLE_MAPS_API_KEY or 'load-test',
+            GOOGLE_MAPS_QUOTAS={},
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, '127.0.0.1'],
+        )
+        overrides.enable()
+        reset_client()
+        server = workers = None
+        try:
+            emails = loadtest.create_users(prefix, options['users'], password)
+            if options['target']:
+                base_url = options['target'].rstrip('/')
+            else:
+                server = loadtest.LiveServer().start()
+                base_url = server.url
+            if settings.TRIP_ENRICHMENT_ASYNC and options['job_workers'] > 0:
+                workers = loadtest.JobWorkers(options['job_workers']).start()
+
+            self.log.write(
+                f'🚦 {options["users"]} user(s) against {base_url} for '
+                + (f'{options["duration"]:g}s' if options['duration'] else f'{options["iterations"]} trip(s) each')
+            )
+            stats, elapsed = loadtest.run(
+                base_url, emails, password, destinations,
+                duration=options['duration'],
+                iterations=options['iterations'],
+                reads=options['reads'],
+                think_time=options['think_time'],
+            )
+        finally:
+            if workers:
+                workers.stop()
+            if server:
+                server.stop()
+            stub.stop()
+            overrides.disable()
+            reset_client()
+
+        report = {
+            'users': options['users'],
+            'elapsed': elapsed,
+            'routes': stats.summary(elapsed),
+            'stub': {'calls': dict(stub.calls), 'errors': dict(stub.errors)},
+            'jobs': self.job_report(prefix, workers),
+        }
+        if not options['keep_data']:
+            loadtest.delete_users(prefix)
+
+        self.print_report(report)
+        if options['json_path']:
+            text = json.dumps(report, indent=2) + '\n'
+            if options['json_path'] == '-':
+                self.stdout.write(text, ending='')
+            else:
+                with open(options['json_path'], 'w') as f:
+                    f.write(text)
+
+    def job_report(self, prefix, workers):
+        queued = TripJob.objects.filter(trip__user__username__startswith=prefix)
+        return {
+            'processed': workers.processed if workers else None,
+            'failed': workers.failed if workers else None,
+            'left_in_queue': queued.filter(status__in=['queued', 'running']).count(),
+        }
+
+    def print_report(self, report):
+        routes = report['routes']
+        total = sum(route['requests'] for route in routes.values())
+        self.log.write(f'\n📈 {total:,} requests in {report["elapsed"]:.1f}s ({total / report["elapsed"]:.1f} req/s)')
+        self.log.write(f'  {"route":<24}{"requests":>9}{"errors":>8}{"req/s":>8}{"p50":>9}{"p95":>9}{"p99":>9}{"max":>9}')
+        for name, route in routes.items():
+            line = (
+                f'  {name:<24}{route["requests"]:>9,}{route["errors"]:>8,}{route["throughput"]:>8.1f}'
+                + ''.join(f'{route[key] * 1000:>7.0f}ms' for key in ('p50', 'p95', 'p99', 'max'))
+            )
+            self.log.write(self.style.ERROR(line) if route['errors'] else line)
+            if route['errors']:
+                self.log.write(f'    statuses: {", ".join(f"{k}: {v}" for k, v in route["statuses"].items())}')
+
+        stub = report['stub']
+        calls = ', '.join(f'{endpoint} {count:,}' for endpoint, count in sorted(stub['calls'].items())) or 'none'
+        self.log.write(f'  Google stub calls: {calls} ({sum(stub["errors"].values()):,} injected errors)')
+        jobs = report['jobs']
+        if jobs['processed'] is not None:
+            self.log.write(
+                f'  Trip jobs: {jobs["processed"]:,} processed, {jobs["failed"]:,} failed, {jobs["left_in_queue"]:,} still queued'
+            )
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from trips.services.quota import usage_report
+
+
+class Command(BaseCommand):
+    help = 'Show Google Maps calls per endpoint per quota day, with throttled and over-quota refusals'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help='Number of quota days to show')
+
+    def handle(self, *args, **options):
+        report = usage_report(options['days'])
+        if not report:
+            self.stdout.write('No Google Maps calls recorded')
+            return
+
+        self.stdout.write(f'{"day":<12}{"endpoint":<16}{"calls":>9}{"quota":>9}{"used":>8}{"throttled":>11}{"over quota":>12}')
+        for row in report:
+            quota = f'{row["daily_quota"]:,}' if row['daily_quota'] else '-'
+            used = f'{row["used"]:.0%}' if row['used'] is not None else '-'
+            line = (
+                f'{row["day"]!s:<12}{row["endpoint"]:<16}{row["calls"]:>9,}{quota:>9}{used:>8}'
+                f'{row["throttled"]:>11,}{row["over_quota"]:>12,}'
+            )
+            if row['over_quota'] or (row['used'] or 0) >= 0.9:
+                line = self.style.WARNING(line)
+            self.stdout.write(line)
@@ -0,0 +1,139 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from trips.models import TripPlan
+from trips.services import usercache
+from trips.services.budget import BUDGET_FIELDS, split_budget
+from trips.services.flights import batch_flight_estimates
+
+LOADED_FIELDS = [
+    'id', 'user_id', 'total_budget', 'days_count',
+    'departure_latitude', 'departure_longitude', 'latitude', 'longitude',
+    *BUDGET_FIELDS,
+]
+
+
+def trips_since(since):
+    trips = TripPlan.objects.all()
+    if since:
+        trips = trips.filter(created_at__date__gte=since)
+    return trips
+
+
+def as_stored(field_name, amount):
+    """Round an allocation the way the DecimalField column will store it"""
+    field = TripPlan._meta.get_field(field_name)
+    return field.to_python(amount).quantize(Decimal(1).scaleb(-field.decimal_places))
+
+
+def recalculate_chunk(trips, dry_run):
+    """Re-run the allocation rules for a chunk of trips, writing only the ones that changed"""
+    _, costs = batch_flight_estimates(
+        (trip.departure_latitude, trip.departure_longitude, trip.latitude, trip.longitude) for trip in trips
+    )
+    now = timezone.now()
+    changed = []
+
+    for trip, cost in zip(trips, costs):
+        # Same guard as TripPlan.save()
+        if not trip.total_budget or not trip.days_count:
+            continue
+        allocation = split_budget(trip.total_budget, cost, trip.days_count)
+        if allocation is None:
+            continue
+        dirty = False
+        for field_name, amount in allocation.items():
+            value = as_stored(field_name, amount)
+            if getattr(trip, field_name) != value:
+                setattr(trip, field_name, value)
+                dirty = True
+        if dirty:
+            trip.updated_at = now
+            changed.append(trip)
+
+    if changed and not dry_run:
+        TripPlan.objects.bulk_update(changed, [*BUDGET_FIELDS, 'updated_at'])
+        # bulk_update sends no signals, so invalidate the owners' cached pages here
+        for user_id in {trip.user_id for trip in changed}:
+            usercache.bump(user_id)
+    return len(changed)
+
+
+def recalculate_range(low, high, since, batch_size, dry_run):
+    """Walk trips with low <= pk <= high in pk order; returns (scanned, changed)"""
+    trips = trips_since(since).order_by('pk').only(*LOADED_FIELDS)
+    scanned = changed = 0
+    last_pk = low - 1
+
+    while True:
+        chunk = list(trips.filter(pk__gt=last_pk, pk__lte=high)[:batch_size])
+        if not chunk:
+            break
+        last_pk = chunk[-1].pk
+        scanned += len(chunk)
+        changed += recalculate_chunk(chunk, dry_run)
+
+    connections.close_all()
+    return scanned, changed
+
+
+def split_range(low, high, parts):
+    """Split [low, high] into up to `parts` disjoint, contiguous pk ranges"""
+    size = max(1, -(-(high - low + 1) // parts))
+    return [(start, min(start + size - 1, high)) for start in range(low, high + 1, size)]
+
+
+class Command(BaseCommand):
+    help = 'Re-run budget allocation for stored trips and update only the rows whose budgets changed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report how many trips would change without writing')
+        parser.add_argument('--since', type=date.fromisoformat, help='Only trips created on or after this date (YYYY-MM-DD)')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Trips loaded and updated per query')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Worker processes, each walking its own primary key range',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        since, batch_size, dry_run = options['since'], options['batch_size'], options['dry_run']
+
+        bounds = trips_since(since).aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['low'] is None:
+            self.stdout.write('No trips to recalculate')
+            return
+
+        ranges = split_range(bounds['low'], bounds['high'], max(1, options['workers']))
+        self.stdout.write(f'💰 Recalculating budgets for trips {bounds["low"]}-{bounds["high"]} in {len(ranges)} range(s)')
+        started = time.perf_counter()
+
+        if len(ranges) == 1:
+            results = [recalculate_range(*ranges[0], since, batch_size, dry_run)]
+        else:
+            # Forked workers must not share the parent's database connection
+            connections.close_all()
+            context = multiprocessing.get_context('fork')
+            with ProcessPoolExecutor(max_workers=len(ranges), mp_context=context) as pool:
+                futures = [pool.submit(recalculate_range, low, high, since, batch_size, dry_run) for low, high in ranges]
+                results = [future.result() for future in futures]
+
+        elapsed = time.perf_counter() - started
+        scanned = sum(result[0] for result in results)
+        changed = sum(result[1] for result in results)
+        rate = scanned / elapsed if elapsed else 0
+        verb = 'Would update' if dry_run else 'Updated'
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {verb} {changed:,} of {scanned:,} trips in {elapsed:.1f}s ({rate:,.0f} rows/sec)'
+        ))
@@ -0,0 +1,121 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from trips.services import benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Time the trips hot paths and compare them with the stored baseline (fixtures are rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='Benchmarks to run, shell-style patterns allowed (default: all)')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per benchmark (the median is compared)')
+        parser.add_argument('--json', dest='json_path', help='Also write the results as JSON to this path, or - for stdout')
+        parser.add_argument('--baseline', default=settings.BENCHMARK_BASELINE, help='Baseline file to compare with')
+        parser.add_argument('--save-baseline', action='store_true', help='Store these results as the new baseline')
+        parser.add_argument(
+            '--threshold',
+            action='append',
+            default=[],
+            metavar='[NAME=]FRACTION',
+            help='Allowed slowdown before a benchmark counts as regressed, for every or one benchmark (repeatable)',
+        )
+        parser.add_argument('--list', action='store_true', help='List the benchmarks and exit')
+
+    def handle(self, *args, **options):
+        selected = benchmarks.names(options['names'])
+        if options['list']:
+            for name in selected:
+                self.stdout.write(name)
+            return
+        if not selected:
+            raise CommandError(f'No benchmark matches {" ".join(options["names"])}')
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1')
+        thresholds = self.parse_thresholds(options['threshold'])
+        # The report goes to stderr when the JSON document is written to stdout
+        self.log = self.stderr if options['json_path'] == '-' else self.stdout
+
+        self.log.write(f'⏱️  Running {len(selected)} benchmark(s), median of {options["repeat"]} run(s)')
+        self.log.write(f'  {"benchmark":<24}{"ops":>7}{"median":>12}{"min":>12}{"max":>12}')
+        results = benchmarks.run_suite(selected, repeat=options['repeat'], progress=self.progress)
+        data = benchmarks.document(results)
+
+        baseline = None
+        if not options['save_baseline'] and os.path.exists(options['baseline']):
+            try:
+                baseline = benchmarks.load_baseline(options['baseline'])
+            except ValueError as e:
+                raise CommandError(str(e))
+            data['comparison'] = benchmarks.compare(results, baseline['results'], thresholds)
+        if options['json_path']:
+            self.write_json(data, options['json_path'])
+
+        if options['save_baseline']:
+            # Keep entries for benchmarks that were not run this time
+            if os.path.exists(options['baseline']):
+                data['results'] = {**benchmarks.load_baseline(options['baseline'])['results'], **results}
+            os.makedirs(os.path.dirname(options['baseline']) or '.', exist_ok=True)
+            self.write_json({key: data[key] for key in ('format', 'recorded_at', 'environment', 'results')}, options['baseline'])
+            self.log.write(self.style.SUCCESS(f'✅ Baseline saved to {options["baseline"]}'))
+        elif baseline is None:
+            self.log.write(self.style.WARNING(f'No baseline at {options["baseline"]}; run with --save-baseline to record one'))
+        else:
+            self.report(data['comparison'], baseline)
+
+    def parse_thresholds(self, values):
+        given = {}
+        for value in values:
+            name, _, fraction = value.rpartition('=')
+            try:
+                given[name or 'default'] = float(fraction)
+            except ValueError:
+                raise CommandError(f'Invalid --threshold {value!r}, expected FRACTION or NAME=FRACTION')
+        # A bare --threshold replaces the configured ones, per-benchmark entries included
+        configured = {} if 'default' in given else settings.BENCHMARK_THRESHOLDS
+        return {**configured, **given}
+
+    def progress(self, name, result):
+        self.log.write(
+            f'  {name:<24}{result["ops"]:>7,}{format_seconds(result["median"]):>12}'
+            f'{format_seconds(result["min"]):>12}{format_seconds(result["max"]):>12}'
+        )
+
+    def report(self, comparison, baseline):
+        environment = baseline['environment']
+        self.log.write(f'\n📊 Compared with the baseline of {baseline["recorded_at"]} ({environment["machine"]})')
+        regressed = []
+        for row in comparison:
+            if row['status'] == 'new':
+                self.log.write(f'  {row["name"]:<24}{"new":>12}')
+                continue
+            line = (
+                f'  {row["name"]:<24}{format_seconds(row["baseline"]):>12} -> {format_seconds(row["median"]):<12}'
+                f'{row["ratio"] - 1:>+8.0%}  (threshold {row["threshold"]:.0%})'
+            )
+            if row['status'] == 'regressed':
+                regressed.append(row['name'])
+                line = self.style.ERROR(line)
+            elif row['status'] == 'improved':
+                line = self.style.SUCCESS(line)
+            self.log.write(line)
+        if regressed:
+            raise CommandError(f'{len(regressed)} benchmark(s) regressed: {", ".join(regressed)}')
+
+    def write_json(self, data, path):
+        text = json.dumps(data, indent=2) + '\n'
+        if path == '-':
+            self.stdout.write(text, ending='')
+            return
+        with open(path, 'w') as f:
+            f.write(text)
+
+
+def format_seconds(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('µs', 1e-6)):
+        if seconds >= scale:
+            return f'{seconds / scale:.2f}{unit}'
+    return f'{seconds / 1e-9:.0f}ns'
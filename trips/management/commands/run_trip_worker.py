@@ -0,0 +1,126 @@
+import signal
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections, connections
+
+from trips.services import jobs
+
+
+class Command(BaseCommand):
+    help = 'Process queued background trip jobs (itinerary generation, ...)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=settings.TRIP_WORKER_CONCURRENCY,
+            help='Number of jobs to run at the same time',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Seconds to wait before checking an empty queue again',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once the queue is empty instead of waiting for new jobs',
+        )
+        parser.add_argument(
+            '--max-jobs',
+            type=int,
+            default=0,
+            help='Exit after processing this many jobs (0 means no limit)',
+        )
+
+    def handle(self, *args, **options):
+        self.stop = threading.Event()
+        self.processed = 0
+        self.failed = 0
+        self.lock = threading.Lock()
+        self.options = options
+
+        signal.signal(signal.SIGTERM, lambda *_: self.stop.set())
+
+        self.requeue_stale()
+        concurrency = max(1, options['concurrency'])
+        self.stdout.write(f'Trip worker started with concurrency {concurrency}')
+
+        threads = [
+            threading.Thread(target=self.work, name=f'trip-worker-{i}', daemon=True)
+            for i in range(concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        swept = time.monotonic()
+        try:
+            while any(thread.is_alive() for thread in threads):
+                time.sleep(0.2)
+                # Pick up jobs left behind by workers that died while this one keeps running
+                if time.monotonic() - swept >= settings.TRIP_JOB_HEARTBEAT:
+                    swept = time.monotonic()
+                    self.requeue_stale()
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping after the jobs in progress...')
+            self.stop.set()
+            for thread in threads:
+                thread.join()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Processed {self.processed} job(s), {self.failed} failed')
+        )
+
+    def requeue_stale(self):
+        close_old_connections()
+        try:
+            requeued = jobs.requeue_stale()
+        except DatabaseError as e:
+            self.stdout.write(self.style.WARNING(f'Could not re-queue stale jobs: {e}'))
+            return
+        if requeued:
+            self.stdout.write(f'Re-queued {requeued} stale job(s)')
+
+    def work(self):
+        max_jobs = self.options['max_jobs']
+        try:
+            while not self.stop.is_set():
+                close_old_connections()
+                try:
+                    job = jobs.claim_next()
+                except DatabaseError as e:
+                    # e.g. SQLite "database is locked" under contention; back off and retry
+                    self.stdout.write(self.style.WARNING(f'Could not claim a job: {e}'))
+                    self.stop.wait(self.options['poll_interval'])
+                    continue
+                if job is None:
+                    if self.options['once']:
+                        return
+                    self.stop.wait(self.options['poll_interval'])
+                    continue
+
+                started = time.perf_counter()
+                try:
+                    ok = jobs.run_job(job)
+                except DatabaseError as e:
+                    # The job stays "running" and is re-queued once its lease expires
+                    self.stdout.write(self.style.WARNING(f'Could not record the outcome of {job}: {e}'))
+                    ok = False
+                elapsed = time.perf_counter() - started
+
+                with self.lock:
+                    self.processed += 1
+                    if not ok:
+                        self.failed += 1
+                    if max_jobs and self.processed >= max_jobs:
+                        self.stop.set()
+
+                if ok:
+                    self.stdout.write(f'✅ {job} in {elapsed:.2f}s')
+                else:
+                    self.stdout.write(self.style.ERROR(f'❌ {job} failed (attempt {job.attempts}/{job.max_attempts})'))
+        finally:
+            connections.close_all()
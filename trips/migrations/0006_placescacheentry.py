@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:13
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0005_tripjob_tripplan_generation_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlacesCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cell', models.CharField(help_text='Geohash of the search center', max_length=12)),
+                ('place_type', models.CharField(default='lodging', max_length=50)),
+                ('results', models.TextField(blank=True, help_text='JSON list of Places results')),
+                ('hit_count', models.IntegerField(default=0)),
+                ('expires_at', models.DateTimeField()),
+                ('last_used_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Places cache entries',
+                'unique_together': {('cell', 'place_type')},
+            },
+        ),
+    ]
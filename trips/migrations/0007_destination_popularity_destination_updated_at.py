@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:21
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0006_placescacheentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='destination',
+            name='popularity',
+            field=models.IntegerField(db_index=True, default=0, help_text='Ranking weight for destination search (e.g. population)'),
+        ),
+        migrations.AddField(
+            model_name='destination',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0007_destination_popularity_destination_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='destination',
+            name='external_id',
+            field=models.CharField(blank=True, help_text='Source identifier used for imports, e.g. geonames:2643743', max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:18
+
+from django.db import migrations, models
+
+from trips.services.spatial import geo_cell_for
+
+
+def backfill_geo_cells(apps, schema_editor):
+    for model_name in ('Destination', 'PointOfInterest'):
+        model = apps.get_model('trips', model_name)
+        rows = model.objects.filter(latitude__isnull=False, longitude__isnull=False).only('latitude', 'longitude')
+        batch = []
+        for row in rows.iterator(chunk_size=2000):
+            row.geo_cell = geo_cell_for(row.latitude, row.longitude)
+            batch.append(row)
+            if len(batch) == 2000:
+                model.objects.bulk_update(batch, ['geo_cell'])
+                batch = []
+        if batch:
+            model.objects.bulk_update(batch, ['geo_cell'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0008_destination_external_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='destination',
+            name='geo_cell',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='Geohash of the coordinates, maintained on save', max_length=12),
+        ),
+        migrations.AddField(
+            model_name='pointofinterest',
+            name='geo_cell',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='Geohash of the coordinates, maintained on save', max_length=12),
+        ),
+        migrations.RunPython(backfill_geo_cells, migrations.RunPython.noop),
+    ]
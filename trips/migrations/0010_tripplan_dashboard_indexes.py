@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0009_destination_geo_cell_pointofinterest_geo_cell'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tripplan',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='trips_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tripplan',
+            index=models.Index(fields=['user', 'status', '-created_at', '-id'], name='trips_user_status_created_idx'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+import json
+
+from django.db import migrations, transaction
+
+# Frozen copy of trips.services.jsondata as of this migration: the text columns
+# that 0012 turns into JSONFields, and the type each value must decode to.
+# Later changes to that module must not change what this migration does.
+JSON_FIELDS = {
+    'Destination': {'popular_attractions': list},
+    'ItineraryDay': {'activities': list},
+    'HotelSuggestion': {'amenities': list, 'photos': list},
+    'PointOfInterest': {'opening_hours': dict, 'photos': list},
+}
+
+BATCH_SIZE = 1000
+
+
+def normalized(text, expected):
+    """Return `text` as JSON of type `expected`, or None if it already is"""
+    try:
+        value = json.loads(text) if isinstance(text, str) and text.strip() else None
+    except json.JSONDecodeError:
+        value = None
+    if isinstance(value, expected) and isinstance(text, str):
+        return None
+    return json.dumps(value if isinstance(value, expected) else expected())
+
+
+def normalize_json_text(apps, schema_editor):
+    # Batches commit one by one (atomic = False), so a large table is never
+    # locked for the whole pass. Running `manage.py backfill_json_fields`
+    # before deploying leaves nothing to do here.
+    for model_name, fields in JSON_FIELDS.items():
+        model = apps.get_model('trips', model_name)
+        rows = model._base_manager.order_by('pk').only('pk', *fields)
+        last_pk = 0
+        while True:
+            batch = list(rows.filter(pk__gt=last_pk)[:BATCH_SIZE])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            changed = []
+            for row in batch:
+                dirty = False
+                for name, expected in fields.items():
+                    value = normalized(getattr(row, name), expected)
+                    if value is not None:
+                        setattr(row, name, value)
+                        dirty = True
+                if dirty:
+                    changed.append(row)
+            if changed:
+                with transaction.atomic():
+                    model._base_manager.bulk_update(changed, list(fields))
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('trips', '0010_tripplan_dashboard_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_json_text, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0011_normalize_json_text'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='destination',
+            name='popular_attractions',
+            field=models.JSONField(blank=True, default=list, help_text='List of popular attractions'),
+        ),
+        migrations.AlterField(
+            model_name='hotelsuggestion',
+            name='amenities',
+            field=models.JSONField(blank=True, default=list, help_text='List of amenities'),
+        ),
+        migrations.AlterField(
+            model_name='hotelsuggestion',
+            name='photos',
+            field=models.JSONField(blank=True, default=list, help_text='List of photo references'),
+        ),
+        migrations.AlterField(
+            model_name='itineraryday',
+            name='activities',
+            field=models.JSONField(default=list, help_text='List of activities for the day'),
+        ),
+        migrations.AlterField(
+            model_name='pointofinterest',
+            name='opening_hours',
+            field=models.JSONField(blank=True, default=dict, help_text='Opening hours'),
+        ),
+        migrations.AlterField(
+            model_name='pointofinterest',
+            name='photos',
+            field=models.JSONField(blank=True, default=list, help_text='List of photo references'),
+        ),
+    ]
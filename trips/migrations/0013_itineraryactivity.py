@@ -0,0 +1,111 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:32
+
+from datetime import time
+from decimal import Decimal, InvalidOperation
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+def _start_time(value):
+    try:
+        return time.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def _cost(value):
+    try:
+        return Decimal(str(value or 0)).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return Decimal('0.00')
+
+
+def _duration(value):
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+def copy_activities(apps, schema_editor):
+    """Expand every day's activities list into ItineraryActivity rows"""
+    ItineraryDay = apps.get_model('trips', 'ItineraryDay')
+    ItineraryActivity = apps.get_model('trips', 'ItineraryActivity')
+    last_pk = 0
+    while True:
+        days = list(ItineraryDay.objects.filter(pk__gt=last_pk).order_by('pk').only('pk', 'activities')[:BATCH_SIZE])
+        if not days:
+            break
+        last_pk = days[-1].pk
+        rows = [
+            ItineraryActivity(
+                day_id=day.pk,
+                start_time=_start_time(item.get('time')),
+                title=str(item.get('activity') or '')[:200],
+                location=str(item.get('location') or '')[:200],
+                duration_minutes=_duration(item.get('duration')),
+                cost=_cost(item.get('cost')),
+            )
+            for day in days
+            if isinstance(day.activities, list)
+            for item in day.activities
+            if isinstance(item, dict)
+        ]
+        ItineraryActivity.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+
+
+def copy_activities_back(apps, schema_editor):
+    ItineraryDay = apps.get_model('trips', 'ItineraryDay')
+    ItineraryActivity = apps.get_model('trips', 'ItineraryActivity')
+    activities = {}
+    for activity in ItineraryActivity.objects.order_by('day_id', 'start_time', 'pk').iterator(chunk_size=BATCH_SIZE):
+        activities.setdefault(activity.day_id, []).append({
+            'time': activity.start_time.strftime('%H:%M') if activity.start_time else '',
+            'activity': activity.title,
+            'location': activity.location,
+            'duration': activity.duration_minutes,
+            'cost': float(activity.cost),
+        })
+    days = list(ItineraryDay.objects.filter(pk__in=activities).only('pk'))
+    for day in days:
+        day.activities = activities[day.pk]
+    ItineraryDay.objects.bulk_update(days, ['activities'], batch_size=BATCH_SIZE)
+    ItineraryActivity.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0012_json_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItineraryActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_time', models.TimeField(blank=True, null=True)),
+                ('title', models.CharField(max_length=200)),
+                ('location', models.CharField(blank=True, max_length=200)),
+                ('duration_minutes', models.PositiveIntegerField(blank=True, null=True)),
+                ('cost', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                # No reverse accessor yet: ItineraryDay still has its `activities` JSON field
+                ('day', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='trips.itineraryday')),
+                ('point_of_interest', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='activities', to='trips.pointofinterest')),
+            ],
+            options={
+                'verbose_name_plural': 'Itinerary activities',
+                'ordering': ['start_time', 'id'],
+                'indexes': [models.Index(fields=['day', 'start_time'], name='trips_activity_day_time_idx')],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='itineraryday',
+            index=models.Index(fields=['date'], name='trips_day_date_idx'),
+        ),
+        migrations.RunPython(copy_activities, copy_activities_back),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0013_itineraryactivity'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='itineraryday',
+            name='activities',
+        ),
+        migrations.AlterField(
+            model_name='itineraryactivity',
+            name='day',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activities', to='trips.itineraryday'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0014_remove_itineraryday_activities'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tripjob',
+            name='kind',
+            field=models.CharField(choices=[('enrich_trip', 'Enrich Trip'), ('render_pdf', 'Render PDF')], default='enrich_trip', max_length=30),
+        ),
+    ]
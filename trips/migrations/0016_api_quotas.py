@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0015_render_pdf_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApiRateBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('endpoint', models.CharField(max_length=50, unique=True)),
+                ('tokens', models.FloatField(help_text='Tokens left at refilled_at')),
+                ('refilled_at', models.FloatField(help_text='Unix time the bucket was last refilled')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ApiQuotaUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('endpoint', models.CharField(max_length=50)),
+                ('day', models.DateField()),
+                ('calls', models.IntegerField(default=0)),
+                ('throttled', models.IntegerField(default=0, help_text='Calls dropped after waiting too long for a token')),
+                ('over_quota', models.IntegerField(default=0, help_text='Calls refused because the daily quota was used up')),
+            ],
+            options={
+                'verbose_name_plural': 'API quota usage',
+                'ordering': ['-day', 'endpoint'],
+                'unique_together': {('endpoint', 'day')},
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:15
+
+from django.db import migrations, models
+
+
+def fail_duplicate_jobs(apps, schema_editor):
+    """Keep the oldest waiting or running job of each kind per trip; the rest could never have run usefully"""
+    TripJob = apps.get_model('trips', 'TripJob')
+    seen = set()
+    duplicates = []
+    for job in TripJob.objects.filter(status__in=['queued', 'running']).order_by('id').only('id', 'trip_id', 'kind'):
+        if (job.trip_id, job.kind) in seen:
+            duplicates.append(job.id)
+        seen.add((job.trip_id, job.kind))
+    if duplicates:
+        TripJob.objects.filter(id__in=duplicates).update(status='failed', locked_by='', last_error='Duplicate job')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0016_api_quotas'),
+    ]
+
+    operations = [
+        migrations.RunPython(fail_duplicate_jobs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='tripjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['queued', 'running'])), fields=('trip', 'kind'), name='trips_job_one_active'),
+        ),
+    ]
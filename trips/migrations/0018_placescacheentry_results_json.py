@@ -0,0 +1,36 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:17
+
+import json
+
+from django.db import migrations, models
+
+
+def drop_unreadable_entries(apps, schema_editor):
+    """It's a cache: entries that don't hold a JSON list are deleted rather than repaired"""
+    PlacesCacheEntry = apps.get_model('trips', 'PlacesCacheEntry')
+    unreadable = []
+    for entry in PlacesCacheEntry.objects.only('id', 'results').iterator(chunk_size=500):
+        try:
+            if isinstance(json.loads(entry.results), list):
+                continue
+        except ValueError:
+            pass
+        unreadable.append(entry.id)
+    for start in range(0, len(unreadable), 500):
+        PlacesCacheEntry.objects.filter(id__in=unreadable[start:start + 500]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0017_tripjob_one_active'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_unreadable_entries, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='placescacheentry',
+            name='results',
+            field=models.JSONField(blank=True, default=list, help_text='List of Places results'),
+        ),
+    ]
@@ -1,32 +1,60 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
-import json
+from decimal import Decimal
+from django.db.models import Sum, Value
+from django.db.models.functions import Coalesce
+
+from .services.budget import split_budget
+from .services.flights import flight_cost
+from .services.geo import haversine_km
+from .services.spatial import SpatialQuerySet, geo_cell_for
+
+def cost_rollup(path):
+    """SQL expression summing an activity cost column, 0 when there are no activities"""
+    return Coalesce(Sum(path), Value(Decimal('0.00')), output_field=models.DecimalField(max_digits=12, decimal_places=2))
 
 class Destination(models.Model):
     """Pre-populated destinations for better performance"""
+    external_id = models.CharField(max_length=64, unique=True, null=True, blank=True, help_text="Source identifier used for imports, e.g. geonames:2643743")
     name = models.CharField(max_length=200)
     country = models.CharField(max_length=100)
     city = models.CharField(max_length=100)
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     description = models.TextField(blank=True)
-    popular_attractions = models.TextField(help_text="JSON list of popular attractions", blank=True)
+    popular_attractions = models.JSONField(default=list, blank=True, help_text="List of popular attractions")
     average_daily_cost = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     best_time_to_visit = models.CharField(max_length=100, blank=True)
+    popularity = models.IntegerField(default=0, db_index=True, help_text="Ranking weight for destination search (e.g. population)")
+    geo_cell = models.CharField(max_length=12, blank=True, db_index=True, editable=False, help_text="Geohash of the coordinates, maintained on save")
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    
+    objects = SpatialQuerySet.as_manager()
     
     def __str__(self):
         return f"{self.name}, {self.country}"
     
+    def save(self, *args, **kwargs):
+        self.geo_cell = geo_cell_for(self.latitude, self.longitude)
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'geo_cell'}
+        super().save(*args, **kwargs)
+    
     def get_popular_attractions(self):
         """Return popular attractions as a list"""
-        if self.popular_attractions:
-            try:
-                return json.loads(self.popular_attractions)
-            except json.JSONDecodeError:
-                return []
-        return []
+        return self.popular_attractions if isinstance(self.popular_attractions, list) else []
+
+class TripPlanQuerySet(models.QuerySet):
+    def with_planned_cost(self):
+        """Annotate each trip with planned_cost, the summed cost of all its itinerary activities"""
+        return self.annotate(planned_cost=cost_rollup('itinerary_days__activities__cost'))
+
+class ItineraryDayQuerySet(models.QuerySet):
+    def with_planned_cost(self):
+        """Annotate each day with planned_cost, the summed cost of its activities"""
+        return self.annotate(planned_cost=cost_rollup('activities__cost'))
 
 class TripPlan(models.Model):
     """Main trip plan model"""
@@ -48,6 +76,13 @@ class TripPlan(models.Model):
         ('cancelled', 'Cancelled'),
     ]
     
+    GENERATION_STATUS = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
+    
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     title = models.CharField(max_length=200)
     
@@ -83,13 +118,21 @@ class TripPlan(models.Model):
     additional_notes = models.TextField(blank=True)
     
     status = models.CharField(max_length=20, choices=TRIP_STATUS, default='draft')
+    generation_status = models.CharField(max_length=20, choices=GENERATION_STATUS, default='ready', help_text="Progress of the background itinerary generation")
     is_public = models.BooleanField(default=False)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = TripPlanQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Dashboard keyset pagination, with and without a status filter
+            models.Index(fields=['user', '-created_at', '-id'], name='trips_user_created_idx'),
+            models.Index(fields=['user', 'status', '-created_at', '-id'], name='trips_user_status_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.departure_location} to {self.destination}"
@@ -100,81 +143,34 @@ class TripPlan(models.Model):
             return [interest.strip() for interest in self.interests.split(',')]
         return []
     
+    def planned_cost(self):
+        """Total cost of the trip's itinerary activities, summed in the database"""
+        return ItineraryActivity.objects.filter(day__trip=self).aggregate(total=cost_rollup('cost'))['total']
+    
     def calculate_flight_distance(self):
         """Calculate distance between departure and destination in kilometers"""
         if (self.departure_latitude and self.departure_longitude and 
             self.latitude and self.longitude):
-            import math
-            
-            # Convert latitude and longitude from degrees to radians
-            lat1, lon1 = math.radians(float(self.departure_latitude)), math.radians(float(self.departure_longitude))
-            lat2, lon2 = math.radians(float(self.latitude)), math.radians(float(self.longitude))
-            
-            # Haversine formula
-            dlat = lat2 - lat1
-            dlon = lon2 - lon1
-            a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-            c = 2 * math.asin(math.sqrt(a))
-            
-            # Earth's radius in kilometers
-            r = 6371
-            
-            return c * r
+            return haversine_km(self.departure_latitude, self.departure_longitude, self.latitude, self.longitude)
         return 0
     
     def estimate_flight_cost(self):
         """Estimate flight cost based on distance and other factors"""
-        distance = self.calculate_flight_distance()
-        if distance == 0:
-            return 0
-        
-        # Basic flight cost estimation (this is a simplified model)
+        # Simplified tiered per-km model, see services.flights.FLIGHT_RATE_TIERS.
         # In reality, you'd integrate with flight APIs like Amadeus, Skyscanner, etc.
-        base_rate_per_km = 0.15  # USD per kilometer (rough estimate)
-        
-        if distance < 500:  # Domestic short flights
-            base_rate_per_km = 0.20
-        elif distance < 2000:  # Regional flights
-            base_rate_per_km = 0.15
-        elif distance < 8000:  # International flights
-            base_rate_per_km = 0.12
-        else:  # Long-haul international
-            base_rate_per_km = 0.10
-        
-        estimated_cost = distance * base_rate_per_km
-        
-        # Add seasonal and demand factors (simplified)
-        return round(estimated_cost, 2)
+        return flight_cost(self.calculate_flight_distance())
     
     def allocate_budget(self):
         """Allocate total budget across different expense categories"""
-        if self.total_budget <= 0:
+        allocation = split_budget(self.total_budget, self.estimate_flight_cost(), self.days_count)
+        if allocation is None:
             return
-        
-        # Get estimated flight cost
-        estimated_flight = self.estimate_flight_cost()
-        
-        # Budget allocation percentages
-        flight_percentage = min(estimated_flight / float(self.total_budget), 0.4)  # Max 40% for flights
-        accommodation_percentage = 0.35  # 35% for accommodation
-        activity_percentage = 0.25  # 25% for activities
-        # Remaining 10-15% is buffer/miscellaneous
-        
-        # Adjust if flight cost is very high
-        if flight_percentage > 0.3:
-            accommodation_percentage = 0.25
-            activity_percentage = 0.20
-        
-        self.flight_budget = self.total_budget * flight_percentage
-        self.accommodation_budget = self.total_budget * accommodation_percentage
-        self.activity_budget = self.total_budget * activity_percentage
-        
-        # Calculate daily budget for activities only (excluding flights)
-        remaining_budget = self.total_budget - self.flight_budget
-        self.daily_budget = remaining_budget / self.days_count if self.days_count > 0 else 0
+        for field, amount in allocation.items():
+            setattr(self, field, amount)
     
-    def save(self, *args, **kwargs):
-        if self.total_budget and self.days_count:
+    def save(self, *args, allocate=True, **kwargs):
+        # allocate=False lets callers that already ran allocate_budget() skip it
+        if allocate and self.total_budget and self.days_count:
             self.allocate_budget()
         super().save(*args, **kwargs)
 
@@ -184,30 +180,25 @@ class ItineraryDay(models.Model):
     day_number = models.IntegerField()
     date = models.DateField()
     title = models.CharField(max_length=200, default="Day {day_number}")
-    activities = models.TextField(help_text="JSON list of activities for the day")
     estimated_cost = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    objects = ItineraryDayQuerySet.as_manager()
+    
     class Meta:
         ordering = ['day_number']
         unique_together = ['trip', 'day_number']
+        indexes = [
+            models.Index(fields=['date'], name='trips_day_date_idx'),
+        ]
     
     def __str__(self):
         return f"{self.trip.title} - Day {self.day_number}"
     
     def get_activities(self):
-        """Return activities as a list"""
-        if self.activities:
-            try:
-                return json.loads(self.activities)
-            except json.JSONDecodeError:
-                return []
-        return []
-    
-    def set_activities(self, activities_list):
-        """Set activities from a list"""
-        self.activities = json.dumps(activities_list)
+        """Return the day's activities in start time order (prefetch 'activities' to avoid a query per day)"""
+        return self.activities.all()
 
 class HotelSuggestion(models.Model):
     """Hotel suggestions for trips"""
@@ -221,8 +212,8 @@ class HotelSuggestion(models.Model):
     google_place_id = models.CharField(max_length=200, blank=True)
     phone = models.CharField(max_length=50, blank=True)
     website = models.URLField(blank=True)
-    amenities = models.TextField(help_text="JSON list of amenities", blank=True)
-    photos = models.TextField(help_text="JSON list of photo references", blank=True)
+    amenities = models.JSONField(default=list, blank=True, help_text="List of amenities")
+    photos = models.JSONField(default=list, blank=True, help_text="List of photo references")
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -233,21 +224,11 @@ class HotelSuggestion(models.Model):
     
     def get_amenities(self):
         """Return amenities as a list"""
-        if self.amenities:
-            try:
-                return json.loads(self.amenities)
-            except json.JSONDecodeError:
-                return []
-        return []
+        return self.amenities if isinstance(self.amenities, list) else []
     
     def get_photos(self):
         """Return photo references as a list"""
-        if self.photos:
-            try:
-                return json.loads(self.photos)
-            except json.JSONDecodeError:
-                return []
-        return []
+        return self.photos if isinstance(self.photos, list) else []
 
 class PointOfInterest(models.Model):
     """Points of Interest for trips"""
@@ -277,34 +258,179 @@ class PointOfInterest(models.Model):
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     google_place_id = models.CharField(max_length=200, blank=True)
-    opening_hours = models.TextField(help_text="JSON format opening hours", blank=True)
+    opening_hours = models.JSONField(default=dict, blank=True, help_text="Opening hours")
     phone = models.CharField(max_length=50, blank=True)
     website = models.URLField(blank=True)
-    photos = models.TextField(help_text="JSON list of photo references", blank=True)
+    photos = models.JSONField(default=list, blank=True, help_text="List of photo references")
     recommended_duration = models.IntegerField(help_text="Recommended visit duration in minutes", null=True, blank=True)
     assigned_day = models.ForeignKey(ItineraryDay, on_delete=models.SET_NULL, null=True, blank=True)
+    geo_cell = models.CharField(max_length=12, blank=True, db_index=True, editable=False, help_text="Geohash of the coordinates, maintained on save")
     created_at = models.DateTimeField(auto_now_add=True)
     
+    objects = SpatialQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-rating', 'estimated_cost']
     
     def __str__(self):
         return f"{self.name} - {self.category}"
     
+    def save(self, *args, **kwargs):
+        self.geo_cell = geo_cell_for(self.latitude, self.longitude)
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'geo_cell'}
+        super().save(*args, **kwargs)
+    
     def get_opening_hours(self):
         """Return opening hours as a dict"""
-        if self.opening_hours:
-            try:
-                return json.loads(self.opening_hours)
-            except json.JSONDecodeError:
-                return {}
-        return {}
+        return self.opening_hours if isinstance(self.opening_hours, dict) else {}
     
     def get_photos(self):
         """Return photo references as a list"""
-        if self.photos:
-            try:
-                return json.loads(self.photos)
-            except json.JSONDecodeError:
-                return []
-        return []
+        return self.photos if isinstance(self.photos, list) else []
+
+class ItineraryActivity(models.Model):
+    """A scheduled activity within an itinerary day"""
+    day = models.ForeignKey(ItineraryDay, on_delete=models.CASCADE, related_name='activities')
+    start_time = models.TimeField(null=True, blank=True)
+    title = models.CharField(max_length=200)
+    location = models.CharField(max_length=200, blank=True)
+    duration_minutes = models.PositiveIntegerField(null=True, blank=True)
+    cost = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    point_of_interest = models.ForeignKey(PointOfInterest, on_delete=models.SET_NULL, null=True, blank=True, related_name='activities')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['start_time', 'id']
+        verbose_name_plural = 'Itinerary activities'
+        indexes = [
+            models.Index(fields=['day', 'start_time'], name='trips_activity_day_time_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.title} ({self.day})"
+
+class GeocodeCacheEntry(models.Model):
+    """Cached Google Geocoding lookups shared by all trips"""
+    STATUS_CHOICES = [
+        ('OK', 'OK'),
+        ('ZERO_RESULTS', 'Zero Results'),
+    ]
+    
+    key = models.CharField(max_length=255, unique=True, help_text="Normalized address or rounded 'lat,lng' key")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='OK')
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    city = models.CharField(max_length=100, blank=True)
+    country = models.CharField(max_length=100, blank=True)
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name_plural = 'Geocode cache entries'
+    
+    def __str__(self):
+        return f"{self.key} ({self.status})"
+    
+    def is_expired(self):
+        """Check if the cached lookup is past its TTL"""
+        return timezone.now() > self.expires_at
+
+class TripJob(models.Model):
+    """Background job processed by the run_trip_worker management command"""
+    KIND_CHOICES = [
+        ('enrich_trip', 'Enrich Trip'),
+        ('render_pdf', 'Render PDF'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    trip = models.ForeignKey(TripPlan, on_delete=models.CASCADE, related_name='jobs')
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES, default='enrich_trip')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['run_after', 'id']
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='trips_job_status_run_after'),
+        ]
+        constraints = [
+            # At most one waiting or running job of each kind per trip (see jobs.enqueue)
+            models.UniqueConstraint(
+                fields=['trip', 'kind'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='trips_job_one_active',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} for trip {self.trip_id} ({self.status})"
+
+class CalendarFeedKey(models.Model):
+    """Per-user secret in the calendar feed URL; replacing it revokes every URL handed out before"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='calendar_feed_key')
+    secret = models.CharField(max_length=32)
+    rotated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Calendar feed key for user {self.user_id}"
+
+class PlacesCacheEntry(models.Model):
+    """Google Places nearby search results shared by every trip to the same geo cell"""
+    cell = models.CharField(max_length=12, help_text="Geohash of the search center")
+    place_type = models.CharField(max_length=50, default='lodging')
+    results = models.JSONField(default=list, blank=True, help_text="List of Places results")
+    hit_count = models.IntegerField(default=0)
+    expires_at = models.DateTimeField()
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ['cell', 'place_type']
+        verbose_name_plural = 'Places cache entries'
+    
+    def __str__(self):
+        return f"{self.place_type} near {self.cell}"
+    
+    def get_results(self):
+        """Return cached Places results as a list"""
+        return self.results if isinstance(self.results, list) else []
+
+class ApiRateBucket(models.Model):
+    """Token bucket for an external API endpoint, shared by every process that calls it"""
+    endpoint = models.CharField(max_length=50, unique=True)
+    tokens = models.FloatField(help_text="Tokens left at refilled_at")
+    refilled_at = models.FloatField(help_text="Unix time the bucket was last refilled")
+    
+    def __str__(self):
+        return f"{self.endpoint} ({self.tokens:.1f} tokens)"
+
+class ApiQuotaUsage(models.Model):
+    """Calls made to an external API endpoint on one quota day"""
+    endpoint = models.CharField(max_length=50)
+    day = models.DateField()
+    calls = models.IntegerField(default=0)
+    throttled = models.IntegerField(default=0, help_text="Calls dropped after waiting too long for a token")
+    over_quota = models.IntegerField(default=0, help_text="Calls refused because the daily quota was used up")
+    
+    class Meta:
+        unique_together = ['endpoint', 'day']
+        ordering = ['-day', 'endpoint']
+        verbose_name_plural = 'API quota usage'
+    
+    def __str__(self):
+        return f"{self.endpoint} on {self.day}: {self.calls} calls"
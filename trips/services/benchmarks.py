@@ -0,0 +1,301 @@
+"""
+Micro-benchmarks for the trips hot paths, with a stored baseline to compare against.
+
+Each benchmark is a setup function registered with @benchmark(name). It
+builds its fixtures and returns (run, ops): `run` is the zero-argument
+callable that gets timed and `ops` the number of operations one call does,
+so results are reported per operation. run_suite() calls it once to warm up
+and then `repeat` times, keeping the min, median and max. Database fixtures
+are created inside a transaction that is rolled back afterwards, so the
+suite can run against any database without leaving rows behind.
+
+compare() checks the medians against a baseline written by an earlier run
+(see the run_benchmarks command); a benchmark regresses when its median is
+more than its threshold slower, e.g. 0.25 = 25% slower. Baselines are only
+meaningful on the machine that recorded them, so the file says which one.
+"""
+import json
+import platform
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from fnmatch import fnmatch
+from itertools import count
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.utils import timezone
+
+from ..models import HotelSuggestion, PointOfInterest, TripPlan
+from .gazetteer import PrefixIndex
+from .materializer import TripMaterializer
+
+BASELINE_FORMAT = 1
+ITINERARY_DAYS = (1, 7, 30, 365)
+RENDER_DAYS = (30, 365)
+
+_benchmarks = {}
+
+
+class Rollback(Exception):
+    pass
+
+
+def benchmark(name):
+    """Register a setup function as the benchmark `name`"""
+    def register(func):
+        _benchmarks[name] = func
+        return func
+    return register
+
+
+def names(patterns=None):
+    """Registered benchmark names matching any of the shell-style `patterns` (all by default)"""
+    return [name for name in _benchmarks if not patterns or any(fnmatch(name, p) for p in patterns)]
+
+
+def synthetic_trips(size, seed=42):
+    """Unsaved trips with random coordinates and budgets, for the pure-Python benchmarks"""
+    rng = random.Random(seed)
+
+    def coordinate(limit):
+        return Decimal(f'{rng.uniform(-limit, limit):.6f}')
+
+    return [
+        TripPlan(
+            departure_latitude=coordinate(80),
+            departure_longitude=coordinate(180),
+            latitude=coordinate(80),
+            longitude=coordinate(180),
+            total_budget=Decimal(rng.randrange(500, 20000)),
+            days_count=rng.randrange(1, 30),
+        )
+        for _ in range(size)
+    ]
+
+
+def trip_for(user, days, title=None):
+    start = date(2030, 1, 1)
+    return TripPlan(
+        user=user, title=title or f'{days} day benchmark', destination='Lisbon, Portugal',
+        departure_location='London, United Kingdom',
+        departure_latitude=Decimal('51.507400'), departure_longitude=Decimal('-0.127800'),
+        latitude=Decimal('38.722300'), longitude=Decimal('-9.139300'),
+        start_date=start, end_date=start + timedelta(days=days - 1), days_count=days,
+        total_budget=150 * days, interests='food, culture, history',
+    )
+
+
+@benchmark('flight_distance')
+def flight_distance(user):
+    trips = synthetic_trips(10000)
+    return lambda: [trip.calculate_flight_distance() for trip in trips], len(trips)
+
+
+@benchmark('flight_cost')
+def flight_cost(user):
+    trips = synthetic_trips(10000)
+    return lambda: [trip.estimate_flight_cost() for trip in trips], len(trips)
+
+
+@benchmark('allocate_budget')
+def allocate_budget(user):
+    trips = synthetic_trips(10000)
+    return lambda: [trip.allocate_budget() for trip in trips], len(trips)
+
+
+def itinerary_benchmark(days):
+    def setup(user):
+        # A new trip per call: building and persisting the whole graph, as create_trip does
+        return lambda: TripMaterializer(trip_for(user, days)).build().save(), 1
+    return setup
+
+
+for _days in ITINERARY_DAYS:
+    benchmark(f'generate_itinerary_{_days}d')(itinerary_benchmark(_days))
+
+
+@benchmark('json_accessors')
+def json_accessors(user):
+    trip = TripMaterializer(trip_for(user, 1)).build().save()
+    photos = [f'photo-reference-{i:04d}' for i in range(10)]
+    hours = {day: '09:00-18:00' for day in ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')}
+    HotelSuggestion.objects.bulk_create(
+        HotelSuggestion(
+            trip=trip, name=f'Hotel {i}', address='Rua Augusta', rating=4,
+            amenities=['wifi', 'breakfast', 'pool', 'gym', 'parking'], photos=photos,
+        )
+        for i in range(500)
+    )
+    PointOfInterest.objects.bulk_create(
+        PointOfInterest(
+            trip=trip, name=f'Sight {i}', category='museum', address='Belém',
+            opening_hours=hours, photos=photos,
+        )
+        for i in range(500)
+    )
+
+    def run():
+        # Loading the rows is where the JSON columns get decoded
+        for hotel in HotelSuggestion.objects.filter(trip=trip):
+            hotel.get_amenities()
+            hotel.get_photos()
+        for poi in PointOfInterest.objects.filter(trip=trip):
+            poi.get_opening_hours()
+            poi.get_photos()
+
+    return run, 1000
+
+
+@benchmark('gazetteer_search')
+def gazetteer_search(user):
+    rng = random.Random(42)
+    syllables = ['ba', 'ri', 'lo', 'san', 'ta', 'mo', 'ne', 'por', 'vi', 'ca', 'del', 'sa', 'ão', 'é']
+
+    def word():
+        return ''.join(rng.choice(syllables) for _ in range(rng.randrange(2, 5))).title()
+
+    index = PrefixIndex()
+    index.load(
+        (i, f'{word()} {word()}' if i % 3 else word(), word(), word(), rng.randrange(10 ** 6), None, None)
+        for i in range(50000)
+    )
+    # Keystroke by keystroke, the way the autocomplete asks
+    queries = [word()[:length] for length in (1, 2, 3, 4, 6) for _ in range(40)]
+
+    def run():
+        index._results.clear()  # Time the index, not the result cache in front of it
+        for query in queries:
+            index.search(query, limit=10)
+
+    return run, len(queries)
+
+
+def render_benchmark(days):
+    def setup(user):
+        trip = TripMaterializer(trip_for(user, days)).build().save()
+        request = RequestFactory().get(f'/trips/{trip.id}/')
+        request.user = user
+        versions = count()
+
+        def run():
+            # Same context as the trip_detail view; a new page_version per call so
+            # the fragment cache never answers and the whole page is rendered
+            context = {
+                'trip': trip,
+                'itinerary_days': trip.itinerary_days.with_planned_cost().prefetch_related('activities').order_by('day_number'),
+                'hotels': trip.hotel_suggestions.all()[:5],
+                'pois': trip.points_of_interest.all(),
+                'google_maps_api_key': '',
+                'page_version': f'benchmark-{next(versions)}',
+                'page_cache_ttl': 1,
+            }
+            return render_to_string('trips/detail.html', context, request=request)
+
+        return run, 1
+    return setup
+
+
+for _days in RENDER_DAYS:
+    benchmark(f'render_detail_{_days}d')(render_benchmark(_days))
+
+
+def measure(run, ops, repeat):
+    run()  # Warm up caches, imports and query compilation
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) / ops)
+    return {
+        'ops': ops,
+        'repeat': repeat,
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'max': max(timings),
+    }
+
+
+def run_suite(selected, repeat=5, progress=None):
+    """Run the `selected` benchmarks; returns {name: timings in seconds per operation}"""
+    results = {}
+    try:
+        with transaction.atomic():
+            user = User.objects.create_user(username='benchmark@example.invalid')
+            for name in selected:
+                run, ops = _benchmarks[name](user)
+                results[name] = measure(run, ops, repeat)
+                if progress:
+                    progress(name, results[name])
+            raise Rollback
+    except Rollback:
+        pass
+    return results
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'machine': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'database': settings.DATABASES['default']['ENGINE'].rsplit('.', 1)[-1],
+    }
+
+
+def document(results):
+    """The JSON document written for a run, and stored as the baseline"""
+    return {
+        'format': BASELINE_FORMAT,
+        'recorded_at': timezone.now().isoformat(),
+        'environment': environment(),
+        'results': results,
+    }
+
+
+def load_baseline(path):
+    with open(path) as f:
+        baseline = json.load(f)
+    if baseline.get('format') != BASELINE_FORMAT:
+        raise ValueError(f'{path} is not a format {BASELINE_FORMAT} benchmark baseline')
+    return baseline
+
+
+def threshold_for(name, thresholds):
+    return thresholds.get(name, thresholds.get('default', 0.25))
+
+
+def compare(results, baseline, thresholds):
+    """Compare `results` with `baseline` results; returns one row per benchmark
+
+    A row's status is 'regressed', 'improved', 'ok' or 'new' (not in the baseline).
+    """
+    rows = []
+    for name, current in results.items():
+        threshold = threshold_for(name, thresholds)
+        previous = baseline.get(name)
+        if previous is None:
+            rows.append({'name': name, 'status': 'new', 'median': current['median'], 'threshold': threshold})
+            continue
+        ratio = current['median'] / previous['median'] if previous['median'] else 1.0
+        if ratio > 1 + threshold:
+            status = 'regressed'
+        elif ratio < 1 / (1 + threshold):
+            status = 'improved'
+        else:
+            status = 'ok'
+        rows.append({
+            'name': name,
+            'status': status,
+            'median': current['median'],
+            'baseline': previous['median'],
+            'ratio': ratio,
+            'threshold': threshold,
+        })
+    return rows
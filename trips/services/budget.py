@@ -0,0 +1,42 @@
+"""
+Budget allocation rules shared by TripPlan.allocate_budget() and the
+recalculate_budgets command, which applies them to many trips at once.
+"""
+
+MAX_FLIGHT_SHARE = 0.4  # Max 40% for flights
+ACCOMMODATION_SHARE = 0.35  # 35% for accommodation
+ACTIVITY_SHARE = 0.25  # 25% for activities
+# Remaining 10-15% is buffer/miscellaneous
+
+# Above this flight share, accommodation and activities get smaller cuts
+EXPENSIVE_FLIGHT_SHARE = 0.3
+EXPENSIVE_FLIGHT_ACCOMMODATION_SHARE = 0.25
+EXPENSIVE_FLIGHT_ACTIVITY_SHARE = 0.20
+
+BUDGET_FIELDS = ['flight_budget', 'accommodation_budget', 'activity_budget', 'daily_budget']
+
+
+def split_budget(total_budget, estimated_flight, days_count):
+    """Return {field: amount} for BUDGET_FIELDS, or None when there is no budget to split"""
+    total_budget = float(total_budget)
+    if total_budget <= 0:
+        return None
+
+    flight_share = min(estimated_flight / total_budget, MAX_FLIGHT_SHARE)
+    accommodation_share = ACCOMMODATION_SHARE
+    activity_share = ACTIVITY_SHARE
+
+    # Adjust if flight cost is very high
+    if flight_share > EXPENSIVE_FLIGHT_SHARE:
+        accommodation_share = EXPENSIVE_FLIGHT_ACCOMMODATION_SHARE
+        activity_share = EXPENSIVE_FLIGHT_ACTIVITY_SHARE
+
+    flight_budget = total_budget * flight_share
+    # Daily budget covers everything except flights
+    remaining_budget = total_budget - flight_budget
+    return {
+        'flight_budget': flight_budget,
+        'accommodation_budget': total_budget * accommodation_share,
+        'activity_budget': total_budget * activity_share,
+        'daily_budget': remaining_budget / days_count if days_count > 0 else 0,
+    }
@@ -0,0 +1,91 @@
+"""
+Trip enrichment: geocoding, budget allocation, itinerary and hotel suggestions.
+
+The lookups (destination geocoding, departure geocoding or reverse
+geocoding, and the Places hotel search) go through the GEO_PROVIDERS chain
+(see geoproviders.py) and don't touch the trip, so enrich_trip() runs them
+concurrently through a Pipeline and merges whatever finished by
+TRIP_PIPELINE_DEADLINE into the TripPlan on the calling thread.
+The TripMaterializer then writes the trip and its children in one go.
+"""
+from django.conf import settings
+
+from . import geoproviders
+from .materializer import TripMaterializer
+from .pipeline import Pipeline
+
+
+def lookup_destination(destination):
+    """Geocode the destination through the GEO_PROVIDERS chain, returning an OK result or None"""
+    return geoproviders.geocode(destination)
+
+
+def lookup_departure(departure_location, latitude=None, longitude=None, city=''):
+    """Geocode the departure location, or resolve its city from coordinates if they were given"""
+    if latitude and longitude:
+        # With the offline provider first, a nearby known destination saves a reverse geocoding call
+        return None if city else geoproviders.reverse_geocode(latitude, longitude)
+    if not departure_location:
+        return None
+    return geoproviders.geocode(departure_location)
+
+
+def fetch_hotels(latitude, longitude):
+    """Return Places lodging results near the coordinates, or None if unavailable"""
+    if not latitude or not longitude:
+        return None
+    return geoproviders.nearby(latitude, longitude, 'lodging')
+
+
+def apply_destination(trip, result):
+    """Copy destination coordinates, city and country onto the trip"""
+    if not result:
+        return
+    trip.latitude = result['latitude']
+    trip.longitude = result['longitude']
+    trip.destination_city = result['city'] or trip.destination_city
+    trip.destination_country = result['country'] or trip.destination_country
+
+
+def apply_departure(trip, result):
+    """Copy departure coordinates (when missing), city and country onto the trip"""
+    if not result:
+        return
+    if not trip.departure_latitude or not trip.departure_longitude:
+        trip.departure_latitude = result['latitude']
+        trip.departure_longitude = result['longitude']
+    trip.departure_city = result['city'] or trip.departure_city
+    trip.departure_country = result['country'] or trip.departure_country
+
+
+def enrich_trip(trip, timeout=None, replace=False):
+    """Geocode, budget, and fill in itinerary and hotels for a trip
+
+    The trip may be unsaved, in which case it is inserted together with its
+    children. The lookups run before any write so no transaction is held open
+    across network calls. With replace=True existing itinerary days and hotel
+    suggestions are dropped first, which makes a retried job idempotent.
+    """
+    timeout = settings.TRIP_PIPELINE_DEADLINE if timeout is None else timeout
+    departure = (trip.departure_location, trip.departure_latitude, trip.departure_longitude, trip.departure_city)
+
+    pipeline = Pipeline()
+    pipeline.add('destination', lambda: lookup_destination(trip.destination))
+    pipeline.add('departure', lambda: lookup_departure(*departure))
+    pipeline.add(
+        'hotels',
+        lambda destination: fetch_hotels(destination['latitude'], destination['longitude']) if destination else None,
+        depends_on=['destination'],
+    )
+    result = pipeline.run(timeout)
+
+    for name, error in result.errors.items():
+        print(f"Trip enrichment stage '{name}' failed: {error}")
+    if result.timed_out:
+        print(f"Trip enrichment stages timed out: {', '.join(sorted(result.timed_out))}")
+
+    apply_destination(trip, result.get('destination'))
+    apply_departure(trip, result.get('departure'))
+
+    # Budget, itinerary and hotels are written in one transaction
+    TripMaterializer(trip).build(places=result.get('hotels')).save(replace=replace)
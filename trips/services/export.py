@@ -0,0 +1,131 @@
+"""
+Bulk export of a user's trips as a ZIP archive.
+
+The archive holds one JSON document per trip (the trip with its itinerary
+days and their activities, hotel suggestions and points of interest) and,
+optionally, each trip's itinerary PDF. stream_zip() is a generator of byte
+chunks: trips are read with a chunked iterator whose related rows are
+prefetched one chunk at a time, and the ZIP is written to a write-only
+buffer that is emptied after every entry, so memory stays flat however many
+trips the user has (apart from the ZIP central directory, a few hundred
+bytes per entry, which can only be written at the end). The same generator
+feeds the export view's StreamingHttpResponse and the export_trips command.
+"""
+import json
+import time
+import zipfile
+from datetime import date
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+from django.utils.text import slugify
+
+from ..models import ItineraryDay, TripPlan
+from . import pdf
+
+EXPORT_FORMAT_VERSION = 1
+PDF_COPY_CHUNK = 64 * 1024
+
+
+class _StreamBuffer:
+    """Write-only file object for ZipFile whose contents are taken out with drain()
+
+    It has no tell()/seek(), so ZipFile writes a streamable archive (sizes
+    follow each entry in a data descriptor instead of being patched in).
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def _values(instance, exclude=()):
+    return {
+        field.attname: field.value_from_object(instance)
+        for field in instance._meta.concrete_fields
+        if field.name not in exclude
+    }
+
+
+def trip_document(trip):
+    """The trip and everything planned for it as a JSON-serializable dict"""
+    return {
+        'format_version': EXPORT_FORMAT_VERSION,
+        'trip': _values(trip, exclude=('user',)),
+        'itinerary_days': [
+            {
+                **_values(day, exclude=('trip',)),
+                'activities': [_values(activity, exclude=('day',)) for activity in day.activities.all()],
+            }
+            for day in trip.itinerary_days.all()
+        ],
+        'hotel_suggestions': [_values(hotel, exclude=('trip',)) for hotel in trip.hotel_suggestions.all()],
+        'points_of_interest': [_values(poi, exclude=('trip',)) for poi in trip.points_of_interest.all()],
+    }
+
+
+def user_trips(user, chunk_size=100):
+    """Iterate over the user's trips with their related rows, `chunk_size` trips per round of queries"""
+    return TripPlan.objects.filter(user=user).order_by('pk').prefetch_related(
+        Prefetch('itinerary_days', queryset=ItineraryDay.objects.order_by('day_number')),
+        'itinerary_days__activities',
+        'hotel_suggestions',
+        'points_of_interest',
+    ).iterator(chunk_size=chunk_size)
+
+
+def archive_filename(user):
+    return f'globetrek-trips-{user.pk}-{date.today():%Y%m%d}.zip'
+
+
+def stream_zip(user, pdfs=None, chunk_size=100, progress=None):
+    """Yield the user's trip archive as byte chunks
+
+    pdfs is None (no PDFs), 'existing' (only PDFs already rendered for the
+    trip's current version) or 'render' (render missing ones first; slow, for
+    offline use).
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for count, trip in enumerate(user_trips(user, chunk_size), 1):
+            stem = f'{trip.pk}-{slugify(trip.title) or "trip"}'
+            document = json.dumps(trip_document(trip), cls=DjangoJSONEncoder, ensure_ascii=False, indent=2)
+            archive.writestr(f'trips/{stem}.json', document.encode('utf-8'))
+            yield buffer.drain()
+
+            if pdfs:
+                source = _open_pdf(trip, pdfs)
+                if source is not None:
+                    # Already compressed: store it, copying in pieces instead of reading the whole file
+                    info = zipfile.ZipInfo(f'pdfs/{stem}.pdf', date_time=time.localtime()[:6])
+                    info.compress_type = zipfile.ZIP_STORED
+                    with source, archive.open(info, 'w') as entry:
+                        while piece := source.read(PDF_COPY_CHUNK):
+                            entry.write(piece)
+                            yield buffer.drain()
+
+            if progress:
+                progress(count)
+    yield buffer.drain()
+
+
+def _open_pdf(trip, pdfs):
+    if trip.generation_status != 'ready':
+        return None
+    path = pdf.ensure_pdf(trip) if pdfs == 'render' else pdf.pdf_path(trip.id, trip.updated_at)
+    try:
+        return open(path, 'rb')
+    except FileNotFoundError:
+        # Not rendered yet, or replaced by a newer version since
+        return None
@@ -0,0 +1,109 @@
+"""
+Flight distance and cost estimates.
+
+TripPlan.calculate_flight_distance() and estimate_flight_cost() handle one
+trip at a time. The batch functions here take parallel sequences of
+coordinates and compute every distance and cost in one pass, vectorized with
+NumPy when it is installed and with a plain loop otherwise. Both paths use the
+same tiers, so a batch result matches the per-instance methods.
+"""
+import math
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy is optional
+    np = None
+
+from .geo import EARTH_RADIUS_KM
+
+# (upper distance bound in km, USD per km); the last tier has no bound
+FLIGHT_RATE_TIERS = [
+    (500, 0.20),  # Domestic short flights
+    (2000, 0.15),  # Regional flights
+    (8000, 0.12),  # International flights
+    (None, 0.10),  # Long-haul international
+]
+
+
+def flight_rate(distance):
+    """Return the per-km rate for a flight of the given length"""
+    for bound, rate in FLIGHT_RATE_TIERS:
+        if bound is None or distance < bound:
+            return rate
+
+
+def flight_cost(distance):
+    """Estimate the cost of a flight from its length, 0 for an unknown distance"""
+    if distance == 0:
+        return 0
+    return round(distance * flight_rate(distance), 2)
+
+
+def _has_coordinates(*values):
+    # Mirrors TripPlan.calculate_flight_distance, which treats 0/None as missing
+    return all(values)
+
+
+def batch_distances(departure_latitudes, departure_longitudes, latitudes, longitudes, use_numpy=None):
+    """Great-circle distances in km for parallel coordinate sequences
+
+    Trips with a missing coordinate get 0, as calculate_flight_distance() does.
+    Returns a list of floats.
+    """
+    use_numpy = np is not None if use_numpy is None else use_numpy
+    if use_numpy:
+        return _numpy_distances(departure_latitudes, departure_longitudes, latitudes, longitudes).tolist()
+
+    distances = []
+    radians = math.radians
+    for lat1, lng1, lat2, lng2 in zip(departure_latitudes, departure_longitudes, latitudes, longitudes):
+        if not _has_coordinates(lat1, lng1, lat2, lng2):
+            distances.append(0)
+            continue
+        lat1, lng1, lat2, lng2 = radians(float(lat1)), radians(float(lng1)), radians(float(lat2)), radians(float(lng2))
+        a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+        distances.append(2 * math.asin(math.sqrt(a)) * EARTH_RADIUS_KM)
+    return distances
+
+
+def batch_flight_costs(distances, use_numpy=None):
+    """Tiered cost estimates for a sequence of distances, as a list of floats"""
+    use_numpy = np is not None if use_numpy is None else use_numpy
+    if use_numpy:
+        return _numpy_costs(np.asarray(distances, dtype=float)).tolist()
+    return [flight_cost(distance) for distance in distances]
+
+
+def batch_flight_estimates(rows, use_numpy=None):
+    """Return (distances, costs) for (departure_lat, departure_lng, lat, lng) rows"""
+    rows = list(rows)
+    if not rows:
+        return [], []
+    columns = list(zip(*rows))
+    use_numpy = np is not None if use_numpy is None else use_numpy
+    if use_numpy:
+        distances = _numpy_distances(*columns)
+        return distances.tolist(), _numpy_costs(distances).tolist()
+    distances = batch_distances(*columns, use_numpy=False)
+    return distances, batch_flight_costs(distances, use_numpy=False)
+
+
+def _as_array(values):
+    return np.array([float(value) if value else np.nan for value in values], dtype=float)
+
+
+def _numpy_distances(departure_latitudes, departure_longitudes, latitudes, longitudes):
+    lat1, lng1, lat2, lng2 = (
+        np.radians(_as_array(column))
+        for column in (departure_latitudes, departure_longitudes, latitudes, longitudes)
+    )
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    distances = 2 * np.arcsin(np.sqrt(a)) * EARTH_RADIUS_KM
+    return np.nan_to_num(distances, nan=0.0)
+
+
+def _numpy_costs(distances):
+    bounds = [bound for bound, _ in FLIGHT_RATE_TIERS[:-1]]
+    rates = np.array([rate for _, rate in FLIGHT_RATE_TIERS])
+    costs = distances * rates[np.searchsorted(bounds, distances, side='right')]
+    return np.round(costs, 2)
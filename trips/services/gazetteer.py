@@ -0,0 +1,281 @@
+"""
+In-memory destination autocomplete backed by the Destination table.
+
+Every Destination contributes a few folded (lower-cased, accent-stripped)
+keys to one sorted list: its full name, each later word of its name, its
+city and its country. A query is folded the same way and answered with two
+bisects over that list, so a keystroke never touches the database or Google.
+Matches are ranked by how they matched (start of the name first, then a later
+word or the city, then the country) and then by popularity.
+
+Short prefixes match a large part of the index, so the best TOP_K matches of
+every prefix of up to TOP_PREFIX_LENGTH characters are kept ranked; a query
+that short is a slice of that list. Longer prefixes match few enough keys to
+rank them on the fly.
+
+The index is built once per process on first use. Saves and deletes in the
+same process update it through signals, and rows changed by other processes
+(or by bulk imports, which don't send signals) are merged in by a cheap
+updated_at query at most every GAZETTEER_REFRESH_INTERVAL seconds. Rows
+deleted elsewhere show up as a row count below the index size, and only then
+are the ids compared.
+"""
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+
+from django.conf import settings
+
+from ..models import Destination
+from .geocoding import LRUCache
+
+# Match ranks, best first
+NAME_PREFIX = 0
+WORD_PREFIX = 1
+COUNTRY_PREFIX = 2
+
+# Prefixes of up to this many characters have their best TOP_K matches kept ranked
+TOP_PREFIX_LENGTH = 3
+TOP_K = 50
+
+_RESULT_CACHE_TTL = 60 * 60
+
+
+def fold(text):
+    """Lower-case, strip accents and collapse punctuation so 'São Paulo' matches 'sao pau'"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return re.sub(r'[\W_]+', ' ', text.casefold()).strip()
+
+
+class PrefixIndex:
+    """Sorted (key, rank, id) tuples searched with bisect"""
+
+    def __init__(self):
+        self._keys = []
+        self._entries = {}
+        self._top = {}
+        self._lock = threading.RLock()
+        self._results = LRUCache(1024)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _keys_for(entry_id, name, city, country):
+        keys = set()
+        folded_name = fold(name)
+        if folded_name:
+            keys.add((folded_name, NAME_PREFIX, entry_id))
+            words = folded_name.split(' ')
+            for position in range(1, len(words)):
+                keys.add((' '.join(words[position:]), WORD_PREFIX, entry_id))
+        folded_city = fold(city)
+        if folded_city and folded_city != folded_name:
+            keys.add((folded_city, WORD_PREFIX, entry_id))
+        folded_country = fold(country)
+        if folded_country:
+            keys.add((folded_country, COUNTRY_PREFIX, entry_id))
+        return keys
+
+    def load(self, rows):
+        """Replace the index contents with (id, name, city, country, popularity, lat, lng) rows"""
+        keys = []
+        entries = {}
+        for entry_id, name, city, country, popularity, latitude, longitude in rows:
+            entries[entry_id] = (name, city, country, popularity or 0, latitude, longitude)
+            keys.extend(self._keys_for(entry_id, name, city, country))
+        keys.sort()
+        with self._lock:
+            self._keys = keys
+            self._entries = entries
+            self._top = self._rank_prefixes()
+            self._results.clear()
+
+    def add(self, entry_id, name, city, country, popularity=0, latitude=None, longitude=None):
+        """Insert or replace a single destination"""
+        with self._lock:
+            self._remove_keys(entry_id)
+            self._entries[entry_id] = (name, city, country, popularity or 0, latitude, longitude)
+            for key in self._keys_for(entry_id, name, city, country):
+                self._keys.insert(bisect_left(self._keys, key), key)
+                self._forget_top(key[0])
+            self._results.clear()
+
+    def remove(self, entry_id):
+        with self._lock:
+            self._remove_keys(entry_id)
+            self._entries.pop(entry_id, None)
+            self._results.clear()
+
+    def ids(self):
+        with self._lock:
+            return set(self._entries)
+
+    def _remove_keys(self, entry_id):
+        entry = self._entries.get(entry_id)
+        if entry is None:
+            return
+        for key in self._keys_for(entry_id, *entry[:3]):
+            position = bisect_left(self._keys, key)
+            if position < len(self._keys) and self._keys[position] == key:
+                del self._keys[position]
+            self._forget_top(key[0])
+
+    def _forget_top(self, key):
+        # Re-ranked from the keys on the next search that needs it
+        for length in range(1, TOP_PREFIX_LENGTH + 1):
+            self._top.pop(key[:length], None)
+
+    def _range(self, prefix, lo=0):
+        lo = bisect_left(self._keys, (prefix,), lo)
+        return lo, bisect_left(self._keys, (prefix + '\uffff',), lo)
+
+    def _rank(self, lo, hi, limit):
+        """Ids of the best `limit` destinations among the keys in [lo, hi), best first"""
+        best = {}
+        for _, rank, entry_id in self._keys[lo:hi]:
+            if rank < best.get(entry_id, COUNTRY_PREFIX + 1):
+                best[entry_id] = rank
+        entries = self._entries
+        top = heapq.nsmallest(
+            limit,
+            best.items(),
+            key=lambda item: (item[1], -entries[item[0]][3], entries[item[0]][0]),
+        )
+        return [entry_id for entry_id, _ in top]
+
+    def _rank_prefixes(self):
+        """Best TOP_K ids for every prefix of up to TOP_PREFIX_LENGTH characters; one pass per length"""
+        top = {}
+        keys = self._keys
+        for length in range(1, TOP_PREFIX_LENGTH + 1):
+            lo = 0
+            while lo < len(keys):
+                prefix = keys[lo][0][:length]
+                if len(prefix) < length:
+                    lo += 1
+                    continue
+                lo, hi = self._range(prefix, lo)
+                top[prefix] = self._rank(lo, hi, TOP_K)
+                lo = hi
+        return top
+
+    def search(self, query, limit=10):
+        """Return up to `limit` result dicts for a prefix query"""
+        prefix = fold(query)
+        if not prefix:
+            return []
+
+        cache_key = (prefix, limit)
+        cached = self._results.get(cache_key)
+        if cached is not None:
+            # Callers may annotate their results; keep the cached ones pristine
+            return [dict(result) for result in cached]
+
+        with self._lock:
+            if len(prefix) <= TOP_PREFIX_LENGTH and limit <= TOP_K:
+                top = self._top.get(prefix)
+                if top is None:
+                    top = self._top[prefix] = self._rank(*self._range(prefix), TOP_K)
+                ids = top[:limit]
+            else:
+                ids = self._rank(*self._range(prefix), limit)
+            results = [self._as_result(entry_id, self._entries[entry_id]) for entry_id in ids]
+
+        self._results.set(cache_key, results, _RESULT_CACHE_TTL)
+        return [dict(result) for result in results]
+
+    @staticmethod
+    def _as_result(entry_id, entry):
+        name, city, country, popularity, latitude, longitude = entry
+        return {
+            'id': entry_id,
+            'name': name,
+            'city': city,
+            'country': country,
+            'latitude': float(latitude) if latitude is not None else None,
+            'longitude': float(longitude) if longitude is not None else None,
+        }
+
+
+_index = None
+_index_lock = threading.Lock()
+_refreshed_at = 0
+_seen_until = None
+
+_COLUMNS = ('id', 'name', 'city', 'country', 'popularity', 'latitude', 'longitude')
+
+# Beyond this many changed rows a full rebuild beats one-by-one inserts
+_REBUILD_THRESHOLD = 5000
+
+
+def get_index():
+    """Return the process-wide index, building it on first use"""
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _build()
+    elif time.monotonic() - _refreshed_at > settings.GAZETTEER_REFRESH_INTERVAL:
+        _refresh()
+    return _index
+
+
+def _build():
+    global _index, _refreshed_at, _seen_until
+    index = PrefixIndex()
+    seen_until = Destination.objects.order_by('-updated_at').values_list('updated_at', flat=True).first()
+    index.load(Destination.objects.values_list(*_COLUMNS).iterator(chunk_size=5000))
+    _index, _seen_until, _refreshed_at = index, seen_until, time.monotonic()
+
+
+def _refresh():
+    """Merge rows changed by other processes since the last build or refresh"""
+    global _refreshed_at, _seen_until
+    with _index_lock:
+        if time.monotonic() - _refreshed_at <= settings.GAZETTEER_REFRESH_INTERVAL:
+            return
+        _refreshed_at = time.monotonic()
+        changed = Destination.objects.order_by('updated_at')
+        if _seen_until is not None:
+            changed = changed.filter(updated_at__gt=_seen_until)
+        rows = list(changed.values_list(*_COLUMNS, 'updated_at')[:_REBUILD_THRESHOLD + 1])
+        if len(rows) > _REBUILD_THRESHOLD:
+            _build()
+            return
+        for row in rows:
+            _index.add(*row[:-1])
+            _seen_until = row[-1]
+
+        # Deletions leave no updated_at behind, but every merged row is in both counts
+        if Destination.objects.count() < len(_index):
+            existing = set(Destination.objects.values_list('id', flat=True).iterator(chunk_size=5000))
+            for entry_id in _index.ids() - existing:
+                _index.remove(entry_id)
+
+
+def search(query, limit=10):
+    """Autocomplete destinations for a (partial) query"""
+    return get_index().search(query, limit)
+
+
+def destination_saved(instance):
+    """Keep an already-built index in step with a saved Destination"""
+    if _index is not None:
+        _index.add(instance.id, instance.name, instance.city, instance.country,
+                   instance.popularity, instance.latitude, instance.longitude)
+
+
+def destination_deleted(instance_id):
+    if _index is not None:
+        _index.remove(instance_id)
+
+
+def reset():
+    """Forget the index so the next search rebuilds it from the database"""
+    global _index
+    with _index_lock:
+        _index = None
@@ -0,0 +1,129 @@
+"""
+Geohash and great-circle helpers.
+
+A geohash interleaves longitude and latitude bits into a base32 string, so
+points that share a prefix lie in the same grid cell. Each extra character
+shrinks the cell: precision 5 is roughly 4.9km x 4.9km at the equator,
+precision 6 roughly 1.2km x 0.6km.
+"""
+import math
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_DECODE = {char: index for index, char in enumerate(BASE32)}
+
+EARTH_RADIUS_KM = 6371
+
+
+def geohash_encode(latitude, longitude, precision=6):
+    """Encode coordinates as a geohash string of the given length"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    latitude, longitude = float(latitude), float(longitude)
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(chars) < precision:
+        target, value = (lng_range, longitude) if even else (lat_range, latitude)
+        mid = (target[0] + target[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            target[0] = mid
+        else:
+            bits <<= 1
+            target[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits = bit_count = 0
+
+    return ''.join(chars)
+
+
+def geohash_bounds(geohash):
+    """Return (min_lat, min_lng, max_lat, max_lng) of a geohash cell"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even = True
+
+    for char in geohash:
+        value = _DECODE[char]
+        for shift in range(4, -1, -1):
+            target = lng_range if even else lat_range
+            mid = (target[0] + target[1]) / 2
+            if (value >> shift) & 1:
+                target[0] = mid
+            else:
+                target[1] = mid
+            even = not even
+
+    return lat_range[0], lng_range[0], lat_range[1], lng_range[1]
+
+
+def geohash_center(geohash):
+    """Return the (latitude, longitude) at the center of a geohash cell"""
+    min_lat, min_lng, max_lat, max_lng = geohash_bounds(geohash)
+    return (min_lat + max_lat) / 2, (min_lng + max_lng) / 2
+
+
+def geohash_neighbors(geohash):
+    """Return the cell itself and its (up to) eight neighbours at the same precision"""
+    min_lat, min_lng, max_lat, max_lng = geohash_bounds(geohash)
+    lat_step = max_lat - min_lat
+    lng_step = max_lng - min_lng
+    center_lat = (min_lat + max_lat) / 2
+    center_lng = (min_lng + max_lng) / 2
+    cells = []
+
+    for dlat in (-1, 0, 1):
+        latitude = center_lat + dlat * lat_step
+        if not -90 <= latitude <= 90:
+            continue
+        for dlng in (-1, 0, 1):
+            longitude = (center_lng + dlng * lng_step + 180) % 360 - 180
+            cell = geohash_encode(latitude, longitude, len(geohash))
+            if cell not in cells:
+                cells.append(cell)
+
+    return cells
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two points in kilometers"""
+    lat1, lng1, lat2, lng2 = map(math.radians, (float(lat1), float(lng1), float(lat2), float(lng2)))
+    dlat = lat2 - lat1
+    dlng = lng2 - lng1
+    a = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlng / 2) ** 2
+    return 2 * math.asin(math.sqrt(a)) * EARTH_RADIUS_KM
+
+
+def geohash_cell_size(precision):
+    """Return the (height, width) in degrees of a cell at the given precision"""
+    bits = 5 * precision
+    lng_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def geohash_cover(south, west, north, east, precision):
+    """Return the cells at `precision` that together cover a bounding box (west <= east)"""
+    height, width = geohash_cell_size(precision)
+    cells = []
+    seen = set()
+    latitude = max(south, -90.0)
+    while True:
+        longitude = west
+        while True:
+            cell = geohash_encode(min(latitude, 90.0), min(longitude, 180.0), precision)
+            if cell not in seen:
+                seen.add(cell)
+                cells.append(cell)
+            if longitude >= east:
+                break
+            longitude = min(longitude + width, east)
+        if latitude >= north:
+            break
+        latitude = min(latitude + height, north)
+    return cells
@@ -0,0 +1,241 @@
+"""
+Geocoding lookups with a two-level cache.
+
+Every lookup goes through an in-process LRU first, then the shared
+GeocodeCacheEntry table, and only reaches the Google Geocoding API on a miss.
+Forward lookups are keyed on a normalized address string and reverse lookups
+on coordinates rounded to GEOCODE_REVERSE_PRECISION decimal places.
+ZERO_RESULTS answers are cached with a shorter TTL, and concurrent misses for
+the same key inside one process share a single upstream call.
+
+Results are plain dicts:
+
+    {'status': 'OK', 'latitude': 6.5244, 'longitude': 3.3792,
+     'city': 'Lagos', 'country': 'Nigeria'}
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from ..models import GeocodeCacheEntry
+from .maps import MapsUnavailable, get_client
+
+
+class LRUCache:
+    """Small thread-safe LRU with a per-item expiry"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one execution"""
+
+    class _Call:
+        def __init__(self):
+            self.event = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+
+_memory = LRUCache(getattr(settings, 'GEOCODE_LRU_SIZE', 2048))
+_flight = SingleFlight()
+
+
+def normalize_address(address):
+    """Normalize a free-form address into a cache key"""
+    address = (address or '').strip().lower()
+    address = re.sub(r'\s*,\s*', ', ', address)
+    address = re.sub(r'\s+', ' ', address)
+    return address.strip(', ')
+
+
+def reverse_key(latitude, longitude):
+    """Cache key for a reverse lookup, rounded so nearby points share an entry"""
+    precision = getattr(settings, 'GEOCODE_REVERSE_PRECISION', 3)
+    return f'latlng:{float(latitude):.{precision}f},{float(longitude):.{precision}f}'
+
+
+def extract_city_country(result):
+    """Extract (city, country) from a Geocoding API result's address components"""
+    city = country = ''
+    for component in result.get('address_components', []):
+        types = component['types']
+        if 'locality' in types:
+            city = component['long_name']
+        elif 'country' in types:
+            country = component['long_name']
+    return city, country
+
+
+def geocode(address):
+    """Geocode an address, returning a result dict or None if unavailable"""
+    key = normalize_address(address)
+    if not key:
+        return None
+    return _lookup(key, {'address': address})
+
+
+def reverse_geocode(latitude, longitude):
+    """Reverse geocode coordinates, returning a result dict or None if unavailable"""
+    return _lookup(reverse_key(latitude, longitude), {'latlng': f'{latitude},{longitude}'})
+
+
+def clear_memory_cache():
+    """Drop the in-process LRU (the database cache is left untouched)"""
+    _memory.clear()
+
+
+def _lookup(key, params):
+    result = _memory.get(key)
+    if result is None:
+        result = _flight.do(key, lambda: _load(key, params))
+    # The LRU (and a coalesced flight) hands every caller the same dict; give each its own
+    return dict(result) if result is not None else None
+
+
+def _load(key, params):
+    # Another caller may have filled the LRU while we waited for the flight
+    result = _memory.get(key)
+    if result is not None:
+        return result
+
+    now = timezone.now()
+    entry = GeocodeCacheEntry.objects.filter(key=key, expires_at__gt=now).first()
+    if entry:
+        result = _entry_to_result(entry)
+        ttl = (entry.expires_at - now).total_seconds()
+    else:
+        result = _fetch(params)
+        if result is None:
+            return None
+        ttl = _ttl_for(result)
+        _store(key, result, now + timedelta(seconds=ttl))
+
+    _memory.set(key, result, min(ttl, settings.GEOCODE_CACHE_TTL))
+    return result
+
+
+def _ttl_for(result):
+    if result['status'] == 'OK':
+        return settings.GEOCODE_CACHE_TTL
+    return settings.GEOCODE_NEGATIVE_CACHE_TTL
+
+
+def _fetch(params):
+    """Call the Geocoding API; returns None on errors that must not be cached"""
+    if not settings.GOOGLE_MAPS_API_KEY:
+        return None
+
+    try:
+        data = get_client().get('geocode', params)
+    except MapsUnavailable as e:
+        print(f"Geocoding unavailable: {e}")
+        return None
+
+    if data['status'] == 'ZERO_RESULTS':
+        return {'status': 'ZERO_RESULTS', 'latitude': None, 'longitude': None, 'city': '', 'country': ''}
+    if data['status'] != 'OK' or not data['results']:
+        return None
+
+    first = data['results'][0]
+    location = first['geometry']['location']
+    city, country = extract_city_country(first)
+    return {
+        'status': 'OK',
+        'latitude': location['lat'],
+        'longitude': location['lng'],
+        'city': city,
+        'country': country,
+    }
+
+
+def _store(key, result, expires_at):
+    GeocodeCacheEntry.objects.update_or_create(
+        key=key,
+        defaults={
+            'status': result['status'],
+            'latitude': _round(result['latitude']),
+            'longitude': _round(result['longitude']),
+            'city': result['city'][:100],
+            'country': result['country'][:100],
+            'expires_at': expires_at,
+        }
+    )
+
+
+def _round(value):
+    return round(value, 6) if value is not None else None
+
+
+def _entry_to_result(entry):
+    return {
+        'status': entry.status,
+        'latitude': float(entry.latitude) if entry.latitude is not None else None,
+        'longitude': float(entry.longitude) if entry.longitude is not None else None,
+        'city': entry.city,
+        'country': entry.country,
+    }
@@ -0,0 +1,183 @@
+"""
+Geocoding and Places lookups through a configurable chain of providers.
+
+GEO_PROVIDERS lists provider names (or dotted paths to GeoProvider
+subclasses) in the order they are asked; the first answer that isn't None
+wins, so "offline first, then Google on a miss" is ['offline', 'google'].
+
+- google:  the Geocoding and Places APIs, behind the shared caches in
+           geocoding.py and places.py. Misses without an API key.
+- offline: the Destination table, through the in-memory gazetteer index for
+           names and a nearest-neighbour query for coordinates. Never leaves
+           the process; has no hotels.
+- fixture: made-up but stable answers derived from the input, for tests,
+           benchmarks and demos without network access.
+
+Every geocoding answer is a dict with status 'OK', latitude, longitude, city
+and country; nearby() answers are lists of slimmed Places results (see
+places._slim).
+"""
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+from ..models import Destination
+from . import gazetteer, geocoding, places
+from .geo import geohash_encode
+
+PROVIDERS = {
+    'google': 'trips.services.geoproviders.GoogleProvider',
+    'offline': 'trips.services.geoproviders.OfflineProvider',
+    'fixture': 'trips.services.geoproviders.FixtureProvider',
+}
+
+_chains = {}
+_chains_lock = threading.Lock()
+
+
+class GeoProvider:
+    """Base class; a lookup answered with None is passed on to the next provider in the chain"""
+
+    def geocode(self, address):
+        return None
+
+    def reverse_geocode(self, latitude, longitude):
+        return None
+
+    def nearby(self, latitude, longitude, place_type='lodging'):
+        return None
+
+
+class GoogleProvider(GeoProvider):
+    def geocode(self, address):
+        if not settings.GOOGLE_MAPS_API_KEY:
+            return None
+        return _ok(geocoding.geocode(address))
+
+    def reverse_geocode(self, latitude, longitude):
+        if not settings.GOOGLE_MAPS_API_KEY:
+            return None
+        return _ok(geocoding.reverse_geocode(latitude, longitude))
+
+    def nearby(self, latitude, longitude, place_type='lodging'):
+        if not settings.GOOGLE_MAPS_API_KEY:
+            return None
+        return places.nearby(latitude, longitude, place_type)
+
+
+class OfflineProvider(GeoProvider):
+    def geocode(self, address):
+        """Resolve "Name[, ...][, Country]" to a known destination of exactly that name or city"""
+        parts = [gazetteer.fold(part) for part in (address or '').split(',')]
+        parts = [part for part in parts if part]
+        if not parts:
+            return None
+        country = parts[-1] if len(parts) > 1 else None
+
+        # Ranked by match quality and popularity, so the first exact match is the best known one
+        for match in gazetteer.search(parts[0], limit=50):
+            if match['latitude'] is None or match['longitude'] is None:
+                continue
+            if parts[0] not in (gazetteer.fold(match['name']), gazetteer.fold(match['city'])):
+                continue
+            if country and country != gazetteer.fold(match['country']):
+                continue
+            return _result(match['latitude'], match['longitude'], match['city'], match['country'])
+        return None
+
+    def reverse_geocode(self, latitude, longitude):
+        """The city of the closest known destination within DEPARTURE_SNAP_RADIUS_KM"""
+        nearest = Destination.objects.nearest(latitude, longitude, k=1, max_km=settings.DEPARTURE_SNAP_RADIUS_KM)
+        if not nearest:
+            return None
+        return _result(latitude, longitude, nearest[0].city, nearest[0].country)
+
+
+class FixtureProvider(GeoProvider):
+    COUNTRY = 'Fixtureland'
+
+    def geocode(self, address):
+        parts = [part.strip() for part in (address or '').split(',') if part.strip()]
+        if not parts:
+            return None
+        latitude, longitude = fixture_point(address)
+        return _result(latitude, longitude, parts[0], parts[-1] if len(parts) > 1 else self.COUNTRY)
+
+    def reverse_geocode(self, latitude, longitude):
+        return _result(latitude, longitude, f'Fixture {geohash_encode(latitude, longitude, 4)}', self.COUNTRY)
+
+    def nearby(self, latitude, longitude, place_type='lodging'):
+        cell = geohash_encode(latitude, longitude, settings.PLACES_CACHE_PRECISION)
+        label = place_type.replace('_', ' ').title()
+        return [
+            {
+                'name': f'Fixture {label} {index + 1}',
+                'vicinity': f'{index + 1} Fixture Street',
+                'rating': round(3.6 + index * 0.4, 1),
+                'geometry': {'location': {'lat': float(latitude) + index * 0.001, 'lng': float(longitude) - index * 0.001}},
+                'place_id': f'fixture-{cell}-{place_type}-{index}',
+            }
+            for index in range(3)
+        ]
+
+
+def fixture_point(address):
+    """Coordinates derived from the normalized address: the same address always lands on the same spot"""
+    digest = hashlib.sha1(geocoding.normalize_address(address).encode()).digest()
+    latitude = int.from_bytes(digest[:4], 'big') / 2 ** 32 * 120 - 60
+    longitude = int.from_bytes(digest[4:8], 'big') / 2 ** 32 * 360 - 180
+    return round(latitude, 6), round(longitude, 6)
+
+
+def _result(latitude, longitude, city, country):
+    return {'status': 'OK', 'latitude': latitude, 'longitude': longitude, 'city': city or '', 'country': country or ''}
+
+
+def _ok(result):
+    return result if result and result['status'] == 'OK' else None
+
+
+def get_providers():
+    """The GEO_PROVIDERS chain as provider instances, built once per configuration"""
+    names = tuple(settings.GEO_PROVIDERS)
+    chain = _chains.get(names)
+    if chain is None:
+        with _chains_lock:
+            chain = _chains.get(names)
+            if chain is None:
+                chain = _chains[names] = [_load(name) for name in names]
+    return chain
+
+
+def _load(name):
+    try:
+        provider = import_string(PROVIDERS.get(name, name))
+    except ImportError as e:
+        raise ImproperlyConfigured(f'GEO_PROVIDERS: unknown provider "{name}" ({e})')
+    return provider()
+
+
+def _first(operation, *args):
+    for provider in get_providers():
+        result = getattr(provider, operation)(*args)
+        if result is not None:
+            return result
+    return None
+
+
+def geocode(address):
+    """Geocode an address through the provider chain; an OK result or None"""
+    return _first('geocode', address)
+
+
+def reverse_geocode(latitude, longitude):
+    """Resolve coordinates to a city and country through the provider chain; an OK result or None"""
+    return _first('reverse_geocode', latitude, longitude)
+
+
+def nearby(latitude, longitude, place_type='lodging'):
+    """Places results of `place_type` near the coordinates through the provider chain, or None"""
+    return _first('nearby', latitude, longitude, place_type)
@@ -0,0 +1,168 @@
+"""
+iCalendar (.ics) subscription feed of a user's trips.
+
+Each trip becomes one all-day VEVENT spanning the trip plus a timed VEVENT
+per itinerary activity (floating local time, since activities are planned in
+the destination's time). A trip's VEVENT text is cached under its content
+version (see versions.py), so when one trip changes only that trip's block is
+rebuilt; every other block comes from a single cache.get_many().
+
+Calendar apps can't log in, so the feed URL carries a signed token naming the
+user and their CalendarFeedKey secret. Rotating the secret revokes every URL
+issued before. The feed's ETag is derived from the (id, version) pairs of the user's
+trips, which the view reads with one query before deciding whether to
+answer 304.
+"""
+import hashlib
+import secrets
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db.models import Prefetch
+
+from ..models import CalendarFeedKey, ItineraryDay, TripPlan
+from . import usercache, versions
+
+ICS_FORMAT_VERSION = 1  # Bump when the VEVENT layout changes so cached blocks are rebuilt
+PRODID = '-//GlobeTrek//Trip Itineraries//EN'
+UID_DOMAIN = 'globetrek'
+_signer = signing.Signer(salt='trips.calendar-feed')
+
+
+def feed_token(user_id):
+    """The user's current feed token, creating their secret on first use
+
+    Kept in the per-user cache, so the dashboard shows the feed URL without a
+    query; rotate_feed_token() bumps the user's version to drop it.
+    """
+    return usercache.get_or_build(user_id, 'calendar:token', lambda: _sign(user_id))
+
+
+def rotate_feed_token(user_id):
+    """Give the user a new feed secret, revoking the old URL, and return the new token"""
+    CalendarFeedKey.objects.update_or_create(user_id=user_id, defaults={'secret': secrets.token_urlsafe(16)})
+    usercache.bump(user_id)
+    return feed_token(user_id)
+
+
+def _sign(user_id):
+    key, _ = CalendarFeedKey.objects.get_or_create(user_id=user_id, defaults={'secret': secrets.token_urlsafe(16)})
+    return _signer.sign(f'{user_id}:{key.secret}')
+
+
+def user_for_token(token):
+    """The user id a feed token was issued for, or None if it is forged, malformed or revoked"""
+    try:
+        user_id, secret = _signer.unsign(token).split(':')
+        user_id = int(user_id)
+    except (signing.BadSignature, ValueError):
+        return None
+    if not CalendarFeedKey.objects.filter(user_id=user_id, secret=secret).exists():
+        return None
+    return user_id
+
+
+def feed_etag(trip_versions):
+    """ETag for a feed made of `trip_versions` ([(trip id, updated_at), ...])"""
+    digest = hashlib.sha1(f'v{ICS_FORMAT_VERSION}'.encode('ascii'))
+    for trip_id, updated_at in trip_versions:
+        digest.update(f'|{trip_id}:{versions.version_token(updated_at)}'.encode('ascii'))
+    return digest.hexdigest()
+
+
+def _block_key(trip_id, updated_at):
+    return f'trips:ics:v{ICS_FORMAT_VERSION}:{trip_id}:{versions.version_token(updated_at)}'
+
+
+def feed(trip_versions):
+    """Return the calendar for `trip_versions`, building only the trip blocks not cached yet"""
+    keys = {trip_id: _block_key(trip_id, updated_at) for trip_id, updated_at in trip_versions}
+    cached = cache.get_many(keys.values())
+    blocks = {trip_id: cached[key] for trip_id, key in keys.items() if key in cached}
+
+    missing = [trip_id for trip_id in keys if trip_id not in blocks]
+    if missing:
+        trips = TripPlan.objects.filter(id__in=missing).prefetch_related(
+            Prefetch('itinerary_days', queryset=ItineraryDay.objects.order_by('day_number')),
+            'itinerary_days__activities',
+        )
+        built = {}
+        for trip in trips:
+            blocks[trip.id] = trip_block(trip)
+            # Keyed by the version actually loaded, which may be newer than the one asked for
+            built[_block_key(trip.id, trip.updated_at)] = blocks[trip.id]
+        cache.set_many(built, settings.TRIP_ICS_CACHE_TTL)
+
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{PRODID}',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        'X-WR-CALNAME:GlobeTrek trips',
+    ]
+    body = '\r\n'.join(lines) + '\r\n'
+    body += ''.join(blocks[trip_id] for trip_id in keys if trip_id in blocks)
+    return body + 'END:VCALENDAR\r\n'
+
+
+def trip_block(trip):
+    """The VEVENTs for one trip as CRLF-terminated iCalendar text"""
+    stamp = trip.updated_at.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:trip-{trip.id}@{UID_DOMAIN}',
+        f'DTSTAMP:{stamp}',
+        f'DTSTART;VALUE=DATE:{trip.start_date:%Y%m%d}',
+        f'DTEND;VALUE=DATE:{trip.end_date + timedelta(days=1):%Y%m%d}',
+        f'SUMMARY:{escape(trip.title)}',
+        f'LOCATION:{escape(trip.destination)}',
+        'TRANSP:TRANSPARENT',
+        'END:VEVENT',
+    ]
+    for day in trip.itinerary_days.all():
+        for activity in day.activities.all():
+            if activity.start_time is None:
+                # Unscheduled: an all-day entry on its day
+                span = [f'DTSTART;VALUE=DATE:{day.date:%Y%m%d}', f'DTEND;VALUE=DATE:{day.date + timedelta(days=1):%Y%m%d}']
+            else:
+                starts = datetime.combine(day.date, activity.start_time)
+                ends = starts + timedelta(minutes=activity.duration_minutes or 60)
+                span = [f'DTSTART:{starts:%Y%m%dT%H%M%S}', f'DTEND:{ends:%Y%m%dT%H%M%S}']
+            lines += [
+                'BEGIN:VEVENT',
+                f'UID:activity-{activity.id}@{UID_DOMAIN}',
+                f'DTSTAMP:{stamp}',
+                *span,
+                f'SUMMARY:{escape(activity.title)}',
+                f'LOCATION:{escape(activity.location)}',
+                f'DESCRIPTION:{escape(f"{trip.title} - {day.title}")}',
+                'END:VEVENT',
+            ]
+    return ''.join(fold(line) + '\r\n' for line in lines)
+
+
+def escape(text):
+    """Escape a TEXT value (RFC 5545 section 3.3.11)"""
+    return (
+        (text or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def fold(line, limit=75):
+    """Split a content line into pieces of at most `limit` octets, continued with a leading space"""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= limit:
+        return line
+    pieces = []
+    while encoded:
+        size = min(limit if not pieces else limit - 1, len(encoded))
+        # Never cut a multi-byte character in half
+        while size < len(encoded) and (encoded[size] & 0xC0) == 0x80:
+            size -= 1
+        pieces.append(encoded[:size].decode('utf-8'))
+        encoded = encoded[size:]
+    return '\r\n '.join(pieces)
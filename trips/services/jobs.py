@@ -0,0 +1,207 @@
+"""
+Database-backed job queue for work that shouldn't run inside a web request.
+
+Jobs live in the TripJob table and are processed by
+`python manage.py run_trip_worker`; no external broker is needed. Workers
+claim a job with SELECT ... FOR UPDATE SKIP LOCKED where the database
+supports it, and with a conditional UPDATE otherwise (SQLite), so a job is
+only ever run by one worker. A running job's lease is renewed every
+TRIP_JOB_HEARTBEAT seconds; failed jobs are retried with exponential
+backoff up to max_attempts, and jobs whose worker died are re-queued once
+their lease expires.
+"""
+import os
+import socket
+import threading
+import traceback
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connection, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import TripJob, TripPlan
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+_handlers = {}
+
+
+def handler(kind):
+    """Register a function as the handler for a job kind"""
+    def register(func):
+        _handlers[kind] = func
+        return func
+    return register
+
+
+def worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}'[:100]
+
+
+def enqueue(trip, kind='enrich_trip', delay=0):
+    """Queue a job for the trip unless an identical one is already waiting or running
+
+    The trips_job_one_active constraint makes this atomic: when two callers
+    race, the insert of the second fails and it gets the first one's job.
+    """
+    active = TripJob.objects.filter(trip=trip, kind=kind, status__in=ACTIVE_STATUSES)
+    existing = active.first()
+    if existing:
+        return existing
+    try:
+        with transaction.atomic():
+            return TripJob.objects.create(
+                trip=trip,
+                kind=kind,
+                max_attempts=settings.TRIP_JOB_MAX_ATTEMPTS,
+                run_after=timezone.now() + timedelta(seconds=delay),
+            )
+    except IntegrityError:
+        existing = active.first()
+        if existing is None:
+            raise
+        return existing
+
+
+def claim_next(worker=None):
+    """Lock and return the next runnable job, or None if the queue is empty"""
+    worker = worker or worker_id()
+    now = timezone.now()
+    runnable = TripJob.objects.filter(status='queued', run_after__lte=now).order_by('run_after', 'id')
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job = runnable.select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            job.status = 'running'
+            job.locked_by = worker
+            job.locked_at = now
+            job.attempts += 1
+            job.save(update_fields=['status', 'locked_by', 'locked_at', 'attempts', 'updated_at'])
+            return job
+
+    # No row locks available: claim with a compare-and-set UPDATE instead
+    for job_id in runnable.values_list('id', flat=True)[:10]:
+        claimed = TripJob.objects.filter(id=job_id, status='queued').update(
+            status='running',
+            locked_by=worker,
+            locked_at=now,
+            attempts=F('attempts') + 1,
+            updated_at=now,
+        )
+        if claimed:
+            return TripJob.objects.get(id=job_id)
+    return None
+
+
+def requeue_stale(lease=None):
+    """Put back jobs whose worker stopped heartbeating longer than the lease ago"""
+    lease = settings.TRIP_JOB_LEASE if lease is None else lease
+    cutoff = timezone.now() - timedelta(seconds=lease)
+    return TripJob.objects.filter(status='running', locked_at__lt=cutoff).update(
+        status='queued', locked_by='', locked_at=None, updated_at=timezone.now()
+    )
+
+
+def heartbeat(job):
+    """Renew the lease on a running job; False if it was re-queued or claimed by someone else meanwhile"""
+    return bool(
+        TripJob.objects.filter(id=job.id, status='running', locked_by=job.locked_by).update(locked_at=timezone.now())
+    )
+
+
+@contextmanager
+def leased(job):
+    """Keep renewing the job's lease from a background thread while the block runs"""
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(settings.TRIP_JOB_HEARTBEAT):
+                try:
+                    if not heartbeat(job):
+                        print(f'Lost the lease on {job}; another worker may be running it')
+                        return
+                except DatabaseError as e:
+                    print(f'Could not renew the lease on {job}: {e}')
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=beat, name=f'{threading.current_thread().name}-heartbeat', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def run_job(job):
+    """Run a claimed job and record the outcome; returns True on success
+
+    The outcome is only written while this worker still holds the lease; if
+    the job was re-queued or claimed by someone else meanwhile, nothing is
+    recorded and the result is False.
+    """
+    func = _handlers.get(job.kind)
+    try:
+        if func is None:
+            raise ValueError(f'No handler registered for job kind "{job.kind}"')
+        with leased(job):
+            func(job)
+    except Exception:
+        _record_failure(job, traceback.format_exc())
+        return False
+
+    if not _settle(job, status='done', last_error=''):
+        return False
+    job.status = 'done'
+    job.last_error = ''
+    return True
+
+
+def _record_failure(job, error):
+    job.last_error = error[-4000:]
+    if job.attempts < job.max_attempts:
+        job.status = 'queued'
+        job.run_after = timezone.now() + timedelta(seconds=settings.TRIP_JOB_RETRY_DELAY * 2 ** (job.attempts - 1))
+        generation_status = 'pending'
+    else:
+        job.status = 'failed'
+        generation_status = 'failed'
+    if _settle(job, status=job.status, run_after=job.run_after, last_error=job.last_error) and job.kind == 'enrich_trip':
+        TripPlan.objects.filter(id=job.trip_id).update(generation_status=generation_status, updated_at=timezone.now())
+
+
+def _settle(job, **outcome):
+    """Write the outcome if this worker still holds the job's lease; False if it was lost"""
+    settled = TripJob.objects.filter(id=job.id, status='running', locked_by=job.locked_by).update(
+        locked_by='', updated_at=timezone.now(), **outcome
+    )
+    if not settled:
+        print(f'Lost the lease on {job}; its outcome here is not recorded')
+        return False
+    job.locked_by = ''
+    return True
+
+
+@handler('enrich_trip')
+def enrich_trip_job(job):
+    from .enrichment import enrich_trip
+
+    TripPlan.objects.filter(id=job.trip_id).update(generation_status='processing', updated_at=timezone.now())
+    trip = TripPlan.objects.get(id=job.trip_id)
+    trip.generation_status = 'ready'
+    enrich_trip(trip, replace=True)
+
+
+@handler('render_pdf')
+def render_pdf_job(job):
+    from .pdf import ensure_pdf
+
+    # Renders whatever version the trip is at now; a no-op if that PDF already exists
+    ensure_pdf(TripPlan.objects.get(id=job.trip_id))
@@ -0,0 +1,91 @@
+"""
+Normalization of the JSON columns that used to be JSON strings in TextFields.
+
+Before those columns became JSONFields every row has to hold valid JSON of the
+expected shape: blank strings, malformed JSON and values of the wrong type are
+replaced with an empty list/dict, which is what the old get_*() accessors
+returned for them anyway. backfill() walks a table in primary key order, one
+short transaction per batch, and rewrites only rows that need it, so it can
+run against a live table. It is used by the backfill_json_fields command;
+migration 0011 runs a frozen copy of the same rules.
+"""
+import json
+import time
+
+from django.db import transaction
+
+# Model name -> {field: type every value must have}
+JSON_FIELDS = {
+    'Destination': {'popular_attractions': list},
+    'ItineraryDay': {'activities': list},  # Until migration 0014 moves it to ItineraryActivity
+    'HotelSuggestion': {'amenities': list, 'photos': list},
+    'PointOfInterest': {'opening_hours': dict, 'photos': list},
+}
+
+
+def normalize(value, expected):
+    """Return `value` decoded and coerced to `expected` (list or dict)"""
+    if isinstance(value, str):
+        try:
+            value = json.loads(value) if value.strip() else None
+        except json.JSONDecodeError:
+            value = None
+    return value if isinstance(value, expected) else expected()
+
+
+def backfill(model, fields, batch_size=500, pause=0, start_pk=0, dry_run=False, progress=None):
+    """Normalize `fields` ({name: type}) on every row of `model`; returns (scanned, fixed)
+
+    Works on TextField columns (values are written back as JSON text) and on
+    JSONField columns (values are written back as Python objects).
+    """
+    as_text = {
+        name: model._meta.get_field(name).get_internal_type() != 'JSONField'
+        for name in fields
+    }
+    rows = model._base_manager.order_by('pk').only('pk', *fields)
+    scanned = fixed = 0
+    last_pk = start_pk
+
+    while True:
+        batch = list(rows.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+        scanned += len(batch)
+
+        changed = []
+        for row in batch:
+            dirty = False
+            for name, expected in fields.items():
+                current = getattr(row, name)
+                if not _needs_fix(current, expected, as_text[name]):
+                    continue
+                value = normalize(current, expected)
+                setattr(row, name, json.dumps(value) if as_text[name] else value)
+                dirty = True
+            if dirty:
+                changed.append(row)
+
+        if changed and not dry_run:
+            with transaction.atomic():
+                model._base_manager.bulk_update(changed, list(fields))
+        fixed += len(changed)
+
+        if progress:
+            progress(model, last_pk, scanned, fixed)
+        if pause:
+            time.sleep(pause)
+
+    return scanned, fixed
+
+
+def _needs_fix(current, expected, as_text):
+    if not as_text:
+        return not isinstance(current, expected)
+    if not isinstance(current, str):
+        return True
+    try:
+        return not isinstance(json.loads(current), expected)
+    except json.JSONDecodeError:
+        return True
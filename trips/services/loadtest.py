@@ -0,0 +1,391 @@
+"""
+Offline load simulation of the main user journey against the real URL routes.
+
+Simulated users log in through accounts:login, create trips through
+trips:create, open the trip they were redirected to (trips:detail) and
+browse their dashboard (trips:dashboard), each over its own HTTP session
+with cookies and CSRF tokens, like a browser. Every request is timed per
+route; RouteStats turns the timings into throughput and p50/p95/p99.
+
+Nothing leaves the machine: StubGoogleServer answers the Geocoding and
+Places endpoints on 127.0.0.1 with made-up but well-formed results after a
+configurable latency, and fails a configurable share of calls with HTTP
+500. Pointing GOOGLE_MAPS_API_BASE at it sends the real MapsClient (pool,
+retries, circuit breaker) there. The app itself is served by LiveServer, a
+threaded WSGI server in the same process, unless the run targets a server
+started separately.
+
+Users, stub and app share one interpreter when everything runs in-process,
+so absolute numbers are a floor; for figures closer to a production node,
+run the app under its real server with GOOGLE_MAPS_API_BASE set to the
+stub's URL and drive it from here.
+"""
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urljoin, urlsplit
+
+import requests
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.db import DatabaseError, close_old_connections, connections
+from django.urls import reverse
+from django.utils import timezone
+
+from . import geoproviders, jobs
+
+STUB_PREFIX = '/maps/api/'
+CSRF_INPUT = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+# Report order, following the user journey
+ROUTES = ['GET accounts:login', 'POST accounts:login', 'POST trips:create', 'GET trips:detail', 'GET trips:dashboard']
+INTERESTS = ['food', 'museums', 'hiking', 'nightlife', 'beaches', 'architecture', 'shopping']
+
+
+class StubGoogleHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        endpoint = url.path[len(STUB_PREFIX):] if url.path.startswith(STUB_PREFIX) else url.path
+        status, payload = self.server.respond(endpoint, {k: v[0] for k, v in parse_qs(url.query).items()})
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubGoogleServer(ThreadingHTTPServer):
+    """Geocoding and Places stand-in on 127.0.0.1 with injected latency and errors"""
+
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.05, jitter=0.02, error_rate=0.0):
+        super().__init__(('127.0.0.1', port), StubGoogleHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.calls = Counter()
+        self.errors = Counter()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}{STUB_PREFIX}'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, name='stub-google', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def respond(self, endpoint, params):
+        time.sleep(max(0, random.gauss(self.latency, self.jitter)))
+        failed = random.random() < self.error_rate
+        with self.lock:
+            self.calls[endpoint] += 1
+            if failed:
+                self.errors[endpoint] += 1
+        if failed:
+            return 500, {'error_message': 'Injected failure', 'status': 'UNKNOWN_ERROR'}
+        if endpoint == 'geocode/json':
+            return 200, self.geocode(params)
+        if endpoint == 'place/nearbysearch/json':
+            return 200, self.nearby(params)
+        return 404, {'status': 'INVALID_REQUEST'}
+
+    def geocode(self, params):
+        if 'latlng' in params:
+            latitude, longitude = (float(value) for value in params['latlng'].split(','))
+            city, country = 'Stub Departure', 'Stubland'
+        else:
+            address = params.get('address', '')
+            # The same address always lands on the same spot, so caching behaves as with Google
+            latitude, longitude = geoproviders.fixture_point(address)
+            city, _, country = address.partition(',')
+            country = country.strip() or 'Stubland'
+        return {
+            'status': 'OK',
+            'results': [{
+                'formatted_address': f'{city}, {country}',
+                'geometry': {'location': {'lat': latitude, 'lng': longitude}},
+                'address_components': [
+                    {'long_name': city.strip(), 'types': ['locality', 'political']},
+                    {'long_name': country, 'types': ['country', 'political']},
+                ],
+            }],
+        }
+
+    def nearby(self, params):
+        latitude, longitude = (float(value) for value in params['location'].split(','))
+        return {
+            'status': 'OK',
+            'results': [
+                {
+                    'name': f'Stub Hotel {index + 1}',
+                    'vicinity': f'{index + 1} Load Test Street',
+                    'rating': round(3.5 + index * 0.3, 1),
+                    'geometry': {'location': {'lat': latitude + index * 0.001, 'lng': longitude - index * 0.001}},
+                    'place_id': f'stub-{latitude:.4f}-{longitude:.4f}-{index}',
+                }
+                for index in range(5)
+            ],
+        }
+
+
+class QuietWSGIRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class LiveServer:
+    """The project's WSGI application on a threaded server at 127.0.0.1"""
+
+    def __init__(self, port=0):
+        self.httpd = ThreadedWSGIServer(('127.0.0.1', port), QuietWSGIRequestHandler, allow_reuse_address=False)
+        self.httpd.set_app(get_wsgi_application())
+        self.thread = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.httpd.server_address[1]}'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='live-server', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class JobWorkers:
+    """In-process stand-in for run_trip_worker, so queued itineraries get generated during the run"""
+
+    def __init__(self, concurrency, poll_interval=0.2):
+        self.stop_event = threading.Event()
+        self.poll_interval = poll_interval
+        self.processed = self.failed = 0
+        self.lock = threading.Lock()
+        self.threads = [
+            threading.Thread(target=self.work, name=f'load-test-worker-{i}', daemon=True)
+            for i in range(concurrency)
+        ]
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join()
+
+    def work(self):
+        try:
+            while not self.stop_event.is_set():
+                close_old_connections()
+                try:
+                    job = jobs.claim_next()
+                except DatabaseError:
+                    # SQLite lock contention is expected under load; try again shortly
+                    job = None
+                if job is None:
+                    self.stop_event.wait(self.poll_interval)
+                    continue
+                try:
+                    ok = jobs.run_job(job)
+                except DatabaseError:
+                    # Left "running"; re-queued once its lease expires, as in run_trip_worker
+                    ok = False
+                with self.lock:
+                    self.processed += 1
+                    self.failed += not ok
+        finally:
+            connections.close_all()
+
+
+def percentile(ordered, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return None
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+class RouteStats:
+    """Latencies and outcomes per route, shared by all simulated users"""
+
+    def __init__(self):
+        self.timings = defaultdict(list)
+        self.errors = Counter()
+        self.statuses = defaultdict(Counter)
+        self.lock = threading.Lock()
+
+    def record(self, route, seconds, status, ok):
+        with self.lock:
+            self.timings[route].append(seconds)
+            self.statuses[route][status] += 1
+            if not ok:
+                self.errors[route] += 1
+
+    def summary(self, elapsed):
+        """{route: {requests, errors, throughput, p50, p95, p99, max, statuses}}, latencies in seconds"""
+        report = {}
+        with self.lock:
+            for route, timings in sorted(self.timings.items(), key=lambda item: ROUTES.index(item[0])):
+                ordered = sorted(timings)
+                report[route] = {
+                    'requests': len(ordered),
+                    'errors': self.errors[route],
+                    'throughput': len(ordered) / elapsed if elapsed else 0,
+                    'p50': percentile(ordered, 50),
+                    'p95': percentile(ordered, 95),
+                    'p99': percentile(ordered, 99),
+                    'max': ordered[-1],
+                    'statuses': {str(status): count for status, count in sorted(self.statuses[route].items())},
+                }
+        return report
+
+
+class SimulatedUser:
+    """One browser session: log in, then create trips, open them and check the dashboard"""
+
+    def __init__(self, base_url, email, password, stats, destinations, reads=2, think_time=0, timeout=60):
+        self.base_url = base_url
+        self.email = email
+        self.password = password
+        self.stats = stats
+        self.destinations = destinations
+        self.reads = reads
+        self.think_time = think_time
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.trips = []
+
+    def request(self, route, method, path, expect, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.session.request(
+                method, urljoin(self.base_url, path), allow_redirects=False, timeout=self.timeout, **kwargs
+            )
+        except requests.RequestException as e:
+            self.stats.record(route, time.perf_counter() - started, type(e).__name__, False)
+            return None
+        self.stats.record(route, time.perf_counter() - started, response.status_code, response.status_code == expect)
+        if self.think_time:
+            time.sleep(random.uniform(0, 2 * self.think_time))
+        return response if response.status_code == expect else None
+
+    def post(self, route, path, data):
+        # Django accepts the CSRF token from the header as well as the form
+        headers = {'X-CSRFToken': self.session.cookies.get('csrftoken', ''), 'Referer': urljoin(self.base_url, path)}
+        return self.request(route, 'POST', path, 302, data=data, headers=headers)
+
+    def login(self):
+        path = reverse('accounts:login')
+        page = self.request('GET accounts:login', 'GET', path, 200)
+        if page is None:
+            return False
+        match = CSRF_INPUT.search(page.text)
+        data = {'email': self.email, 'password': self.password}
+        if match:
+            data['csrfmiddlewaretoken'] = match.group(1)
+        return self.post('POST accounts:login', path, data) is not None
+
+    def trip_form(self):
+        start = timezone.now().date() + timedelta(days=random.randint(14, 300))
+        destination = random.choice(self.destinations)
+        interests = random.sample(INTERESTS, 3)
+        return {
+            'title': f'Load test trip to {destination}',
+            'destination': destination,
+            'departure_location': 'Stub Departure, Stubland',
+            'start_date': start.isoformat(),
+            'end_date': (start + timedelta(days=random.randint(2, 14))).isoformat(),
+            'total_budget': str(random.randint(500, 8000)),
+            'currency': 'USD',
+            'interests': ', '.join(interests),
+        }
+
+    def create_trip(self):
+        response = self.post('POST trips:create', reverse('trips:create'), self.trip_form())
+        if response is None:
+            return None
+        detail = urlsplit(response.headers['Location']).path
+        self.trips.append(detail)
+        return detail
+
+    def iteration(self):
+        detail = self.create_trip()
+        if detail:
+            self.request('GET trips:detail', 'GET', detail, 200)
+        for _ in range(self.reads):
+            self.request('GET trips:dashboard', 'GET', reverse('trips:dashboard'), 200)
+            if self.trips:
+                self.request('GET trips:detail', 'GET', random.choice(self.trips), 200)
+
+    def run(self, stop, iterations=0):
+        try:
+            if not self.login():
+                return
+            done = 0
+            while not stop.is_set() and (not iterations or done < iterations):
+                self.iteration()
+                done += 1
+        finally:
+            self.session.close()
+
+
+def create_users(prefix, count, password):
+    """Active users named <prefix><n>@example.invalid, sharing one password hash (hashing is slow on purpose)"""
+    hashed = make_password(password)
+    emails = [f'{prefix}{index}@example.invalid' for index in range(count)]
+    User.objects.bulk_create(User(username=email, email=email, password=hashed) for email in emails)
+    return emails
+
+
+def delete_users(prefix):
+    """Remove the simulated users and, through cascades, their trips and jobs"""
+    return User.objects.filter(username__startswith=prefix).delete()
+
+
+def run(base_url, emails, password, destinations, duration=30, iterations=0, reads=2, think_time=0):
+    """Drive `base_url` with one thread per user; returns (RouteStats, elapsed seconds)"""
+    stats = RouteStats()
+    stop = threading.Event()
+    users = [SimulatedUser(base_url, email, password, stats, destinations, reads, think_time) for email in emails]
+    threads = [
+        threading.Thread(target=user.run, args=(stop, iterations), name=f'load-test-user-{index}', daemon=True)
+        for index, user in enumerate(users)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    deadline = started + duration if duration else None
+    try:
+        for thread in threads:
+            while thread.is_alive():
+                if deadline and time.perf_counter() >= deadline:
+                    stop.set()
+                thread.join(0.1)
+    finally:
+        stop.set()
+    return stats, time.perf_counter() - started
@@ -0,0 +1,267 @@
+"""
+Shared client for the Google Maps web services.
+
+All outbound Geocoding and Places calls go through one MapsClient per process,
+which keeps a pooled keep-alive session, applies per-endpoint (connect, read)
+timeouts, retries transient failures with jittered exponential backoff and
+trips a circuit breaker when Google keeps failing. Before every attempt the
+client spends one call of the endpoint's shared rate and daily budget (see
+quota.py); when the budget is gone it raises QuotaExceeded instead of letting
+Google answer OVER_QUERY_LIMIT. Callers catch MapsUnavailable (QuotaExceeded
+included) and fall back to cached or sample data.
+
+Per-endpoint counters are available from get_client().stats().
+"""
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+from core import metrics
+
+from . import quota
+
+ENDPOINTS = {
+    'geocode': 'geocode/json',
+    'nearbysearch': 'place/nearbysearch/json',
+}
+
+# Google answers these with HTTP 200, but they are worth another attempt
+RETRYABLE_STATUSES = {'UNKNOWN_ERROR'}
+
+
+class MapsUnavailable(Exception):
+    """Google Maps could not be reached, or the circuit breaker is open"""
+
+
+class QuotaExceeded(MapsUnavailable):
+    """The shared rate or daily budget for an endpoint is used up"""
+
+
+class CircuitBreaker:
+    """Fail fast after repeated upstream failures, probing again after a cool-down"""
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0
+        self._probe = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Return a truthy ticket if a call may go out now, or False
+
+        The half-open probe gets a ticket of its own; release() only frees the
+        probe slot for that ticket, so a call admitted earlier can't free it.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probe = None
+            if self.state == self.HALF_OPEN and self._probe is None:
+                # Let exactly one probe through; everyone else keeps failing fast
+                self._probe = object()
+                return self._probe
+            return False
+
+    def release(self, ticket):
+        """Hand back the probe slot taken by allow() when the call didn't settle the breaker"""
+        with self._lock:
+            if self._probe is not None and ticket is self._probe:
+                self._probe = None
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe = None
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class MapsClient:
+    """Pooled, timeout-bounded client for the Google Maps JSON APIs"""
+
+    def __init__(self, api_key=None, base_url=None, timeouts=None, max_retries=None,
+                 backoff=None, pool_size=None, breaker=None, quotas=None):
+        self.api_key = api_key if api_key is not None else settings.GOOGLE_MAPS_API_KEY
+        self.base_url = base_url or settings.GOOGLE_MAPS_API_BASE
+        self.timeouts = timeouts or settings.GOOGLE_MAPS_TIMEOUTS
+        self.max_retries = max_retries if max_retries is not None else settings.GOOGLE_MAPS_MAX_RETRIES
+        self.backoff = backoff if backoff is not None else settings.GOOGLE_MAPS_RETRY_BACKOFF
+        self.quotas = quotas if quotas is not None else settings.GOOGLE_MAPS_QUOTAS
+        self.breaker = breaker or CircuitBreaker(
+            failure_threshold=settings.GOOGLE_MAPS_CIRCUIT_THRESHOLD,
+            reset_timeout=settings.GOOGLE_MAPS_CIRCUIT_RESET,
+        )
+
+        pool_size = pool_size or settings.GOOGLE_MAPS_POOL_SIZE
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_connections=len(ENDPOINTS), pool_maxsize=pool_size))
+        self.session.mount('http://', HTTPAdapter(pool_connections=len(ENDPOINTS), pool_maxsize=pool_size))
+
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+
+    def get(self, endpoint, params):
+        """Call an endpoint and return the decoded JSON body
+
+        Raises QuotaExceeded when the endpoint's budget is used up, and
+        MapsUnavailable when the circuit is open or every attempt failed.
+        Non-transient API statuses (ZERO_RESULTS, REQUEST_DENIED, ...) are
+        returned to the caller as-is.
+        """
+        ticket = self.breaker.allow()
+        if not ticket:
+            self._record(endpoint, 'CIRCUIT_OPEN', 0)
+            raise MapsUnavailable(f'Circuit open for Google Maps ({endpoint})')
+
+        limits = self.quotas.get(endpoint)
+        refused = quota.acquire(endpoint, limits)
+        if refused:
+            self.breaker.release(ticket)
+            self._record(endpoint, refused, 0)
+            raise QuotaExceeded(f'Google Maps {endpoint} budget exhausted ({refused})')
+
+        url = self.base_url + ENDPOINTS[endpoint]
+        params = {**params, 'key': self.api_key}
+        timeout = self.timeouts.get(endpoint, self.timeouts.get('default'))
+        error = None
+
+        # Every way out of here settles the breaker or hands back the half-open probe slot;
+        # a 4xx or an unexpected error must not leave the circuit waiting on a probe forever
+        try:
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    self._record_retry(endpoint)
+                    time.sleep(self._backoff_delay(attempt))
+                    refused = quota.acquire(endpoint, limits)
+                    if refused:
+                        # Retries are calls too. Running out of budget says nothing about Google's
+                        # health, so the breaker only gets its probe slot back (in the finally below)
+                        self._record(endpoint, refused, 0)
+                        raise QuotaExceeded(f'Google Maps {endpoint} budget exhausted ({refused})')
+
+                started = time.perf_counter()
+                try:
+                    response = self.session.get(url, params=params, timeout=timeout)
+                    elapsed = time.perf_counter() - started
+                    if response.status_code >= 500 or response.status_code == 429:
+                        self._record(endpoint, f'HTTP_{response.status_code}', elapsed)
+                        error = MapsUnavailable(f'Google Maps returned HTTP {response.status_code}')
+                        continue
+                    if response.status_code >= 400:
+                        # Client errors won't fix themselves and say nothing about Google's health
+                        self._record(endpoint, f'HTTP_{response.status_code}', elapsed)
+                        raise MapsUnavailable(f'Google Maps rejected the request with HTTP {response.status_code}')
+                    data = response.json()
+                    if not isinstance(data, dict):
+                        raise ValueError(f'expected a JSON object, got {type(data).__name__}')
+                except (requests.RequestException, ValueError) as e:
+                    self._record(endpoint, type(e).__name__, time.perf_counter() - started)
+                    error = e
+                    continue
+
+                status = data.get('status', 'UNKNOWN_ERROR')
+                self._record(endpoint, status, elapsed)
+                if status in RETRYABLE_STATUSES:
+                    error = MapsUnavailable(f'Google Maps returned {status}')
+                    continue
+                if status == 'OVER_QUERY_LIMIT':
+                    self.breaker.record_failure()
+                    raise MapsUnavailable('Google Maps quota exceeded')
+
+                self.breaker.record_success()
+                return data
+
+            self.breaker.record_failure()
+            raise MapsUnavailable(f'Google Maps {endpoint} failed after {self.max_retries + 1} attempts: {error}')
+        finally:
+            self.breaker.release(ticket)
+
+    def stats(self):
+        """Return a snapshot of the per-endpoint counters"""
+        with self._stats_lock:
+            snapshot = {}
+            for endpoint, counters in self._stats.items():
+                snapshot[endpoint] = {**counters, 'statuses': dict(counters['statuses'])}
+                calls = counters['calls']
+                snapshot[endpoint]['latency_avg_ms'] = counters['latency_total_ms'] / calls if calls else 0
+            snapshot['circuit_state'] = self.breaker.state
+            return snapshot
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._stats.clear()
+
+    def _backoff_delay(self, attempt):
+        # Full jitter keeps retries from many workers from lining up
+        return random.uniform(0, self.backoff * (2 ** (attempt - 1)))
+
+    def _counters(self, endpoint):
+        counters = self._stats.get(endpoint)
+        if counters is None:
+            counters = self._stats[endpoint] = {
+                'calls': 0,
+                'retries': 0,
+                'statuses': {},
+                'latency_total_ms': 0.0,
+                'latency_max_ms': 0.0,
+                'latency_last_ms': 0.0,
+            }
+        return counters
+
+    def _record(self, endpoint, status, elapsed):
+        elapsed_ms = elapsed * 1000
+        with self._stats_lock:
+            counters = self._counters(endpoint)
+            counters['statuses'][status] = counters['statuses'].get(status, 0) + 1
+            if status in ('CIRCUIT_OPEN', quota.THROTTLED, quota.OVER_QUOTA):
+                # Refused locally; nothing went out
+                return
+            metrics.record_external_call(elapsed)
+            counters['calls'] += 1
+            counters['latency_total_ms'] += elapsed_ms
+            counters['latency_last_ms'] = elapsed_ms
+            counters['latency_max_ms'] = max(counters['latency_max_ms'], elapsed_ms)
+
+    def _record_retry(self, endpoint):
+        with self._stats_lock:
+            self._counters(endpoint)['retries'] += 1
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the process-wide MapsClient, creating it on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = MapsClient()
+    return _client
+
+
+def reset_client():
+    """Drop the shared client so the next call picks up new settings"""
+    global _client
+    with _client_lock:
+        _client = None
@@ -0,0 +1,147 @@
+"""
+Build a trip's whole graph in memory and write it in one transaction.
+
+TripMaterializer applies the geocoding results to the TripPlan, allocates the
+budget exactly once, builds the ItineraryDay, ItineraryActivity and
+HotelSuggestion rows as unsaved instances, and then persists everything with
+one save() for the trip and one bulk_create() per child table. The number of
+queries no longer grows with the length of the trip or the number of hotels
+(up to the backend's limit on parameters per statement, which makes SQLite
+split the activities INSERT after about 110 rows).
+"""
+from datetime import time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+
+from ..models import ItineraryActivity, ItineraryDay, HotelSuggestion
+from .versions import suppress_touches
+
+CENT = Decimal('0.01')
+
+# (start time, activity, location, duration in minutes, share of the daily budget)
+DAY_TEMPLATE = [
+    (time(9, 0), 'Breakfast and hotel check-out', 'Hotel', 60, Decimal('0.1')),
+    (time(11, 0), 'Explore local attractions', 'City Center', 180, Decimal('0.4')),
+    (time(14, 0), 'Lunch at local restaurant', 'Downtown', 90, Decimal('0.2')),
+    (time(16, 0), 'Afternoon sightseeing', 'Tourist Area', 120, Decimal('0.2')),
+    (time(19, 0), 'Dinner and evening leisure', 'Restaurant District', 120, Decimal('0.1')),
+]
+FIRST_DAY_ACTIVITY = 'Arrival and hotel check-in'
+
+
+def build_itinerary(trip):
+    """Return unsaved ItineraryDay instances for every day of the trip"""
+    place = trip.destination_city or trip.destination
+    days = []
+    current_date = trip.start_date
+
+    for day_num in range(1, trip.days_count + 1):
+        days.append(ItineraryDay(
+            trip=trip,
+            day_number=day_num,
+            date=current_date,
+            title=f"Day {day_num} in {place}",
+            estimated_cost=trip.daily_budget,
+        ))
+        current_date += timedelta(days=1)
+
+    return days
+
+
+def build_activities(trip, days):
+    """Return unsaved ItineraryActivity instances for the given days
+
+    The days may be unsaved too; bulk_create() picks up their primary keys
+    once the days have been inserted.
+    """
+    daily_budget = Decimal(str(trip.daily_budget))
+    return [
+        ItineraryActivity(
+            day=day,
+            start_time=start_time,
+            title=FIRST_DAY_ACTIVITY if day.day_number == 1 and index == 0 else title,
+            location=location,
+            duration_minutes=duration,
+            cost=(daily_budget * share).quantize(CENT),
+        )
+        for day in days
+        for index, (start_time, title, location, duration, share) in enumerate(DAY_TEMPLATE)
+    ]
+
+
+def build_hotels(trip, places):
+    """Return unsaved HotelSuggestion instances from Places nearby search results"""
+    return [
+        HotelSuggestion(
+            trip=trip,
+            name=place['name'],
+            address=place.get('vicinity', ''),
+            rating=place.get('rating'),
+            latitude=place['geometry']['location']['lat'],
+            longitude=place['geometry']['location']['lng'],
+            google_place_id=place['place_id']
+        )
+        for place in places
+    ]
+
+
+def build_sample_hotels(trip):
+    """Return unsaved sample hotel suggestions for when Google Places can't be used"""
+    daily_budget = float(trip.daily_budget)
+    place = trip.destination_city or trip.destination
+    return [
+        HotelSuggestion(
+            trip=trip,
+            name=f'Grand Hotel {place}',
+            address=f'123 Main Street, {trip.destination}',
+            rating=4.5,
+            price_per_night=daily_budget * 0.4,
+        ),
+        HotelSuggestion(
+            trip=trip,
+            name=f'Budget Inn {place}',
+            address=f'456 Budget Ave, {trip.destination}',
+            rating=3.8,
+            price_per_night=daily_budget * 0.2,
+        ),
+        HotelSuggestion(
+            trip=trip,
+            name=f'Luxury Resort {place}',
+            address=f'789 Luxury Blvd, {trip.destination}',
+            rating=4.8,
+            price_per_night=daily_budget * 0.6,
+        ),
+    ]
+
+
+class TripMaterializer:
+    """Assemble a trip with its itinerary and hotels, then persist it in one transaction"""
+
+    def __init__(self, trip):
+        self.trip = trip
+        self.days = []
+        self.activities = []
+        self.hotels = []
+
+    def build(self, places=None):
+        """Allocate the budget and build the child rows; places=None means sample hotels"""
+        self.trip.allocate_budget()
+        self.days = build_itinerary(self.trip)
+        self.activities = build_activities(self.trip, self.days)
+        self.hotels = build_sample_hotels(self.trip) if places is None else build_hotels(self.trip, places)
+        return self
+
+    def save(self, replace=False):
+        """Write the trip and its children; replace=True drops existing children first"""
+        # Saving the trip bumps its updated_at already; skip the per-child touches
+        with transaction.atomic(), suppress_touches():
+            if replace and self.trip.pk:
+                self.trip.itinerary_days.all().delete()
+                self.trip.hotel_suggestions.all().delete()
+            # The budget was allocated in build(), don't do it again on save
+            self.trip.save(allocate=False)
+            ItineraryDay.objects.bulk_create(self.days)
+            ItineraryActivity.objects.bulk_create(self.activities)
+            HotelSuggestion.objects.bulk_create(self.hotels)
+        return self.trip
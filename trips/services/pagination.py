@@ -0,0 +1,84 @@
+"""
+Keyset ("seek") pagination.
+
+Instead of OFFSET, each page asks for rows that sort after the last row of the
+previous page, e.g. (created_at, id) < (last_created_at, last_id) for a newest
+first listing. With an index on the ordering columns every page costs the same
+no matter how deep the user goes. The position is handed to the client as an
+opaque URL-safe cursor.
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class KeysetPage:
+    """One page of results plus the cursor for the page after it"""
+
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def encode_cursor(values):
+    """Serialize ordering values into an opaque URL-safe token"""
+    payload = json.dumps([value.isoformat() if hasattr(value, 'isoformat') else value for value in values])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(model, fields, token):
+    """Turn a token back into typed ordering values, or None if it is missing or malformed"""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if not isinstance(raw, list) or len(raw) != len(fields):
+            return None
+        return [model._meta.get_field(name).to_python(value) for name, value in zip(fields, raw)]
+    except (ValueError, TypeError, ValidationError):
+        return None
+
+
+def _after(fields, values, descending=True):
+    """Q for rows that come after `values` in the order of `fields`"""
+    lookup = 'lt' if descending else 'gt'
+    query = Q()
+    for position, name in enumerate(fields):
+        step = Q(**{f'{name}__{lookup}': values[position]})
+        for previous, value in zip(fields[:position], values[:position]):
+            step &= Q(**{previous: value})
+        query |= step
+    return query
+
+
+def keyset_page(queryset, cursor=None, fields=('created_at', 'id'), per_page=20, descending=True):
+    """Return a KeysetPage of `queryset` ordered by `fields` (newest first by default)
+
+    The last field must be unique (normally the primary key) so the order is total.
+    """
+    fields = list(fields)
+    queryset = queryset.order_by(*[f'-{name}' if descending else name for name in fields])
+    values = decode_cursor(queryset.model, fields, cursor)
+    if values is not None:
+        queryset = queryset.filter(_after(fields, values, descending))
+
+    rows = list(queryset[:per_page + 1])
+    items = rows[:per_page]
+    next_cursor = None
+    if len(rows) > per_page:
+        last = items[-1]
+        next_cursor = encode_cursor([getattr(last, name) for name in fields])
+    return KeysetPage(items, next_cursor)
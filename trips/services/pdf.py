@@ -0,0 +1,118 @@
+"""
+Itinerary PDF export.
+
+A trip's PDF is stored on disk at TRIP_PDF_ROOT/<trip id>/<version>.pdf,
+where the version combines TRIP_PDF_TEMPLATE_VERSION with the trip's content
+version (see versions.py), so a PDF is rendered at most once per version of
+the trip and repeat downloads are plain file reads. Older versions are
+removed when a new one is written.
+
+Turning HTML into PDF with xhtml2pdf is pure-Python and CPU-bound, so it runs
+in a small process pool instead of the calling thread: a render never holds
+the GIL of a web process or of the trip worker's other threads. The pool
+only receives the HTML string, so its processes need no Django setup or
+database connection. The download view hands rendering to the background
+worker (job kind "render_pdf") unless TRIP_PDF_ASYNC is off.
+"""
+import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils.text import slugify
+
+from . import versions
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class PDFRenderError(Exception):
+    """xhtml2pdf could not turn the itinerary into a PDF"""
+
+
+def pdf_version(updated_at):
+    return f'{settings.TRIP_PDF_TEMPLATE_VERSION}-{versions.version_token(updated_at)}'
+
+
+def trip_dir(trip_id):
+    return Path(settings.TRIP_PDF_ROOT) / str(trip_id)
+
+
+def pdf_path(trip_id, updated_at):
+    """Where the PDF for this version of the trip lives (it may not exist yet)"""
+    return trip_dir(trip_id) / f'{pdf_version(updated_at)}.pdf'
+
+
+def pdf_filename(trip):
+    """Download name, e.g. "weekend-in-lisbon.pdf\""""
+    return f'{slugify(trip.title) or "itinerary"}.pdf'
+
+
+def render_html(trip):
+    """Render the printable itinerary; three queries whatever the trip length"""
+    itinerary_days = trip.itinerary_days.with_planned_cost().prefetch_related('activities').order_by('day_number')
+    return render_to_string('trips/itinerary_pdf.html', {
+        'trip': trip,
+        'itinerary_days': itinerary_days,
+        'hotels': trip.hotel_suggestions.all()[:5],
+    })
+
+
+def html_to_pdf(html):
+    """Convert HTML to PDF bytes; runs inside the pool processes"""
+    from xhtml2pdf import pisa
+
+    output = io.BytesIO()
+    result = pisa.CreatePDF(html, dest=output, encoding='utf-8')
+    if result.err:
+        raise PDFRenderError(f'xhtml2pdf reported {result.err} error(s)')
+    return output.getvalue()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the caller is usually multi-threaded
+            _pool = ProcessPoolExecutor(
+                max_workers=max(1, settings.TRIP_PDF_WORKERS),
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _pool
+
+
+def ensure_pdf(trip):
+    """Return the path of the trip's current PDF, rendering it first if needed"""
+    path = pdf_path(trip.id, trip.updated_at)
+    if path.exists():
+        return path
+
+    content = _get_pool().submit(html_to_pdf, render_html(trip)).result(timeout=settings.TRIP_PDF_RENDER_TIMEOUT)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write then rename so a concurrent download never sees half a file
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(content)
+        os.replace(tmp_name, path)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+
+    for old in path.parent.glob('*.pdf'):
+        if old != path:
+            old.unlink(missing_ok=True)
+    return path
+
+
+def discard(trip_id):
+    """Remove every stored PDF of a trip"""
+    shutil.rmtree(trip_dir(trip_id), ignore_errors=True)
@@ -0,0 +1,122 @@
+"""
+Deadline-bounded executor for independent pipeline stages.
+
+Stages are plain callables registered with the names of the stages they
+depend on. Stages whose dependencies are satisfied run concurrently on a
+shared thread pool; each receives its dependencies' results as keyword
+arguments. When the deadline passes, run() returns whatever finished and
+leaves the stragglers to complete in the background unobserved.
+
+    pipeline = Pipeline()
+    pipeline.add('destination', lambda: geocode('Paris'))
+    pipeline.add('hotels', lambda destination: nearby(destination), depends_on=['destination'])
+    result = pipeline.run(timeout=5)
+    result.get('hotels')
+"""
+import contextvars
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import connections
+
+from core import metrics
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the process-wide thread pool used for pipeline stages"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.TRIP_PIPELINE_WORKERS,
+                    thread_name_prefix='trip-pipeline',
+                )
+    return _executor
+
+
+def _call(func, kwargs):
+    try:
+        # Runs in the submitting request's context, so its queries and calls show up in that request's metrics
+        with metrics.track_queries():
+            return func(**kwargs)
+    finally:
+        # Stage threads get their own DB connections; don't leak them
+        connections.close_all()
+
+
+class PipelineResult:
+    """Outcome of a pipeline run"""
+
+    def __init__(self, results, errors, timed_out, skipped):
+        self.results = results
+        self.errors = errors
+        self.timed_out = timed_out
+        self.skipped = skipped
+
+    def get(self, name, default=None):
+        return self.results.get(name, default)
+
+    def __contains__(self, name):
+        return name in self.results
+
+
+class Pipeline:
+    """Run named stages concurrently, respecting dependencies, until a deadline"""
+
+    def __init__(self, executor=None):
+        self.executor = executor
+        self._stages = {}
+
+    def add(self, name, func, depends_on=()):
+        for dependency in depends_on:
+            if dependency not in self._stages:
+                raise ValueError(f'Stage "{name}" depends on unknown stage "{dependency}"')
+        self._stages[name] = (func, tuple(depends_on))
+        return self
+
+    def run(self, timeout):
+        executor = self.executor or get_executor()
+        deadline = time.monotonic() + timeout
+        results, errors, skipped = {}, {}, set()
+        waiting = dict(self._stages)
+        pending = {}
+
+        def submit_ready():
+            changed = True
+            while changed:
+                changed = False
+                for name, (func, depends_on) in list(waiting.items()):
+                    if any(dep in errors or dep in skipped for dep in depends_on):
+                        skipped.add(name)
+                    elif all(dep in results for dep in depends_on):
+                        kwargs = {dep: results[dep] for dep in depends_on}
+                        pending[executor.submit(contextvars.copy_context().run, _call, func, kwargs)] = name
+                    else:
+                        continue
+                    del waiting[name]
+                    changed = True
+
+        submit_ready()
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = pending.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    errors[name] = e
+            submit_ready()
+
+        for future in pending:
+            future.cancel()
+        timed_out = set(pending.values()) | set(waiting)
+        return PipelineResult(results, errors, timed_out, skipped)
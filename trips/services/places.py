@@ -0,0 +1,115 @@
+"""
+Places nearby search with a cache shared across trips.
+
+Results are keyed by the geohash cell of the destination (PLACES_CACHE_PRECISION
+characters) plus the place type, and the search itself is centred on the cell
+rather than on the exact coordinates, so every trip to the same part of a city
+gets the same answer and only the first one costs an API call. Entries expire
+after PLACES_CACHE_TTL, and once there are more than PLACES_CACHE_MAX_ENTRIES
+the least recently used ones are evicted, at most every
+PLACES_CACHE_EVICT_INTERVAL seconds per process rather than on every miss.
+"""
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import PlacesCacheEntry
+from .geo import geohash_center, geohash_encode
+from .geocoding import SingleFlight
+from .maps import MapsUnavailable, get_client
+
+MAX_RESULTS = 10
+
+_flight = SingleFlight()
+_evicted_at = None
+_evict_lock = threading.Lock()
+
+
+def nearby(latitude, longitude, place_type='lodging'):
+    """Return up to MAX_RESULTS Places results near the coordinates, or None if unavailable"""
+    cell = geohash_encode(latitude, longitude, settings.PLACES_CACHE_PRECISION)
+    return _flight.do((cell, place_type), lambda: _load(cell, place_type))
+
+
+def _load(cell, place_type):
+    now = timezone.now()
+    entry = PlacesCacheEntry.objects.filter(cell=cell, place_type=place_type, expires_at__gt=now).first()
+    if entry:
+        PlacesCacheEntry.objects.filter(id=entry.id).update(last_used_at=now, hit_count=F('hit_count') + 1)
+        return entry.get_results()
+
+    results = _fetch(cell, place_type)
+    if results is None:
+        return None
+
+    PlacesCacheEntry.objects.update_or_create(
+        cell=cell,
+        place_type=place_type,
+        defaults={
+            'results': results,
+            'hit_count': 0,
+            'expires_at': now + timedelta(seconds=settings.PLACES_CACHE_TTL),
+            'last_used_at': now,
+        }
+    )
+    maybe_evict()
+    return results
+
+
+def _fetch(cell, place_type):
+    if not settings.GOOGLE_MAPS_API_KEY:
+        return None
+
+    latitude, longitude = geohash_center(cell)
+    try:
+        data = get_client().get('nearbysearch', {
+            'location': f'{latitude},{longitude}',
+            'radius': str(settings.PLACES_SEARCH_RADIUS),
+            'type': place_type,
+        })
+    except MapsUnavailable as e:
+        print(f"Places unavailable: {e}")
+        return None
+
+    if data['status'] == 'ZERO_RESULTS':
+        return []
+    if data['status'] != 'OK':
+        return None
+    return [_slim(place) for place in data['results'][:MAX_RESULTS]]
+
+
+def _slim(place):
+    """Keep only the fields trips copy out of a Places result"""
+    return {
+        'name': place['name'],
+        'vicinity': place.get('vicinity', ''),
+        'rating': place.get('rating'),
+        'geometry': {'location': place['geometry']['location']},
+        'place_id': place['place_id'],
+    }
+
+
+def maybe_evict():
+    """Run evict() if this process hasn't in the last PLACES_CACHE_EVICT_INTERVAL seconds"""
+    global _evicted_at
+    with _evict_lock:
+        now = time.monotonic()
+        if _evicted_at is not None and now - _evicted_at < settings.PLACES_CACHE_EVICT_INTERVAL:
+            return
+        _evicted_at = now
+    evict()
+
+
+def evict(max_entries=None):
+    """Drop expired entries and the least recently used ones beyond the cap"""
+    max_entries = settings.PLACES_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+    PlacesCacheEntry.objects.filter(expires_at__lte=timezone.now()).delete()
+    stale_ids = list(
+        PlacesCacheEntry.objects.order_by('-last_used_at', '-id').values_list('id', flat=True)[max_entries:]
+    )
+    if stale_ids:
+        PlacesCacheEntry.objects.filter(id__in=stale_ids).delete()
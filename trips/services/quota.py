@@ -0,0 +1,113 @@
+"""
+Shared rate and daily-quota governor for outbound Google Maps calls.
+
+Every process (gunicorn workers, run_trip_worker, management commands)
+consults the same state in the database before a call goes out:
+
+- a token bucket per endpoint (ApiRateBucket) refilled at `rate` tokens per
+  second up to `burst`. A token is taken with one conditional UPDATE that
+  refills and decrements in the same statement, so concurrent workers can
+  never overspend it;
+- a per-day call counter (ApiQuotaUsage), also bumped with a conditional
+  UPDATE, that refuses calls once the endpoint's `daily` quota is used up.
+  Quota days follow GOOGLE_MAPS_QUOTA_TIMEZONE, because Google resets quotas
+  at midnight Pacific time.
+
+acquire() waits up to a deadline for a token, then gives up; MapsClient
+turns a refusal into QuotaExceeded (a MapsUnavailable), which callers
+already answer with cached or sample data. In tests and local development
+the same tables live in SQLite.
+"""
+import random
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db.models import F, Value
+from django.db.models.functions import Greatest, Least
+from django.db.models.lookups import GreaterThanOrEqual
+
+from ..models import ApiQuotaUsage, ApiRateBucket
+
+THROTTLED = 'THROTTLED'
+OVER_QUOTA = 'OVER_QUOTA'
+
+
+def quota_day():
+    return datetime.now(ZoneInfo(settings.GOOGLE_MAPS_QUOTA_TIMEZONE)).date()
+
+
+def acquire(endpoint, limits, wait=None):
+    """Spend one call of `endpoint`'s budget
+
+    Returns None when the call may go out, or THROTTLED / OVER_QUOTA when it
+    must not. `limits` is the endpoint's entry in GOOGLE_MAPS_QUOTAS; an
+    endpoint without limits is never refused.
+    """
+    if not limits:
+        return None
+    wait = settings.GOOGLE_MAPS_QUOTA_WAIT if wait is None else wait
+
+    day = quota_day()
+    usage = ApiQuotaUsage.objects.filter(endpoint=endpoint, day=day)
+    if not count_call(endpoint, day, limits.get('daily')):
+        usage.update(over_quota=F('over_quota') + 1)
+        return OVER_QUOTA
+
+    deadline = time.monotonic() + wait
+    while not take_token(endpoint, limits['rate'], limits['burst']):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            # The call never went out, so it doesn't count against the day
+            usage.update(calls=F('calls') - 1, throttled=F('throttled') + 1)
+            return THROTTLED
+        # About one token's worth of time, jittered so waiting workers don't retry in step
+        time.sleep(min(remaining, random.uniform(0.5, 1.0) / limits['rate']))
+    return None
+
+
+def take_token(endpoint, rate, burst):
+    """Take one token from the endpoint's bucket; returns False if it is empty"""
+    now = time.time()
+    # Never let a worker with a slow clock drain the bucket or wind refilled_at back
+    elapsed = Greatest(Value(0.0), Value(now) - F('refilled_at'))
+    refilled = Least(Value(float(burst)), F('tokens') + elapsed * Value(float(rate)))
+    bucket = ApiRateBucket.objects.filter(GreaterThanOrEqual(refilled, Value(1.0)), endpoint=endpoint)
+    changes = {'tokens': refilled - Value(1.0), 'refilled_at': Greatest(F('refilled_at'), Value(now))}
+    if bucket.update(**changes):
+        return True
+    # Empty, or the endpoint has no bucket yet (another process may be creating it right now)
+    ApiRateBucket.objects.get_or_create(endpoint=endpoint, defaults={'tokens': burst, 'refilled_at': now})
+    return bool(bucket.update(**changes))
+
+
+def count_call(endpoint, day, daily):
+    """Add a call to the day's counter unless that would exceed `daily`; returns False if it would"""
+    usage = ApiQuotaUsage.objects.filter(endpoint=endpoint, day=day)
+    if daily is not None:
+        usage = usage.filter(calls__lt=daily)
+    if usage.update(calls=F('calls') + 1):
+        return True
+    # Over quota, or the first call of the day (another process may be creating the row right now)
+    ApiQuotaUsage.objects.get_or_create(endpoint=endpoint, day=day)
+    return bool(usage.update(calls=F('calls') + 1))
+
+
+def usage_report(days=7):
+    """Per endpoint, per day usage for the last `days` quota days, newest first"""
+    today = quota_day()
+    rows = ApiQuotaUsage.objects.filter(day__gt=today - timedelta(days=days)).order_by('-day', 'endpoint')
+    report = []
+    for row in rows:
+        daily = (settings.GOOGLE_MAPS_QUOTAS.get(row.endpoint) or {}).get('daily')
+        report.append({
+            'day': row.day,
+            'endpoint': row.endpoint,
+            'calls': row.calls,
+            'throttled': row.throttled,
+            'over_quota': row.over_quota,
+            'daily_quota': daily,
+            'used': row.calls / daily if daily else None,
+        })
+    return report
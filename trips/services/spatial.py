@@ -0,0 +1,127 @@
+"""
+Spatial queries over models that carry a geohash `geo_cell` column.
+
+Each row stores the geohash of its coordinates at CELL_PRECISION characters in
+an indexed column. A cell and everything inside it share a prefix, so "rows in
+cell X" is an index range scan (X <= geo_cell < X + '~') on any database.
+nearest() and within_bbox() use those range scans to narrow the candidates to
+a handful of cells and only then compare exact coordinates.
+"""
+import math
+
+from django.db import models
+from django.db.models import Q
+
+from .geo import (
+    EARTH_RADIUS_KM,
+    geohash_cell_size,
+    geohash_cover,
+    geohash_encode,
+    geohash_neighbors,
+    haversine_km,
+)
+
+# Stored cell length (~4.8m x 4.8m); changing it requires re-running the backfill
+CELL_PRECISION = 9
+
+# nearest() starts looking around a cell of this length (~150m) and widens from there
+SEARCH_PRECISION = 7
+
+# within_bbox() picks the finest precision that covers the box with at most this many cells
+MAX_COVER_CELLS = 32
+
+_KM_PER_DEGREE = EARTH_RADIUS_KM * math.pi / 180
+_CELL_END = '~'  # Sorts after every base32 character
+
+
+def geo_cell_for(latitude, longitude):
+    """Return the stored cell for a pair of coordinates, or '' when either is missing"""
+    if latitude is None or longitude is None:
+        return ''
+    return geohash_encode(latitude, longitude, CELL_PRECISION)
+
+
+def cells_q(cells):
+    """Q matching rows whose geo_cell lies inside any of the given (shorter) cells"""
+    query = Q()
+    for cell in cells:
+        query |= Q(geo_cell__gte=cell, geo_cell__lt=cell + _CELL_END)
+    return query
+
+
+def _reach_km(latitude, precision):
+    """Distance from a point that is guaranteed to stay inside its cell's 3x3 block"""
+    height, width = geohash_cell_size(precision)
+    poleward = min(abs(latitude) + height, 90.0)
+    return min(height * _KM_PER_DEGREE, width * _KM_PER_DEGREE * math.cos(math.radians(poleward)))
+
+
+def _cover_precision(south, west, north, east):
+    for precision in range(CELL_PRECISION, 0, -1):
+        height, width = geohash_cell_size(precision)
+        count = (math.ceil((north - south) / height) + 1) * (math.ceil((east - west) / width) + 1)
+        if count <= MAX_COVER_CELLS:
+            return precision
+    return 1
+
+
+class SpatialQuerySet(models.QuerySet):
+    """QuerySet for models with latitude, longitude and geo_cell fields"""
+
+    def _ranked(self, latitude, longitude, max_km=None):
+        """(distance_km, pk) of the rows within max_km, closest first; reads only the coordinates"""
+        ranked = []
+        for pk, row_latitude, row_longitude in self.values_list('pk', 'latitude', 'longitude'):
+            distance = haversine_km(latitude, longitude, row_latitude, row_longitude)
+            if max_km is None or distance <= max_km:
+                ranked.append((distance, pk))
+        ranked.sort()
+        return ranked
+
+    def _with_distances(self, ranked):
+        """Load the full rows for (distance_km, pk) pairs, in that order"""
+        rows = self.in_bulk([pk for _, pk in ranked])
+        located = []
+        for distance, pk in ranked:
+            obj = rows[pk]
+            obj.distance_km = distance
+            located.append(obj)
+        return located
+
+    def nearest(self, latitude, longitude, k=1, max_km=None):
+        """Return the k closest rows as a list, each with a distance_km attribute
+
+        Candidates come from the 3x3 block of cells around the point, widening
+        one precision level at a time until the k-th candidate is closer than
+        the block edge (or the block already spans max_km). Candidates are
+        ranked from their coordinates alone; only the k winners are loaded in full.
+        """
+        latitude, longitude = float(latitude), float(longitude)
+        located = self.exclude(geo_cell='')
+
+        for precision in range(SEARCH_PRECISION, 0, -1):
+            cells = geohash_neighbors(geohash_encode(latitude, longitude, precision))
+            candidates = located.filter(cells_q(cells))._ranked(latitude, longitude, max_km)
+            reach = _reach_km(latitude, precision)
+            if len(candidates) >= k and candidates[k - 1][0] <= reach:
+                return located._with_distances(candidates[:k])
+            if max_km is not None and max_km <= reach:
+                return located._with_distances(candidates[:k])
+
+        # Near the poles or in a nearly empty table: rank everything
+        return located._with_distances(located._ranked(latitude, longitude, max_km)[:k])
+
+    def within_bbox(self, south, west, north, east):
+        """Filter to rows inside a bounding box; west > east means it crosses the antimeridian"""
+        south, west, north, east = float(south), float(west), float(north), float(east)
+        if west > east:
+            boxes = [(south, west, north, 180.0), (south, -180.0, north, east)]
+            longitude_q = Q(longitude__gte=west) | Q(longitude__lte=east)
+        else:
+            boxes = [(south, west, north, east)]
+            longitude_q = Q(longitude__gte=west, longitude__lte=east)
+
+        cells = []
+        for box in boxes:
+            cells.extend(geohash_cover(*box, _cover_precision(*box)))
+        return self.filter(cells_q(cells), longitude_q, latitude__gte=south, latitude__lte=north)
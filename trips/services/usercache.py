@@ -0,0 +1,85 @@
+"""
+Per-user cache for trip-derived page context (dashboard stats and pages, the
+home page's recent trips).
+
+Every key embeds the user's current version number, e.g.
+trips:user:42:v7:home. TripPlan post_save/post_delete signals (and bulk
+writers that bypass signals) call bump(), which increments the version, so the
+next request misses and rebuilds while the old entries simply age out. A hit
+costs two cache reads and no trip queries.
+
+The version lives in the default cache, so invalidation is only exact across
+processes (web, trip worker, management commands) when that cache is shared,
+e.g. Redis or Memcached in production; see CACHES in settings.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def _version_key(user_id):
+    return f'trips:user:{user_id}:version'
+
+
+def version(user_id):
+    """Return the user's current cache version"""
+    key = _version_key(user_id)
+    current = cache.get(key)
+    if current is None:
+        # Start from the clock so a version lost to eviction can't be reused and
+        # match stale entries; add() keeps a concurrent bump() from being overwritten
+        cache.add(key, time.time_ns() // 1000, None)
+        current = cache.get(key)
+    return current
+
+
+def bump(user_id):
+    """Invalidate everything cached for the user"""
+    key = _version_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # No version yet (or it was evicted); a fresh one is already new
+        version(user_id)
+
+
+def get_or_build(user_id, name, build, timeout=None):
+    """Return the cached value for (user, name), calling build() on a miss"""
+    timeout = settings.USER_CACHE_TTL if timeout is None else timeout
+    key = f'trips:user:{user_id}:v{version(user_id)}:{name}'
+    value = cache.get(key)
+    section = name.split(':', 1)[0]
+    if value is not None:
+        _record(section, 'hits')
+        return value
+
+    _record(section, 'misses')
+    value = build()
+    cache.set(key, value, timeout)
+    return value
+
+
+def _record(section, outcome):
+    with _stats_lock:
+        counters = _stats.setdefault(section, {'hits': 0, 'misses': 0})
+        counters[outcome] += 1
+
+
+def stats():
+    """Return per-section hit/miss counters for this process"""
+    with _stats_lock:
+        snapshot = {}
+        for section, counters in _stats.items():
+            lookups = counters['hits'] + counters['misses']
+            snapshot[section] = {**counters, 'hit_rate': counters['hits'] / lookups if lookups else 0}
+        return snapshot
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
@@ -0,0 +1,45 @@
+"""
+Trip content versions.
+
+TripPlan.updated_at is the version of everything the trip detail page shows.
+Saving the trip bumps it (auto_now); saving or deleting an itinerary day,
+activity, hotel suggestion or point of interest bumps it through touch(),
+which the signals in trips/signals.py call. The UPDATE runs once the change
+commits, so a reader can never cache old content under the new version.
+
+Code that rewrites a trip's children and saves the trip itself in the same
+transaction (TripMaterializer) wraps the work in suppress_touches() so a
+replaced itinerary doesn't cost one UPDATE per deleted row.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.utils import timezone
+
+_local = threading.local()
+
+
+@contextmanager
+def suppress_touches():
+    """Skip touch() calls made by this thread inside the block"""
+    depth = getattr(_local, 'suppressed', 0)
+    _local.suppressed = depth + 1
+    try:
+        yield
+    finally:
+        _local.suppressed = depth
+
+
+def touch(**lookup):
+    """Bump updated_at on the trip(s) matching `lookup` after the current transaction commits"""
+    if getattr(_local, 'suppressed', 0):
+        return
+    from ..models import TripPlan
+
+    transaction.on_commit(lambda: TripPlan.objects.filter(**lookup).update(updated_at=timezone.now()))
+
+
+def version_token(updated_at):
+    """Short string identifying a trip version, for ETags and cache keys"""
+    return format(int(updated_at.timestamp() * 1_000_000), 'x')
@@ -0,0 +1,48 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Destination, HotelSuggestion, ItineraryActivity, ItineraryDay, PointOfInterest, TripPlan
+from .services import gazetteer, pdf, usercache, versions
+
+
+@receiver(post_save, sender=Destination)
+def update_gazetteer_on_save(sender, instance, **kwargs):
+    """Keep this process's destination search index in step with the table"""
+    gazetteer.destination_saved(instance)
+
+
+@receiver(post_delete, sender=Destination)
+def update_gazetteer_on_delete(sender, instance, **kwargs):
+    gazetteer.destination_deleted(instance.id)
+
+
+@receiver(post_save, sender=TripPlan)
+@receiver(post_delete, sender=TripPlan)
+def invalidate_user_cache(sender, instance, **kwargs):
+    """Drop the owner's cached dashboard/home context once the change is visible to readers"""
+    user_id = instance.user_id
+    transaction.on_commit(lambda: usercache.bump(user_id))
+
+
+@receiver(post_delete, sender=TripPlan)
+def discard_trip_pdfs(sender, instance, **kwargs):
+    trip_id = instance.id
+    transaction.on_commit(lambda: pdf.discard(trip_id))
+
+
+@receiver(post_save, sender=ItineraryDay)
+@receiver(post_delete, sender=ItineraryDay)
+@receiver(post_save, sender=HotelSuggestion)
+@receiver(post_delete, sender=HotelSuggestion)
+@receiver(post_save, sender=PointOfInterest)
+@receiver(post_delete, sender=PointOfInterest)
+def touch_trip(sender, instance, **kwargs):
+    """A changed child changes what the trip detail page shows"""
+    versions.touch(pk=instance.trip_id)
+
+
+@receiver(post_save, sender=ItineraryActivity)
+@receiver(post_delete, sender=ItineraryActivity)
+def touch_trip_of_activity(sender, instance, **kwargs):
+    versions.touch(itinerary_days__id=instance.day_id)
@@ -1,3 +1,1277 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .management.commands import export_trips
+from .management.commands.recalculate_budgets import as_stored
+from .models import (
+    ApiQuotaUsage, CalendarFeedKey, Destination, GeocodeCacheEntry, ItineraryActivity, PlacesCacheEntry, TripJob,
+    TripPlan,
+)
+from .services import (
+    benchmarks, flights, gazetteer, geocoding, geoproviders, ical, jobs, jsondata, loadtest, places, usercache,
+)
+from .services.budget import BUDGET_FIELDS
+from .services.enrichment import enrich_trip
+from .services.geo import haversine_km
+from .services.maps import CircuitBreaker, MapsClient, MapsUnavailable, QuotaExceeded
+from .services.materializer import TripMaterializer
+from .services.pipeline import Pipeline
+
+
+class TripMaterializerTests(TestCase):
+    """Persisting a trip graph must cost the same number of queries for any trip length"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='traveler@example.com', password='secret-pass-123')
+
+    def make_trip(self, days):
+        start = date.today() + timedelta(days=30)
+        return TripPlan(
+            user=self.user,
+            title='City break',
+            destination='Lisbon, Portugal',
+            departure_location='London, UK',
+            start_date=start,
+            end_date=start + timedelta(days=days - 1),
+            days_count=days,
+            total_budget=3000,
+            interests='food, history',
+        )
+
+    def test_query_count_is_independent_of_trip_length(self):
+        # Two weeks of activities still fit in one INSERT under SQLite's 999 parameter cap
+        for days in (1, 14):
+            with self.subTest(days=days):
+                materializer = TripMaterializer(self.make_trip(days)).build()
+                # SAVEPOINT, INSERT trip, INSERT days, INSERT activities, INSERT hotels, RELEASE SAVEPOINT
+                with self.assertNumQueries(6):
+                    trip = materializer.save()
+                self.assertEqual(trip.itinerary_days.count(), days)
+                self.assertEqual(ItineraryActivity.objects.filter(day__trip=trip).count(), days * 5)
+                self.assertEqual(trip.hotel_suggestions.count(), 3)
+
+    def test_budget_is_allocated_once(self):
+        trip = self.make_trip(7)
+        with mock.patch.object(TripPlan, 'allocate_budget', autospec=True, side_effect=TripPlan.allocate_budget) as allocate:
+            TripMaterializer(trip).build().save()
+        self.assertEqual(allocate.call_count, 1)
+
+    def test_replace_rebuilds_children(self):
+        trip = TripMaterializer(self.make_trip(3)).build().save()
+        TripMaterializer(trip).build().save(replace=True)
+        self.assertEqual(trip.itinerary_days.count(), 3)
+        self.assertEqual(trip.hotel_suggestions.count(), 3)
+
+    def test_cost_rollups_match_activities(self):
+        trip = TripMaterializer(self.make_trip(3)).build().save()
+        activities = ItineraryActivity.objects.filter(day__trip=trip)
+        self.assertEqual(trip.planned_cost(), sum(activity.cost for activity in activities))
+        self.assertEqual(TripPlan.objects.with_planned_cost().get(pk=trip.pk).planned_cost, trip.planned_cost())
+        for day in trip.itinerary_days.with_planned_cost():
+            self.assertEqual(day.planned_cost, sum(activity.cost for activity in activities if activity.day_id == day.id))
+
+
+class SpatialQueryTests(TestCase):
+    """Cell-narrowed queries must agree with a brute-force scan"""
+
+    @classmethod
+    def setUpTestData(cls):
+        points = [(51.5074, -0.1278), (48.8566, 2.3522), (52.52, 13.405), (40.4168, -3.7038),
+                  (41.9028, 12.4964), (-33.8688, 151.2093), (35.6762, 139.6503), (64.1466, -21.9426),
+                  (-17.8, 178.4), (-18.1, -179.9)]
+        for index, (latitude, longitude) in enumerate(points):
+            Destination.objects.create(name=f'Place {index}', city=f'City {index}', country='Testland',
+                                       latitude=latitude, longitude=longitude)
+
+    def test_nearest_matches_brute_force(self):
+        destinations = list(Destination.objects.all())
+        for latitude, longitude in [(50.0, 1.0), (0.0, 0.0), (-18.0, 179.9), (70.0, -20.0)]:
+            expected = sorted(destinations, key=lambda d: haversine_km(latitude, longitude, d.latitude, d.longitude))
+            nearest = Destination.objects.nearest(latitude, longitude, k=3)
+            self.assertEqual([d.id for d in nearest], [d.id for d in expected[:3]])
+
+    def test_nearest_respects_max_km(self):
+        self.assertEqual(Destination.objects.nearest(51.6, -0.1, max_km=5), [])
+        self.assertEqual(Destination.objects.nearest(51.5, -0.12, max_km=5)[0].city, 'City 0')
+
+    def test_nearest_loads_only_the_winners_in_full(self):
+        with CaptureQueriesContext(connection) as queries:
+            nearest = Destination.objects.nearest(50.0, 1.0, k=2)
+        self.assertEqual(nearest[0].description, '')
+        self.assertGreater(nearest[1].distance_km, nearest[0].distance_km)
+        *ranking, load = [query['sql'] for query in queries]
+        self.assertTrue(all('"description"' not in sql for sql in ranking))
+        self.assertIn('"description"', load)
+
+    def test_within_bbox_crossing_antimeridian(self):
+        cities = set(Destination.objects.within_bbox(-20, 178, -15, -179).values_list('city', flat=True))
+        self.assertEqual(cities, {'City 8', 'City 9'})
+
+
+class DashboardCacheTests(TestCase):
+    """Cached dashboard context must skip trip queries and be dropped when a trip changes"""
+
+    def setUp(self):
+        cache.clear()
+        usercache.reset_stats()
+        self.user = User.objects.create_user(username='planner@example.com', password='secret-pass-123')
+        self.client.force_login(self.user)
+        self.trip = TripPlan.objects.create(
+            user=self.user, title='Weekend away', destination='Porto, Portugal',
+            start_date=date(2030, 5, 1), end_date=date(2030, 5, 3), days_count=3,
+            total_budget=900, interests='food',
+        )
+
+    def test_second_request_is_served_from_cache(self):
+        self.client.get(reverse('trips:dashboard'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('trips:dashboard'))
+        self.assertFalse([query for query in queries if 'trips_tripplan' in query['sql']])
+        self.assertContains(response, 'Weekend away')
+        self.assertEqual(usercache.stats()['dashboard']['hits'], 2)
+
+    def test_saving_a_trip_invalidates(self):
+        self.client.get(reverse('trips:dashboard'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.trip.title = 'Long weekend'
+            self.trip.save()
+        self.assertContains(self.client.get(reverse('trips:dashboard')), 'Long weekend')
+
+    def test_deleting_a_trip_invalidates_home(self):
+        self.assertEqual(self.client.get(reverse('core:home')).context['user_trip_count'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.trip.delete()
+        self.assertEqual(self.client.get(reverse('core:home')).context['user_trip_count'], 0)
+
+
+class TripDetailConditionalTests(TestCase):
+    """trip_detail must answer 304 for an unchanged trip and a new ETag once a child row changes"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='planner@example.com', password='secret-pass-123')
+        self.client.force_login(self.user)
+        trip = TripPlan(
+            user=self.user, title='City break', destination='Lisbon, Portugal',
+            start_date=date(2030, 6, 1), end_date=date(2030, 6, 3), days_count=3,
+            total_budget=1500, interests='food',
+        )
+        TripMaterializer(trip).build().save()
+        self.trip = trip
+        self.url = reverse('trips:detail', args=[trip.id])
+
+    def test_unchanged_trip_is_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_activity_change_updates_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        activity = ItineraryActivity.objects.filter(day__trip=self.trip).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            activity.title = 'Tram 28 ride'
+            activity.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Tram 28 ride')
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class TripPDFTests(TestCase):
+    """PDFs are rendered in the background once per trip version and then served from disk"""
+
+    def setUp(self):
+        pdf_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, pdf_root, ignore_errors=True)
+        settings_override = override_settings(TRIP_PDF_ROOT=pdf_root, TRIP_PDF_ASYNC=True)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user(username='planner@example.com', password='secret-pass-123')
+        self.client.force_login(self.user)
+        trip = TripPlan(
+            user=self.user, title='Weekend in Lisbon', destination='Lisbon, Portugal',
+            start_date=date(2030, 6, 1), end_date=date(2030, 6, 2), days_count=2,
+            total_budget=800, interests='food',
+        )
+        self.trip = TripMaterializer(trip).build().save()
+        self.url = reverse('trips:download_pdf', args=[trip.id])
+
+    def test_rendered_by_worker_then_served_with_etag(self):
+        self.assertEqual(self.client.get(self.url).status_code, 202)
+        self.client.get(self.url)
+        self.assertEqual(TripJob.objects.filter(kind='render_pdf').count(), 1)
+
+        self.assertTrue(jobs.run_job(jobs.claim_next()))
+        response = self.client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+        self.assertIn('weekend-in-lisbon.pdf', response['Content-Disposition'])
+
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_file_removed_under_the_download(self):
+        jobs.enqueue(self.trip, kind='render_pdf')
+        self.assertTrue(jobs.run_job(jobs.claim_next()))
+        # Gone between the ETag check and the open, as when a newer version's render cleans up
+        with mock.patch('trips.views.open', side_effect=FileNotFoundError, create=True):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(TripJob.objects.filter(kind='render_pdf', status='queued').exists())
+
+
+class TripExportTests(TestCase):
+    def test_archive_has_a_document_per_trip(self):
+        user = User.objects.create_user(username='planner@example.com', password='secret-pass-123')
+        for days in (2, 3):
+            TripMaterializer(TripPlan(
+                user=user, title=f'{days} days in Porto', destination='Porto, Portugal',
+                start_date=date(2030, 5, 1), end_date=date(2030, 5, days), days_count=days,
+                total_budget=900, interests='food',
+            )).build().save()
+        self.client.force_login(user)
+
+        response = self.client.get(reverse('trips:export'))
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        documents = [json.loads(archive.read(name)) for name in sorted(archive.namelist())]
+        self.assertEqual([len(document['itinerary_days']) for document in documents], [2, 3])
+        self.assertTrue(documents[0]['itinerary_days'][0]['activities'])
+
+
+    def test_command_matches_username_then_email_then_id(self):
+        by_email = User.objects.create_user(username='ana', email='ana@example.com')
+        by_username = User.objects.create_user(username='ana@example.com')
+        by_id = User.objects.create_user(username='bea', email='shared@example.com')
+        by_digits = User.objects.create_user(username=str(by_id.pk), email='shared@example.com')
+        find_user = export_trips.Command().find_user
+        self.assertEqual(find_user('ana@example.com'), by_username)
+        self.assertEqual(find_user('ANA@example.com'), by_email)
+        self.assertEqual(find_user(str(by_id.pk)), by_digits)
+        self.assertEqual(find_user(str(by_email.pk)), by_email)
+        with self.assertRaisesMessage(CommandError, 'More than one user'):
+            find_user('shared@example.com')
+        with self.assertRaisesMessage(CommandError, 'No user matches'):
+            find_user('nobody')
+
+
+class CalendarFeedTests(TestCase):
+    """Only changed trips are rebuilt, and unchanged feeds answer 304"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='planner@example.com', password='secret-pass-123')
+        self.trips = []
+        for days in (2, 3):
+            trip = TripPlan(
+                user=self.user, title=f'{days} days in Porto', destination='Porto, Portugal',
+                start_date=date(2030, 5, 1), end_date=date(2030, 5, days), days_count=days,
+                total_budget=900, interests='food',
+            )
+            TripMaterializer(trip).build().save()
+            self.trips.append(trip)
+        self.url = reverse('trips:calendar', args=[ical.feed_token(self.user.id)])
+
+    def test_feed_lists_activities_and_honours_etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        self.assertContains(response, 'UID:trip-%d@' % self.trips[0].id)
+        self.assertContains(response, 'DTSTART:20300501T')
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_only_the_changed_trip_is_rebuilt(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            activity = ItineraryActivity.objects.filter(day__trip=self.trips[1]).first()
+            activity.title = 'Port cellar tour'
+            activity.save()
+
+        with mock.patch.object(ical, 'trip_block', wraps=ical.trip_block) as trip_block:
+            response = self.client.get(self.url)
+        self.assertContains(response, 'SUMMARY:Port cellar tour')
+        self.assertEqual([call.args[0].id for call in trip_block.call_args_list], [self.trips[1].id])
+
+    def test_activity_without_start_time(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            activity = ItineraryActivity.objects.filter(day__trip=self.trips[0]).first()
+            activity.start_time = None
+            activity.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        block = response.content.decode().split(f'UID:activity-{activity.id}@')[1].split('END:VEVENT')[0]
+        self.assertIn('DTSTART;VALUE=DATE:20300501', block)
+        self.assertIn('DTEND;VALUE=DATE:20300502', block)
+
+    def test_forged_token_is_rejected(self):
+        self.assertEqual(self.client.get(reverse('trips:calendar', args=['1:forged'])).status_code, 404)
+        # Validly signed, but without the user's secret (the format before feed keys)
+        token = ical._signer.sign(str(self.user.id))
+        self.assertEqual(self.client.get(reverse('trips:calendar', args=[token])).status_code, 404)
+
+    def test_rotation_revokes_the_old_url(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('trips:rotate_calendar')).status_code, 405)
+        self.client.post(reverse('trips:rotate_calendar'))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        new_url = reverse('trips:calendar', args=[ical.feed_token(self.user.id)])
+        self.assertNotEqual(new_url, self.url)
+        self.assertEqual(self.client.get(new_url).status_code, 200)
+
+
+    def test_dashboard_reuses_the_cached_token(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('trips:dashboard'))
+        with mock.patch.object(CalendarFeedKey.objects, 'get_or_create') as get_or_create:
+            response = self.client.get(reverse('trips:dashboard'))
+        get_or_create.assert_not_called()
+        self.assertContains(response, self.url)
+
+
+class TripApiTests(TestCase):
+    """Sparse fieldsets limit the columns read, and nested rows cost one query per collection"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='planner@example.com', password='secret-pass-123')
+        self.client.force_login(self.user)
+        self.trip = TripPlan(
+            user=self.user, title='Month in Japan', destination='Tokyo, Japan',
+            start_date=date(2030, 4, 1), end_date=date(2030, 4, 30), days_count=30,
+            total_budget=6000, interests='food',
+        )
+        TripMaterializer(self.trip).build().save()
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        return response, [query['sql'] for query in queries if 'trips_' in query['sql']]
+
+    def test_sparse_fields_are_projected(self):
+        response, queries = self.get(reverse('api:trips') + '?fields=title&include=hotels&fields[hotel]=name')
+        trip = response.json()['results'][0]
+        self.assertEqual(set(trip), {'title', 'hotels'})
+        self.assertEqual(set(trip['hotels'][0]), {'name'})
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('total_budget', queries[0])
+
+    def test_days_page_query_count_is_fixed(self):
+        url = reverse('api:trip_days', args=[self.trip.id])
+        response, queries = self.get(url + '?limit=10&fields=date&fields[activity]=title')
+        self.assertEqual(len(response.json()['results']), 10)
+        self.assertEqual(len(queries), 3)
+
+        days = 0
+        while url:
+            page = self.client.get(url).json()
+            days += len(page['results'])
+            url = page['next']
+        self.assertEqual(days, 30)
+
+    def test_malformed_cursor(self):
+        url = reverse('api:trip_days', args=[self.trip.id])
+        for cursor in ('not-base64!', 'WzFd', 'WyJub3QgYSBkYXRlIiwgMV0'):
+            response = self.client.get(url, {'cursor': cursor})
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {'error': 'Invalid cursor'})
+
+    def test_requires_login_and_known_fields(self):
+        self.assertEqual(self.client.get(reverse('api:trips') + '?fields=password').status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('api:trips')).status_code, 401)
+
+
+class CircuitBreakerTests(TestCase):
+    """The breaker opens after repeated failures and lets a single probe through after the cool-down"""
+
+    def setUp(self):
+        patcher = mock.patch('trips.services.maps.time.monotonic', return_value=1000.0)
+        self.clock = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+
+    def trip(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.clock.return_value += 30
+
+    def test_opens_after_threshold(self):
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow())
+
+    def test_half_open_allows_a_single_probe(self):
+        self.trip()
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertFalse(self.breaker.allow())
+
+    def test_probe_success_closes_the_circuit(self):
+        self.trip()
+        self.breaker.allow()
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(self.breaker.allow())
+        self.assertTrue(self.breaker.allow())
+
+    def test_probe_failure_reopens_the_circuit(self):
+        self.trip()
+        self.breaker.allow()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow())
+
+    def test_call_from_before_the_outage_keeps_the_probe_slot(self):
+        early = self.breaker.allow()
+        self.trip()
+        probe = self.breaker.allow()
+        self.assertTrue(probe)
+        self.breaker.release(early)
+        self.assertFalse(self.breaker.allow())
+        self.breaker.release(probe)
+        self.assertTrue(self.breaker.allow())
+
+    def maps_client(self, status_code, body=None):
+        client = MapsClient(api_key='test', max_retries=0, breaker=self.breaker, quotas={})
+        client.session = mock.Mock()
+        client.session.get.return_value.status_code = status_code
+        client.session.get.return_value.json.return_value = body
+        return client
+
+    def test_client_error_during_probe_frees_the_slot(self):
+        self.trip()
+        with self.assertRaises(MapsUnavailable):
+            self.maps_client(403).get('geocode', {'address': 'Lisbon'})
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertEqual(self.maps_client(200, {'status': 'OK'}).get('geocode', {'address': 'Lisbon'}), {'status': 'OK'})
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_unexpected_error_during_probe_frees_the_slot(self):
+        self.trip()
+        client = self.maps_client(200)
+        client.session.get.side_effect = RuntimeError('boom')
+        with self.assertRaises(RuntimeError):
+            client.get('geocode', {'address': 'Lisbon'})
+        self.assertTrue(self.breaker.allow())
+
+    def test_client_call_from_before_the_outage_keeps_the_probe_slot(self):
+        client = self.maps_client(403)
+
+        def outage_mid_call(*args, **kwargs):
+            self.trip()
+            self.assertTrue(self.breaker.allow())
+            return mock.DEFAULT
+
+        client.session.get.side_effect = outage_mid_call
+        with self.assertRaises(MapsUnavailable):
+            client.get('geocode', {'address': 'Lisbon'})
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertFalse(self.breaker.allow())
+
+    def test_non_object_body_counts_as_a_failure(self):
+        self.trip()
+        with self.assertRaises(MapsUnavailable):
+            self.maps_client(200, ['not', 'a', 'dict']).get('geocode', {'address': 'Lisbon'})
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+
+@override_settings(GOOGLE_MAPS_QUOTA_WAIT=0)
+class MapsQuotaTests(TestCase):
+    """Calls beyond the shared budget are refused locally and counted per day"""
+
+    def client_with(self, limits):
+        client = MapsClient(api_key='test', max_retries=0, quotas={'geocode': limits})
+        client.session = mock.Mock()
+        client.session.get.return_value.status_code = 200
+        client.session.get.return_value.json.return_value = {'status': 'OK', 'results': []}
+        return client
+
+    def test_empty_bucket_refuses_without_calling_google(self):
+        client = self.client_with({'rate': 0.001, 'burst': 2, 'daily': None})
+        client.get('geocode', {'address': 'Lisbon'})
+        client.get('geocode', {'address': 'Porto'})
+        with self.assertRaises(QuotaExceeded):
+            client.get('geocode', {'address': 'Faro'})
+        self.assertEqual(client.session.get.call_count, 2)
+        usage = ApiQuotaUsage.objects.get(endpoint='geocode')
+        self.assertEqual((usage.calls, usage.throttled), (2, 1))
+
+    def test_refused_retry_is_not_a_breaker_failure(self):
+        client = self.client_with({'rate': 0.001, 'burst': 1, 'daily': None})
+        client.max_retries, client.backoff = 1, 0
+        client.session.get.return_value.status_code = 503
+        with self.assertRaises(QuotaExceeded):
+            client.get('geocode', {'address': 'Lisbon'})
+        self.assertEqual(client.session.get.call_count, 1)
+        self.assertEqual(client.breaker.failures, 0)
+
+    def test_daily_quota(self):
+        client = self.client_with({'rate': 100, 'burst': 100, 'daily': 1})
+        client.get('geocode', {'address': 'Lisbon'})
+        with self.assertRaises(QuotaExceeded):
+            client.get('geocode', {'address': 'Porto'})
+        self.assertEqual(ApiQuotaUsage.objects.get(endpoint='geocode').over_quota, 1)
+
+
+class BenchmarkSuiteTests(TestCase):
+    """run_benchmarks writes per-operation timings and fails on a regression against the baseline"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.baseline = os.path.join(self.directory, 'baseline.json')
+        self.output = os.path.join(self.directory, 'results.json')
+
+    def run_benchmarks(self, *args):
+        call_command(
+            'run_benchmarks', 'flight_cost', 'generate_itinerary_7d', '--repeat', '1',
+            '--baseline', self.baseline, '--json', self.output, *args, stdout=io.StringIO(),
+        )
+        with open(self.output) as f:
+            return json.load(f)
+
+    def test_results_and_baseline(self):
+        results = self.run_benchmarks('--save-baseline')['results']
+        self.assertEqual(results['flight_cost']['ops'], 10000)
+        self.assertGreater(results['generate_itinerary_7d']['median'], 0)
+        self.assertFalse(TripPlan.objects.exists())
+
+        statuses = {row['status'] for row in self.run_benchmarks('--threshold', '100')['comparison']}
+        self.assertEqual(statuses, {'ok'})
+
+    @override_settings(BENCHMARK_THRESHOLDS={'default': 0.25, 'flight_cost': 5})
+    def test_bare_threshold_replaces_configured_ones(self):
+        self.run_benchmarks('--save-baseline')
+        rows = self.run_benchmarks('--threshold', '100')['comparison']
+        self.assertEqual({row['name']: row['threshold'] for row in rows}, {'flight_cost': 100, 'generate_itinerary_7d': 100})
+
+    def test_configured_thresholds_apply_without_a_bare_one(self):
+        self.run_benchmarks('--save-baseline')
+        with override_settings(BENCHMARK_THRESHOLDS={'default': 100, 'flight_cost': 200}):
+            rows = self.run_benchmarks('--threshold', 'generate_itinerary_7d=300')['comparison']
+        self.assertEqual({row['name']: row['threshold'] for row in rows}, {'flight_cost': 200, 'generate_itinerary_7d': 300})
+
+    def test_regression_fails(self):
+        self.run_benchmarks('--save-baseline')
+        with open(self.baseline) as f:
+            baseline = json.load(f)
+        baseline['results']['flight_cost']['median'] /= 1000
+        with open(self.baseline, 'w') as f:
+            json.dump(baseline, f)
+
+        with self.assertRaisesMessage(CommandError, 'regressed: flight_cost'):
+            self.run_benchmarks('--threshold', 'generate_itinerary_7d=100')
+
+
+class LoadTestStubTests(TestCase):
+    """The load test's Google stub speaks the API MapsClient expects, without leaving the machine"""
+
+    def setUp(self):
+        self.stub = loadtest.StubGoogleServer(latency=0, jitter=0).start()
+        self.addCleanup(self.stub.stop)
+        self.client = MapsClient(api_key='test', base_url=self.stub.base_url, max_retries=0, quotas={})
+
+    def test_geocode_is_deterministic(self):
+        first = self.client.get('geocode', {'address': 'Loadtest City 1, Stubland'})
+        again = self.client.get('geocode', {'address': 'Loadtest City 1, Stubland'})
+        self.assertEqual(first['status'], 'OK')
+        self.assertEqual(first['results'][0]['geometry'], again['results'][0]['geometry'])
+        places = self.client.get('nearbysearch', {'location': '38.7,-9.1', 'radius': '5000', 'type': 'lodging'})
+        self.assertEqual(len(places['results']), 5)
+        self.assertEqual(self.stub.calls['geocode/json'], 2)
+
+    def test_injected_errors(self):
+        self.stub.error_rate = 1
+        with self.assertRaises(MapsUnavailable):
+            self.client.get('geocode', {'address': 'Porto'})
+
+    def test_percentiles(self):
+        ordered = list(range(1, 101))
+        self.assertEqual([loadtest.percentile(ordered, p) for p in (50, 95, 99)], [50, 95, 99])
+        self.assertIsNone(loadtest.percentile([], 50))
+
+
+@override_settings(GEO_PROVIDERS=['offline', 'fixture'])
+class GeoProviderTests(TestCase):
+    """Lookups go down the GEO_PROVIDERS chain until a provider answers"""
+
+    def setUp(self):
+        Destination.objects.create(
+            name='Lisbon', city='Lisbon', country='Portugal', latitude=38.7223, longitude=-9.1393, popularity=500000,
+        )
+
+    def test_offline_answers_known_destinations(self):
+        result = geoproviders.geocode('lisbon, Portugal')
+        self.assertEqual((result['city'], result['country']), ('Lisbon', 'Portugal'))
+        self.assertAlmostEqual(result['latitude'], 38.7223)
+        # Near Lisbon without a city: resolved from the Destination table
+        self.assertEqual(geoproviders.reverse_geocode(38.71, -9.14)['city'], 'Lisbon')
+
+    def test_misses_fall_through(self):
+        # Another country, and prefixes, are not the known destination
+        self.assertEqual(geoproviders.geocode('Lisbon, Ohio')['country'], 'Ohio')
+        self.assertEqual(geoproviders.geocode('Lis')['country'], 'Fixtureland')
+        first, again = geoproviders.geocode('Lis'), geoproviders.geocode('  lis ')
+        self.assertEqual((first['latitude'], first['longitude']), (again['latitude'], again['longitude']))
+
+    @override_settings(GEO_PROVIDERS=['fixture'])
+    def test_enrich_trip_without_network(self):
+        user = User.objects.create_user(username='planner@example.com', password='secret-pass-123')
+        trip = TripPlan(
+            user=user, title='Weekend away', destination='Porto, Portugal', departure_location='Madrid, Spain',
+            start_date=date(2030, 9, 1), end_date=date(2030, 9, 3), days_count=3, total_budget=1200, interests='food',
+        )
+        enrich_trip(trip)
+        self.assertEqual(trip.destination_city, 'Porto')
+        self.assertGreater(trip.flight_budget, 0)
+        self.assertEqual(
+            sorted(trip.hotel_suggestions.values_list('name', flat=True)),
+            ['Fixture Lodging 1', 'Fixture Lodging 2', 'Fixture Lodging 3'],
+        )
+
+
+@override_settings(GOOGLE_MAPS_API_KEY='test')
+class GeocodingCacheTests(TestCase):
+    """Lookups are answered from the LRU, then the database, and reach Google once per key"""
+
+    def setUp(self):
+        geocoding.clear_memory_cache()
+        self.addCleanup(geocoding.clear_memory_cache)
+        patcher = mock.patch('trips.services.geocoding.get_client')
+        self.google = patcher.start().return_value.get
+        self.addCleanup(patcher.stop)
+        self.google.return_value = {
+            'status': 'OK',
+            'results': [{
+                'geometry': {'location': {'lat': 38.7223, 'lng': -9.1393}},
+                'address_components': [
+                    {'long_name': 'Lisbon', 'types': ['locality']},
+                    {'long_name': 'Portugal', 'types': ['country']},
+                ],
+            }],
+        }
+
+    def test_callers_cannot_corrupt_the_cache(self):
+        geocoding.geocode('Lisbon, Portugal')['city'] = 'Changed'
+        self.assertEqual(geocoding.geocode('lisbon ,  portugal')['city'], 'Lisbon')
+        self.assertEqual(self.google.call_count, 1)
+
+    def test_database_fallback(self):
+        geocoding.geocode('Lisbon, Portugal')
+        geocoding.clear_memory_cache()
+        self.assertEqual(geocoding.geocode('Lisbon, Portugal')['country'], 'Portugal')
+        self.assertEqual(self.google.call_count, 1)
+
+    def test_zero_results_are_cached_briefly(self):
+        self.google.return_value = {'status': 'ZERO_RESULTS', 'results': []}
+        self.assertEqual(geocoding.geocode('Nowhere at all')['status'], 'ZERO_RESULTS')
+        entry = GeocodeCacheEntry.objects.get(key='nowhere at all')
+        self.assertLess(entry.expires_at, timezone.now() + timedelta(seconds=settings.GEOCODE_NEGATIVE_CACHE_TTL + 60))
+        geocoding.clear_memory_cache()
+        self.assertEqual(geocoding.geocode('Nowhere at all')['status'], 'ZERO_RESULTS')
+        self.assertEqual(self.google.call_count, 1)
+
+    def test_errors_are_not_cached(self):
+        self.google.side_effect = MapsUnavailable('down')
+        self.assertIsNone(geocoding.geocode('Lisbon, Portugal'))
+        self.assertFalse(GeocodeCacheEntry.objects.exists())
+
+    def test_single_flight_coalesces_concurrent_calls(self):
+        flight = geocoding.SingleFlight()
+        calls = []
+        release = threading.Event()
+
+        def slow():
+            calls.append(1)
+            release.wait(5)
+            return 'answer'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flight.do('key', slow))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        # Let every thread join the flight before the leader finishes
+        deadline = time.monotonic() + 5
+        while len(flight._calls) != 1 or not calls:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['answer'] * 5)
+
+
+class PipelineTests(TestCase):
+    """Stages run after their dependencies, and run() returns by the deadline whatever happened"""
+
+    def pipeline(self, workers=4):
+        executor = ThreadPoolExecutor(max_workers=workers)
+        self.addCleanup(executor.shutdown)
+        return Pipeline(executor=executor)
+
+    def test_dependencies_receive_results(self):
+        order = []
+
+        def stage(name, value):
+            def run(**dependencies):
+                order.append(name)
+                return value(**dependencies)
+            return run
+
+        pipeline = self.pipeline()
+        pipeline.add('destination', stage('destination', lambda: 'Lisbon'))
+        pipeline.add('departure', stage('departure', lambda: 'London'))
+        pipeline.add('route', stage('route', lambda destination, departure: f'{departure}-{destination}'),
+                     depends_on=['destination', 'departure'])
+        pipeline.add('hotels', stage('hotels', lambda route: [route]), depends_on=['route'])
+        result = pipeline.run(timeout=5)
+
+        self.assertEqual(result.get('hotels'), ['London-Lisbon'])
+        self.assertEqual(order[2:], ['route', 'hotels'])
+        self.assertEqual((result.errors, result.timed_out, result.skipped), ({}, set(), set()))
+
+    def test_unknown_dependency(self):
+        with self.assertRaises(ValueError):
+            self.pipeline().add('hotels', lambda destination: None, depends_on=['destination'])
+
+    def test_errors_skip_dependents_only(self):
+        def fail():
+            raise MapsUnavailable('down')
+
+        pipeline = self.pipeline()
+        pipeline.add('destination', fail)
+        pipeline.add('departure', lambda: 'London')
+        pipeline.add('hotels', lambda destination: [], depends_on=['destination'])
+        result = pipeline.run(timeout=5)
+
+        self.assertIsInstance(result.errors['destination'], MapsUnavailable)
+        self.assertEqual(result.skipped, {'hotels'})
+        self.assertEqual(result.get('departure'), 'London')
+        self.assertNotIn('hotels', result)
+
+    def test_deadline_cancels_stragglers(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        started = []
+
+        def blocked():
+            release.wait(5)
+            return 'late'
+
+        # One worker: 'queued' waits behind 'slow' and must never start once the deadline passes
+        pipeline = self.pipeline(workers=1)
+        pipeline.add('slow', blocked)
+        pipeline.add('queued', lambda: started.append('queued'))
+        pipeline.add('hotels', lambda slow: started.append('hotels'), depends_on=['slow'])
+        began = time.monotonic()
+        result = pipeline.run(timeout=0.2)
+
+        self.assertLess(time.monotonic() - began, 2)
+        self.assertEqual(result.timed_out, {'slow', 'queued', 'hotels'})
+        self.assertEqual(result.results, {})
+        release.set()
+        pipeline.executor.shutdown(wait=True)
+        self.assertEqual(started, [])
+
+
+class JobQueueTests(TestCase):
+    """Jobs are claimed once, retried with backoff, and re-queued when their worker goes quiet"""
+
+    def setUp(self):
+        user = User.objects.create_user(username='planner@example.com', password='secret-pass-123')
+        self.trip = TripPlan.objects.create(
+            user=user, title='Weekend in Lisbon', destination='Lisbon, Portugal',
+            start_date=date(2030, 6, 1), end_date=date(2030, 6, 2), days_count=2, total_budget=800,
+        )
+        handlers = mock.patch.dict(jobs._handlers, {'enrich_trip': mock.Mock()})
+        self.handlers = handlers.start()
+        self.addCleanup(handlers.stop)
+
+    def test_enqueue_dedups_active_jobs(self):
+        job = jobs.enqueue(self.trip)
+        self.assertEqual(jobs.enqueue(self.trip), job)
+        self.assertNotEqual(jobs.enqueue(self.trip, kind='render_pdf'), job)
+        TripJob.objects.filter(id=job.id).update(status='done')
+        self.assertNotEqual(jobs.enqueue(self.trip), job)
+
+    def test_enqueue_race_returns_the_winner(self):
+        winner = jobs.enqueue(self.trip)
+        # The other caller checked before the winner's insert was visible
+        with mock.patch('django.db.models.QuerySet.first', side_effect=[None, winner]):
+            self.assertEqual(jobs.enqueue(self.trip), winner)
+        self.assertEqual(TripJob.objects.count(), 1)
+
+    def test_one_active_job_per_kind(self):
+        TripJob.objects.create(trip=self.trip)
+        with self.assertRaises(IntegrityError):
+            TripJob.objects.create(trip=self.trip, status='running')
+
+    def test_claim_order_and_exclusivity(self):
+        later = jobs.enqueue(self.trip, delay=3600)
+        now = jobs.enqueue(self.trip, kind='render_pdf')
+        job = jobs.claim_next('worker-a')
+        self.assertEqual((job.id, job.status, job.locked_by, job.attempts), (now.id, 'running', 'worker-a', 1))
+        self.assertIsNone(jobs.claim_next('worker-b'))
+        TripJob.objects.filter(id=later.id).update(run_after=timezone.now())
+        self.assertEqual(jobs.claim_next('worker-b').id, later.id)
+
+    def test_retry_with_backoff_then_fail(self):
+        self.handlers['enrich_trip'].side_effect = MapsUnavailable('down')
+        jobs.enqueue(self.trip)
+        self.assertFalse(jobs.run_job(jobs.claim_next()))
+        job = TripJob.objects.get()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertIn('MapsUnavailable: down', job.last_error)
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=20))
+
+        for attempt in (2, 3):
+            TripJob.objects.update(run_after=timezone.now())
+            self.assertFalse(jobs.run_job(jobs.claim_next()))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 3))
+        self.trip.refresh_from_db()
+        self.assertEqual(self.trip.generation_status, 'failed')
+
+    def test_success(self):
+        jobs.enqueue(self.trip)
+        self.assertTrue(jobs.run_job(jobs.claim_next()))
+        self.assertEqual(TripJob.objects.get().status, 'done')
+        self.handlers['enrich_trip'].assert_called_once()
+
+    def test_requeue_stale_and_heartbeat(self):
+        jobs.enqueue(self.trip)
+        jobs.enqueue(self.trip, kind='render_pdf')
+        stale, alive = jobs.claim_next('worker-a'), jobs.claim_next('worker-b')
+        TripJob.objects.update(locked_at=timezone.now() - timedelta(seconds=600))
+        self.assertTrue(jobs.heartbeat(alive))
+
+        self.assertEqual(jobs.requeue_stale(lease=300), 1)
+        stale.refresh_from_db()
+        self.assertEqual((stale.status, stale.locked_by), ('queued', ''))
+        # The re-queued job's old worker no longer owns it
+        jobs.claim_next('worker-c')
+        self.assertFalse(jobs.heartbeat(stale))
+
+    def run_losing_the_lease(self, error=None):
+        jobs.enqueue(self.trip)
+        job = jobs.claim_next('worker-a')
+
+        def handler(job):
+            # worker-a stalls past its lease; the job is re-queued and worker-b picks it up
+            TripJob.objects.update(locked_at=timezone.now() - timedelta(seconds=600))
+            jobs.requeue_stale(lease=300)
+            jobs.claim_next('worker-b')
+            if error:
+                raise error
+
+        self.handlers['enrich_trip'].side_effect = handler
+        self.assertFalse(jobs.run_job(job))
+        job = TripJob.objects.get()
+        self.assertEqual((job.status, job.locked_by, job.attempts, job.last_error), ('running', 'worker-b', 2, ''))
+
+    def test_lost_lease_success_is_not_recorded(self):
+        self.run_losing_the_lease()
+
+    def test_lost_lease_failure_is_not_recorded(self):
+        self.run_losing_the_lease(MapsUnavailable('down'))
+        self.trip.refresh_from_db()
+        self.assertEqual(self.trip.generation_status, 'ready')
+
+    @override_settings(TRIP_JOB_HEARTBEAT=0.01)
+    def test_heartbeat_stops_once_the_lease_is_lost(self):
+        jobs.enqueue(self.trip)
+        job = jobs.claim_next()
+        with mock.patch.object(jobs, 'heartbeat', return_value=False) as heartbeat:
+            self.handlers['enrich_trip'].side_effect = lambda job: time.sleep(0.1)
+            self.assertTrue(jobs.run_job(job))
+        self.assertEqual(heartbeat.call_count, 1)
+
+    @override_settings(TRIP_JOB_HEARTBEAT=0.01)
+    def test_lease_is_renewed_while_running(self):
+        jobs.enqueue(self.trip)
+        job = jobs.claim_next()
+        with mock.patch.object(jobs, 'heartbeat') as heartbeat:
+            self.handlers['enrich_trip'].side_effect = lambda job: time.sleep(0.1)
+            self.assertTrue(jobs.run_job(job))
+        self.assertGreater(heartbeat.call_count, 1)
+
+
+@override_settings(GOOGLE_MAPS_API_KEY='test', PLACES_CACHE_EVICT_INTERVAL=300)
+class PlacesCacheTests(TestCase):
+    """Nearby searches are shared per geohash cell until they expire or fall out of the LRU"""
+
+    def setUp(self):
+        patcher = mock.patch('trips.services.places.get_client')
+        self.google = patcher.start().return_value.get
+        self.addCleanup(patcher.stop)
+        self.google.return_value = {
+            'status': 'OK',
+            'results': [{
+                'name': 'Hotel Avenida', 'vicinity': 'Avenida da Liberdade', 'rating': 4.5,
+                'geometry': {'location': {'lat': 38.72, 'lng': -9.14}}, 'place_id': 'abc', 'photos': [],
+            }],
+        }
+        evicted_at = mock.patch.object(places, '_evicted_at', None)
+        evicted_at.start()
+        self.addCleanup(evicted_at.stop)
+
+    def test_hit_shares_results_within_a_cell(self):
+        first = places.nearby(38.7223, -9.1393)
+        self.assertEqual(places.nearby(38.7224, -9.1394), first)
+        self.assertEqual(first[0]['name'], 'Hotel Avenida')
+        self.assertNotIn('photos', first[0])
+        self.assertEqual(self.google.call_count, 1)
+        self.assertEqual(PlacesCacheEntry.objects.get().hit_count, 1)
+
+    def test_expired_entries_are_fetched_again(self):
+        places.nearby(38.7223, -9.1393)
+        PlacesCacheEntry.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        places.nearby(38.7223, -9.1393)
+        self.assertEqual(self.google.call_count, 2)
+        self.assertEqual(PlacesCacheEntry.objects.count(), 1)
+
+    def test_evict_keeps_the_most_recently_used(self):
+        now = timezone.now()
+        for index, cell in enumerate(['eycs0', 'eycs1', 'eycs2', 'eycs3']):
+            PlacesCacheEntry.objects.create(
+                cell=cell, results=[], expires_at=now + timedelta(days=1),
+                last_used_at=now - timedelta(minutes=index),
+            )
+        PlacesCacheEntry.objects.filter(cell='eycs0').update(expires_at=now - timedelta(seconds=1))
+        places.evict(max_entries=2)
+        self.assertEqual(set(PlacesCacheEntry.objects.values_list('cell', flat=True)), {'eycs1', 'eycs2'})
+
+    def test_misses_evict_at_most_once_per_interval(self):
+        with mock.patch.object(places, 'evict') as evict:
+            places.nearby(38.7223, -9.1393)
+            places.nearby(41.1579, -8.6291)
+        evict.assert_called_once()
+
+    def test_failures_are_not_cached(self):
+        self.google.side_effect = MapsUnavailable('down')
+        self.assertIsNone(places.nearby(38.7223, -9.1393))
+        self.assertFalse(PlacesCacheEntry.objects.exists())
+
+
+class GazetteerTests(TestCase):
+    """Destination autocomplete ranks by match kind and popularity, and follows other processes' changes"""
+
+    def setUp(self):
+        gazetteer.reset()
+        self.addCleanup(gazetteer.reset)
+        for name, city, country, popularity in [
+            ('São Paulo', 'São Paulo', 'Brazil', 12000000),
+            ('San Sebastián', 'Donostia', 'Spain', 180000),
+            ('Santiago', 'Santiago', 'Chile', 6000000),
+            ('Porto', 'Porto', 'Portugal', 230000),
+            ('Lisbon', 'Lisbon', 'Portugal', 550000),
+            ('Cabo San Lucas', 'Cabo San Lucas', 'Mexico', 200000),
+        ]:
+            Destination.objects.create(name=name, city=city, country=country, popularity=popularity)
+
+    def names(self, query, limit=10):
+        return [result['name'] for result in gazetteer.search(query, limit)]
+
+    def test_fold(self):
+        self.assertEqual(gazetteer.fold('  São-Paulo! '), 'sao paulo')
+
+    def test_ranking(self):
+        # Name prefixes by popularity, then later words, then countries
+        self.assertEqual(self.names('sa'), ['São Paulo', 'Santiago', 'San Sebastián', 'Cabo San Lucas'])
+        self.assertEqual(self.names('por'), ['Porto', 'Lisbon'])
+        self.assertEqual(self.names('sa', limit=2), ['São Paulo', 'Santiago'])
+
+    def test_long_prefixes_and_accents(self):
+        self.assertEqual(self.names('SAN SEBASTIAN'), ['San Sebastián'])
+        self.assertEqual(self.names('sao p'), ['São Paulo'])
+        self.assertEqual(self.names('san luc'), ['Cabo San Lucas'])
+        self.assertEqual(self.names('xyz'), [])
+        self.assertEqual(self.names('  '), [])
+
+    def test_cached_results_are_not_shared(self):
+        first = gazetteer.search('lis')
+        first[0]['distance_km'] = 12
+        first.clear()
+        again = gazetteer.search('lis')
+        self.assertEqual(len(again), 1)
+        self.assertNotIn('distance_km', again[0])
+
+    def test_saves_in_this_process(self):
+        self.names('sa')
+        porto = Destination.objects.get(name='Porto')
+        porto.name = 'Salvador'
+        porto.save()
+        self.assertEqual(self.names('sal'), ['Salvador'])
+        self.assertEqual(self.names('sa'), ['São Paulo', 'Santiago', 'Salvador', 'San Sebastián', 'Cabo San Lucas'])
+        Destination.objects.get(name='Santiago').delete()
+        self.assertNotIn('Santiago', self.names('sa'))
+
+    @override_settings(GAZETTEER_REFRESH_INTERVAL=0)
+    def test_refresh_merges_changes_from_other_processes(self):
+        self.names('sa')
+        # Queryset updates and raw deletes send no signals, like another process's writes
+        Destination.objects.filter(name='Lisbon').update(name='Salamanca', popularity=1, updated_at=timezone.now())
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM trips_destination WHERE name = %s', ['Santiago'])
+        self.assertEqual(self.names('sa'), ['São Paulo', 'San Sebastián', 'Salamanca', 'Cabo San Lucas'])
+
+
+class ImportDestinationsTests(TestCase):
+    """import_destinations upserts by external id and resumes after the last committed batch"""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'cities.txt')
+
+    def geonames_line(self, geonameid, name, population, feature_class='P', country='PT'):
+        columns = [str(geonameid), name, name, '', '38.7167', '-9.1333', feature_class, 'PPLC', country]
+        columns += [''] * 5 + [str(population), '', '', 'Europe/Lisbon', '2024-01-01']
+        return '\t'.join(columns)
+
+    def write(self, *lines):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    def import_destinations(self, *args):
+        call_command('import_destinations', self.path, '--batch-size', '2', *args, stdout=io.StringIO())
+
+    def test_upsert_and_filters(self):
+        self.write(
+            self.geonames_line(1, 'Lisboa', 500000),
+            'truncated\tline',
+            self.geonames_line(2, 'Serra da Estrela', 0, feature_class='T'),
+            self.geonames_line(3, 'Porto', 230000),
+            self.geonames_line(4, 'Aldeia', 50),
+        )
+        self.import_destinations('--feature-class', 'P', '--min-population', '1000')
+        self.assertEqual(sorted(Destination.objects.values_list('name', flat=True)), ['Lisboa', 'Porto'])
+
+        self.write(self.geonames_line(1, 'Lisbon', 550000), self.geonames_line(3, 'Porto', 230000))
+        self.import_destinations()
+        lisbon = Destination.objects.get(external_id='geonames:1')
+        self.assertEqual((lisbon.name, lisbon.popularity, lisbon.country), ('Lisbon', 550000, 'PT'))
+        self.assertTrue(lisbon.geo_cell)
+        self.assertEqual(Destination.objects.count(), 2)
+
+    def test_csv_rows_get_stable_ids(self):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('name,country,latitude,longitude,population\nPorto,Portugal,41.15,-8.61,230000\n,Portugal,0,0,1\n')
+        self.import_destinations('--format', 'csv')
+        self.import_destinations('--format', 'csv')
+        porto = Destination.objects.get()
+        self.assertTrue(porto.external_id.startswith('csv:'))
+        self.assertEqual((porto.city, porto.popularity), ('Porto', 230000))
+
+    def test_resume_skips_committed_rows(self):
+        # The checkpoint counts source rows, so the skipped truncated line is one of the two
+        self.write('truncated', *(self.geonames_line(i, f'Place {i}', 1000) for i in range(2, 6)))
+        with open(f'{self.path}.checkpoint', 'w') as f:
+            json.dump({'path': os.path.abspath(self.path), 'rows': 2}, f)
+        self.import_destinations('--resume')
+        self.assertEqual(sorted(Destination.objects.values_list('name', flat=True)), ['Place 3', 'Place 4', 'Place 5'])
+        with open(f'{self.path}.checkpoint') as f:
+            self.assertEqual(json.load(f)['rows'], 5)
+
+        Destination.objects.all().delete()
+        self.import_destinations('--resume')
+        self.assertFalse(Destination.objects.exists())
+
+    def test_checkpoint_of_another_file(self):
+        self.write(self.geonames_line(1, 'Lisboa', 500000))
+        with open(f'{self.path}.checkpoint', 'w') as f:
+            json.dump({'path': '/elsewhere/cities.txt', 'rows': 1}, f)
+        with self.assertRaises(CommandError):
+            self.import_destinations('--resume')
+
+
+class FlightEstimateTests(TestCase):
+    """Batch estimates agree with TripPlan.estimate_flight_cost(), tier edges included"""
+
+    # A distance equal to a tier's bound is priced at the next tier
+    DISTANCES = [0, 0.4, 499.99, 500, 500.01, 1999.99, 2000, 2000.01, 7999.99, 8000, 8000.01, 19000]
+
+    def expected(self):
+        costs = []
+        for distance in self.DISTANCES:
+            with mock.patch.object(TripPlan, 'calculate_flight_distance', return_value=distance):
+                costs.append(TripPlan().estimate_flight_cost())
+        return costs
+
+    def test_tier_boundaries(self):
+        self.assertEqual(self.expected()[2:4], [100.0, 75.0])
+        self.assertEqual(flights.batch_flight_costs(self.DISTANCES, use_numpy=False), self.expected())
+
+    @unittest.skipUnless(flights.np, 'NumPy is not installed')
+    def test_vectorized_tier_boundaries(self):
+        self.assertEqual(flights.batch_flight_costs(self.DISTANCES, use_numpy=True), self.expected())
+
+    def test_estimates_from_coordinates(self):
+        trips = benchmarks.synthetic_trips(200)
+        trips[0].departure_latitude = None
+        rows = [(t.departure_latitude, t.departure_longitude, t.latitude, t.longitude) for t in trips]
+        for use_numpy in [False] + ([True] if flights.np else []):
+            distances, costs = flights.batch_flight_estimates(rows, use_numpy=use_numpy)
+            self.assertEqual(costs, [trip.estimate_flight_cost() for trip in trips])
+            for distance, trip in zip(distances, trips):
+                self.assertAlmostEqual(distance, trip.calculate_flight_distance(), places=6)
+
+
+class RecalculateBudgetsTests(TestCase):
+    """recalculate_budgets writes the same budgets allocate_budget() computes, and only where they changed"""
+
+    def setUp(self):
+        user = User.objects.create_user(username='planner@example.com', password='secret-pass-123')
+        self.trips = []
+        for index, (latitude, longitude, budget) in enumerate([
+            (38.7223, -9.1393, 900),  # London-Lisbon, regional tier
+            (40.7128, -74.0060, 2500),  # London-New York, international tier
+            (-33.8688, 151.2093, 4000),  # London-Sydney, long haul with flights capped at 40%
+        ]):
+            self.trips.append(TripPlan.objects.create(
+                user=user, title=f'Trip {index}', destination=f'Destination {index}',
+                departure_latitude=51.5074, departure_longitude=-0.1278, latitude=latitude, longitude=longitude,
+                start_date=date(2030, 6, 1), end_date=date(2030, 6, 5), days_count=5, total_budget=budget,
+            ))
+        # Budgets computed under older rules for the first two trips
+        self.stale_at = timezone.now() - timedelta(days=30)
+        TripPlan.objects.update(updated_at=self.stale_at)
+        TripPlan.objects.filter(id__in=[self.trips[0].id, self.trips[1].id]).update(flight_budget=1, daily_budget=1)
+
+    def recalculate(self, *args):
+        out = io.StringIO()
+        call_command('recalculate_budgets', '--batch-size', '2', *args, stdout=out)
+        return out.getvalue()
+
+    def budgets(self, trip):
+        return TripPlan.objects.values_list(*BUDGET_FIELDS).get(id=trip.id)
+
+    def test_dry_run_writes_nothing(self):
+        before = [self.budgets(trip) for trip in self.trips]
+        self.assertIn('Would update 2 of 3 trips', self.recalculate('--dry-run'))
+        self.assertEqual([self.budgets(trip) for trip in self.trips], before)
+        self.assertFalse(TripPlan.objects.exclude(updated_at=self.stale_at).exists())
+
+    def test_updates_only_changed_rows_to_the_model_allocation(self):
+        self.assertIn('Updated 2 of 3 trips', self.recalculate())
+        for trip in self.trips:
+            expected = TripPlan.objects.get(id=trip.id)
+            expected.allocate_budget()
+            self.assertEqual(
+                self.budgets(trip),
+                tuple(as_stored(field, getattr(expected, field)) for field in BUDGET_FIELDS),
+            )
+        updated = set(TripPlan.objects.exclude(updated_at=self.stale_at).values_list('id', flat=True))
+        self.assertEqual(updated, {self.trips[0].id, self.trips[1].id})
+        self.assertIn('Updated 0 of 3 trips', self.recalculate())
+
+    def test_since(self):
+        TripPlan.objects.filter(id=self.trips[0].id).update(created_at=timezone.now() - timedelta(days=10))
+        since = (timezone.now() - timedelta(days=1)).date().isoformat()
+        self.assertIn('Updated 1 of 2 trips', self.recalculate('--since', since))
+
+
+@override_settings(DASHBOARD_PAGE_SIZE=2)
+class DashboardPaginationTests(TestCase):
+    """The dashboard walks the user's trips newest first with keyset cursors, filtering by status in SQL"""
+
+    DATES = {'start_date': date(2030, 6, 1), 'end_date': date(2030, 6, 1), 'days_count': 1, 'total_budget': 100}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='planner@example.com', password='secret-pass-123')
+        self.client.force_login(self.user)
+        other = User.objects.create_user(username='other@example.com', password='secret-pass-123')
+        TripPlan.objects.create(user=other, title='Not mine', destination='Porto', **self.DATES)
+
+        created = timezone.now() - timedelta(days=1)
+        self.trips = []
+        for index, status in enumerate(['planned', 'completed', 'planned', 'completed', 'planned']):
+            trip = TripPlan.objects.create(
+                user=self.user, title=f'Trip {index}', destination='Lisbon', status=status, **self.DATES,
+            )
+            self.trips.append(trip)
+        # Pairs of trips share a timestamp, so the id decides their order, across a page boundary too
+        for trip, hours in zip(self.trips, [1, 1, 2, 3, 3]):
+            TripPlan.objects.filter(id=trip.id).update(created_at=created + timedelta(hours=hours))
+
+    def walk(self, **params):
+        pages, cursor = [], ''
+        while True:
+            response = self.client.get(reverse('trips:dashboard'), {**params, 'after': cursor})
+            page = response.context['page']
+            pages.append([trip.title for trip in page])
+            if not page.has_next:
+                return pages
+            cursor = page.next_cursor
+
+    def test_pages_newest_first(self):
+        self.assertEqual(self.walk(), [['Trip 4', 'Trip 3'], ['Trip 2', 'Trip 1'], ['Trip 0']])
+
+    def test_status_filter_in_sql(self):
+        with CaptureQueriesContext(connection) as queries:
+            pages = self.walk(status='completed')
+        self.assertEqual(pages, [['Trip 3', 'Trip 1']])
+        self.assertTrue(any('"status" = \'completed\'' in query['sql'] for query in queries))
+
+    def test_last_page_has_no_cursor(self):
+        self.trips[0].delete()
+        pages = self.walk()
+        self.assertEqual(pages[-1], ['Trip 2', 'Trip 1'])
+
+    def test_malformed_cursor_starts_over(self):
+        response = self.client.get(reverse('trips:dashboard'), {'after': 'bm90IGpzb24'})
+        self.assertEqual([trip.title for trip in response.context['page']], ['Trip 4', 'Trip 3'])
+
+
+class BackfillJsonFieldsTests(TestCase):
+    """backfill_json_fields turns legacy and malformed JSON values into values of the expected type"""
+
+    # Strings in the JSON column are what the old text columns held, JSON-encoded once more
+    LEGACY = ['["Tower", "Castle"]', '{"not": "a list"}', '', 'not json', ['Bridge']]
+
+    def setUp(self):
+        for index, value in enumerate(self.LEGACY):
+            Destination.objects.create(name=f'Place {index}', city='City', country='Testland', popular_attractions=value)
+
+    def attractions(self):
+        return list(Destination.objects.order_by('id').values_list('popular_attractions', flat=True))
+
+    def backfill(self, *args):
+        out = io.StringIO()
+        call_command('backfill_json_fields', '--model', 'Destination', '--batch-size', '2', *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run(self):
+        self.assertIn('5 rows scanned, 4 would fix', self.backfill('--dry-run'))
+        self.assertEqual(self.attractions(), self.LEGACY)
+
+    def test_backfill(self):
+        self.assertIn('5 rows scanned, 4 fixed', self.backfill())
+        self.assertEqual(self.attractions(), [['Tower', 'Castle'], [], [], [], ['Bridge']])
+        self.assertIn('0 fixed', self.backfill())
+
+    def test_normalize(self):
+        self.assertEqual(jsondata.normalize('{"mon": "9-5"}', dict), {'mon': '9-5'})
+        self.assertEqual(jsondata.normalize('[1, 2', list), [])
+        self.assertEqual(jsondata.normalize(None, dict), {})
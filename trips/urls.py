@@ -6,7 +6,11 @@ app_name = 'trips'
 urlpatterns = [
     path('dashboard/', views.dashboard, name='dashboard'),
     path('create/', views.create_trip, name='create'),
+    path('export/', views.export_trips, name='export'),
+    path('calendar/<str:token>.ics', views.calendar_feed, name='calendar'),
+    path('calendar/rotate/', views.rotate_calendar_feed, name='rotate_calendar'),
     path('<int:trip_id>/', views.trip_detail, name='detail'),
+    path('<int:trip_id>/status/', views.trip_status, name='status'),
     path('<int:trip_id>/edit/', views.edit_trip, name='edit'),
     path('<int:trip_id>/delete/', views.delete_trip, name='delete'),
     path('<int:trip_id>/pdf/', views.download_pdf, name='download_pdf'),
@@ -1,35 +1,82 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
+from django.http import FileResponse, Http404, JsonResponse, HttpResponse, StreamingHttpResponse
 from django.conf import settings
 from django.utils import timezone
-from datetime import datetime, timedelta
-from .models import TripPlan, ItineraryDay, HotelSuggestion, PointOfInterest
-import requests
-import json
+from django.db import transaction
+from django.db.models import Count, Q
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST
+from datetime import datetime
+import re
+from .models import TripPlan
+from .services import export, gazetteer, ical, jobs, pdf, usercache, versions
+from .services.enrichment import enrich_trip
+from .services.pagination import keyset_page
+
+# Status filters offered on the dashboard, in display order
+DASHBOARD_FILTERS = {
+    'planned': 'Planned',
+    'ongoing': 'Ongoing',
+    'completed': 'Completed',
+}
+
+# Keyset cursors are short URL-safe base64; anything else is ignored (and kept out of cache keys)
+CURSOR_PATTERN = re.compile(r'[A-Za-z0-9_-]{0,200}')
+
+# Columns rendered by the dashboard trip cards
+DASHBOARD_CARD_FIELDS = (
+    'title', 'destination', 'status', 'start_date', 'end_date', 'days_count',
+    'total_budget', 'currency', 'daily_budget', 'interests', 'created_at',
+)
 
 @login_required
 def dashboard(request):
-    """User dashboard showing all trips"""
-    trips = TripPlan.objects.filter(user=request.user)
+    """User dashboard showing the user's trips, newest first, one page at a time"""
+    status_filter = request.GET.get('status', '')
+    if status_filter not in DASHBOARD_FILTERS:
+        status_filter = ''
+    cursor = request.GET.get('after', '')
+    if not CURSOR_PATTERN.fullmatch(cursor):
+        cursor = ''
     
-    # Statistics
-    total_trips = trips.count()
-    completed_trips = trips.filter(status='completed').count()
-    ongoing_trips = trips.filter(status='ongoing').count()
-    planned_trips = trips.filter(status='planned').count()
+    # Served from the per-user cache until one of the user's trips changes
+    stats = usercache.get_or_build(request.user.id, 'dashboard:stats', lambda: dashboard_stats(request.user))
+    page = usercache.get_or_build(
+        request.user.id,
+        f'dashboard:page:{status_filter}:{cursor}',
+        lambda: dashboard_page(request.user, status_filter, cursor),
+    )
     
     context = {
-        'trips': trips,
-        'total_trips': total_trips,
-        'completed_trips': completed_trips,
-        'ongoing_trips': ongoing_trips,
-        'planned_trips': planned_trips,
+        'trips': page.items,
+        'page': page,
+        'calendar_feed_url': request.build_absolute_uri(reverse('trips:calendar', args=[ical.feed_token(request.user.id)])),
+        'status_filter': status_filter,
+        'status_filters': DASHBOARD_FILTERS,
+        **stats,
     }
     
     return render(request, 'trips/dashboard.html', context)
 
+def dashboard_stats(user):
+    """Trip counts for the dashboard cards, in a single query"""
+    return TripPlan.objects.filter(user=user).aggregate(
+        total_trips=Count('id'),
+        completed_trips=Count('id', filter=Q(status='completed')),
+        ongoing_trips=Count('id', filter=Q(status='ongoing')),
+        planned_trips=Count('id', filter=Q(status='planned')),
+    )
+
+def dashboard_page(user, status_filter='', cursor=''):
+    """One keyset page of the user's trip cards"""
+    trips = TripPlan.objects.filter(user=user)
+    if status_filter:
+        trips = trips.filter(status=status_filter)
+    return keyset_page(trips.only(*DASHBOARD_CARD_FIELDS), cursor=cursor, per_page=settings.DASHBOARD_PAGE_SIZE)
+
 @login_required
 def create_trip(request):
     """Create a new trip"""
@@ -99,7 +146,7 @@ def create_trip(request):
         
         try:
             # Create trip
-            trip = TripPlan.objects.create(
+            trip = TripPlan(
                 user=request.user,
                 title=title,
                 destination=destination,
@@ -113,23 +160,20 @@ def create_trip(request):
                 currency=currency,
                 interests=interests,
                 additional_notes=additional_notes,
-                status='draft'
+                status='draft',
+                generation_status='pending' if settings.TRIP_ENRICHMENT_ASYNC else 'ready'
             )
             
-            # Get destination coordinates and process departure location
-            get_destination_coordinates(trip)
-            process_departure_location(trip)
-            
-            # Calculate flight costs and allocate budget
-            trip.allocate_budget()
-            
-            # Generate itinerary
-            generate_itinerary(trip)
-            
-            # Get hotel suggestions
-            get_hotel_suggestions(trip)
-            
-            messages.success(request, f'Trip "{title}" created successfully!')
+            if settings.TRIP_ENRICHMENT_ASYNC:
+                # Geocoding, itinerary and hotels are filled in by run_trip_worker
+                with transaction.atomic():
+                    trip.save()
+                    jobs.enqueue(trip)
+                messages.success(request, f'Trip "{title}" created! We\'re putting your itinerary together.')
+            else:
+                # Geocode, allocate budget, then insert the trip with its itinerary and hotels
+                enrich_trip(trip)
+                messages.success(request, f'Trip "{title}" created successfully!')
             return redirect('trips:detail', trip_id=trip.id)
             
         except Exception as e:
@@ -143,13 +187,35 @@ def create_trip(request):
         'currencies': TripPlan.BUDGET_CURRENCIES
     })
 
+def trip_updated_at(request, trip_id):
+    """The trip's updated_at (None if it isn't the user's), looked up once per request"""
+    if not hasattr(request, '_trip_updated_at'):
+        request._trip_updated_at = TripPlan.objects.filter(
+            id=trip_id, user=request.user
+        ).values_list('updated_at', flat=True).first()
+    return request._trip_updated_at
+
+def trip_detail_etag(request, trip_id):
+    """ETag for the detail page; none while flash messages are waiting to be shown"""
+    updated_at = trip_updated_at(request, trip_id)
+    if updated_at is None or len(messages.get_messages(request)):
+        return None
+    return f'{settings.TRIP_PAGE_CACHE_VERSION}-{trip_id}-{versions.version_token(updated_at)}'
+
+def trip_detail_last_modified(request, trip_id):
+    if trip_detail_etag(request, trip_id) is None:
+        return None
+    return trip_updated_at(request, trip_id)
+
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=trip_detail_etag, last_modified_func=trip_detail_last_modified)
 def trip_detail(request, trip_id):
     """View trip details"""
     trip = get_object_or_404(TripPlan, id=trip_id, user=request.user)
     
-    # Get itinerary days
-    itinerary_days = trip.itinerary_days.all().order_by('day_number')
+    # Get itinerary days with their planned cost, and all their activities in one query
+    itinerary_days = trip.itinerary_days.with_planned_cost().prefetch_related('activities').order_by('day_number')
     
     # Get hotel suggestions
     hotels = trip.hotel_suggestions.all()[:5]  # Top 5 hotels
@@ -157,16 +223,32 @@ def trip_detail(request, trip_id):
     # Get points of interest
     pois = trip.points_of_interest.all()
     
+    # The querysets above are lazy: when the rendered content for this
+    # version is already cached, none of them hits the database
     context = {
         'trip': trip,
         'itinerary_days': itinerary_days,
         'hotels': hotels,
         'pois': pois,
         'google_maps_api_key': settings.GOOGLE_MAPS_API_KEY,
+        'page_version': versions.version_token(trip.updated_at),
+        'page_cache_ttl': settings.TRIP_PAGE_CACHE_TTL,
     }
     
     return render(request, 'trips/detail.html', context)
 
+@login_required
+def trip_status(request, trip_id):
+    """AJAX endpoint polled by the detail page while the itinerary is generated"""
+    trip = TripPlan.objects.filter(id=trip_id, user=request.user).values('generation_status').first()
+    if trip is None:
+        return JsonResponse({'error': 'Trip not found'}, status=404)
+    
+    return JsonResponse({
+        'generation_status': trip['generation_status'],
+        'ready': trip['generation_status'] == 'ready',
+    })
+
 @login_required
 def edit_trip(request, trip_id):
     """Edit an existing trip"""
@@ -195,231 +277,111 @@ def delete_trip(request, trip_id):
     
     return render(request, 'trips/delete_confirm.html', {'trip': trip})
 
+def trip_pdf_etag(request, trip_id):
+    """ETag for the PDF download, once the PDF for the trip's current version is on disk"""
+    updated_at = trip_updated_at(request, trip_id)
+    if updated_at is None or not pdf.pdf_path(trip_id, updated_at).exists():
+        return None
+    return f'pdf-{trip_id}-{pdf.pdf_version(updated_at)}'
+
+def trip_pdf_last_modified(request, trip_id):
+    if trip_pdf_etag(request, trip_id) is None:
+        return None
+    return trip_updated_at(request, trip_id)
+
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=trip_pdf_etag, last_modified_func=trip_pdf_last_modified)
 def download_pdf(request, trip_id):
-    """Download trip itinerary as PDF"""
+    """Download trip itinerary as PDF, rendered once per version of the trip"""
     trip = get_object_or_404(TripPlan, id=trip_id, user=request.user)
     
-    # This is a placeholder - PDF generation will be implemented later
-    messages.info(request, 'PDF download feature will be available soon!')
-    return redirect('trips:detail', trip_id=trip_id)
-
-def search_destinations(request):
-    """AJAX endpoint for destination search"""
-    query = request.GET.get('q', '').strip()
+    if trip.generation_status != 'ready':
+        messages.info(request, 'Your itinerary is still being generated. The PDF will be available once it is ready.')
+        return redirect('trips:detail', trip_id=trip_id)
     
-    if not query or len(query) < 3:
-        return JsonResponse({'results': []})
+    # Opened without checking first: rendering a newer version may delete this file at any moment,
+    # and once it is open the download no longer depends on it staying there
+    try:
+        handle = open(pdf.pdf_path(trip.id, trip.updated_at), 'rb')
+    except FileNotFoundError:
+        handle = None
     
-    # This is a placeholder - will implement with Google Places API
-    results = [
-        {'name': f'{query} City', 'country': 'Sample Country'},
-        {'name': f'New {query}', 'country': 'Another Country'},
-    ]
+    if handle is None:
+        if settings.TRIP_PDF_ASYNC:
+            # A render that already failed for this version would only fail again
+            if trip.jobs.filter(kind='render_pdf', status='failed', created_at__gte=trip.updated_at).exists():
+                messages.error(request, 'We couldn\'t create the PDF for this trip. Please try again after editing it.')
+                return redirect('trips:detail', trip_id=trip_id)
+            jobs.enqueue(trip, kind='render_pdf')
+            return render(request, 'trips/pdf_pending.html', {'trip': trip}, status=202)
+        
+        try:
+            handle = open(pdf.ensure_pdf(trip), 'rb')
+        except Exception as e:
+            messages.error(request, f'Failed to create the PDF: {str(e)}')
+            return redirect('trips:detail', trip_id=trip_id)
     
-    return JsonResponse({'results': results})
+    return FileResponse(
+        handle,
+        as_attachment=True,
+        filename=pdf.pdf_filename(trip),
+        content_type='application/pdf',
+    )
 
-def get_destination_coordinates(trip):
-    """Get coordinates for destination using Google Geocoding API"""
-    if not settings.GOOGLE_MAPS_API_KEY:
-        return
+@login_required
+def export_trips(request):
+    """Download all of the user's trips as a ZIP of JSON documents (plus rendered PDFs with ?pdfs=1)"""
+    pdfs = 'existing' if request.GET.get('pdfs') == '1' else None
     
-    try:
-        url = 'https://maps.googleapis.com/maps/api/geocode/json'
-        params = {
-            'address': trip.destination,
-            'key': settings.GOOGLE_MAPS_API_KEY
-        }
-        
-        response = requests.get(url, params=params)
-        data = response.json()
-        
-        if data['status'] == 'OK' and data['results']:
-            location = data['results'][0]['geometry']['location']
-            trip.latitude = location['lat']
-            trip.longitude = location['lng']
-            
-            # Extract city and country from address components
-            for component in data['results'][0]['address_components']:
-                types = component['types']
-                if 'locality' in types:
-                    trip.destination_city = component['long_name']
-                elif 'country' in types:
-                    trip.destination_country = component['long_name']
-            
-            trip.save()
-            
-    except Exception as e:
-        print(f"Failed to get coordinates: {e}")
+    # Built while it is sent, so the archive is never held in memory
+    response = StreamingHttpResponse(export.stream_zip(request.user, pdfs=pdfs), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="{export.archive_filename(request.user)}"'
+    response['Cache-Control'] = 'private, no-store'
+    return response
 
-def process_departure_location(trip):
-    """Process departure location and get coordinates if not provided"""
-    if not trip.departure_latitude or not trip.departure_longitude:
-        # Try to geocode departure location if coordinates not provided
-        if settings.GOOGLE_MAPS_API_KEY and trip.departure_location:
-            try:
-                url = 'https://maps.googleapis.com/maps/api/geocode/json'
-                params = {
-                    'address': trip.departure_location,
-                    'key': settings.GOOGLE_MAPS_API_KEY
-                }
-                
-                response = requests.get(url, params=params)
-                data = response.json()
-                
-                if data['status'] == 'OK' and data['results']:
-                    location = data['results'][0]['geometry']['location']
-                    trip.departure_latitude = location['lat']
-                    trip.departure_longitude = location['lng']
-                    
-                    # Extract city and country from address components
-                    for component in data['results'][0]['address_components']:
-                        types = component['types']
-                        if 'locality' in types:
-                            trip.departure_city = component['long_name']
-                        elif 'country' in types:
-                            trip.departure_country = component['long_name']
-                    
-                    trip.save()
-                    
-            except Exception as e:
-                print(f"Failed to geocode departure location: {e}")
-    else:
-        # If coordinates are provided but no city/country, try reverse geocoding
-        if settings.GOOGLE_MAPS_API_KEY and not trip.departure_city:
-            try:
-                url = 'https://maps.googleapis.com/maps/api/geocode/json'
-                params = {
-                    'latlng': f'{trip.departure_latitude},{trip.departure_longitude}',
-                    'key': settings.GOOGLE_MAPS_API_KEY
-                }
-                
-                response = requests.get(url, params=params)
-                data = response.json()
-                
-                if data['status'] == 'OK' and data['results']:
-                    # Extract city and country from address components
-                    for component in data['results'][0]['address_components']:
-                        types = component['types']
-                        if 'locality' in types:
-                            trip.departure_city = component['long_name']
-                        elif 'country' in types:
-                            trip.departure_country = component['long_name']
-                    
-                    trip.save()
-                    
-            except Exception as e:
-                print(f"Failed to reverse geocode departure coordinates: {e}")
+@login_required
+@require_POST
+def rotate_calendar_feed(request):
+    """Replace the user's calendar feed URL; calendars subscribed to the old one stop updating"""
+    ical.rotate_feed_token(request.user.id)
+    messages.success(request, 'Your calendar feed has a new link. Subscribe to it again in your calendar app.')
+    return redirect('trips:dashboard')
 
-def generate_itinerary(trip):
-    """Generate daily itinerary for the trip"""
-    # Create basic itinerary days
-    current_date = trip.start_date
-    
-    for day_num in range(1, trip.days_count + 1):
-        ItineraryDay.objects.create(
-            trip=trip,
-            day_number=day_num,
-            date=current_date,
-            title=f"Day {day_num} in {trip.destination_city or trip.destination}",
-            activities=json.dumps([
-                {
-                    'time': '09:00',
-                    'activity': 'Breakfast and hotel check-out' if day_num > 1 else 'Arrival and hotel check-in',
-                    'location': 'Hotel',
-                    'duration': 60,
-                    'cost': trip.daily_budget * 0.1
-                },
-                {
-                    'time': '11:00',
-                    'activity': 'Explore local attractions',
-                    'location': 'City Center',
-                    'duration': 180,
-                    'cost': trip.daily_budget * 0.4
-                },
-                {
-                    'time': '14:00',
-                    'activity': 'Lunch at local restaurant',
-                    'location': 'Downtown',
-                    'duration': 90,
-                    'cost': trip.daily_budget * 0.2
-                },
-                {
-                    'time': '16:00',
-                    'activity': 'Afternoon sightseeing',
-                    'location': 'Tourist Area',
-                    'duration': 120,
-                    'cost': trip.daily_budget * 0.2
-                },
-                {
-                    'time': '19:00',
-                    'activity': 'Dinner and evening leisure',
-                    'location': 'Restaurant District',
-                    'duration': 120,
-                    'cost': trip.daily_budget * 0.1
-                }
-            ]),
-            estimated_cost=trip.daily_budget
+def calendar_feed_trips(request, token):
+    """(id, updated_at) of the feed owner's trips, None for a bad token; looked up once per request"""
+    if not hasattr(request, '_calendar_feed_trips'):
+        user_id = ical.user_for_token(token)
+        request._calendar_feed_trips = None if user_id is None else list(
+            TripPlan.objects.filter(user_id=user_id).order_by('start_date', 'id').values_list('id', 'updated_at')
         )
-        
-        current_date += timedelta(days=1)
+    return request._calendar_feed_trips
 
-def get_hotel_suggestions(trip):
-    """Get hotel suggestions using Google Places API"""
-    if not settings.GOOGLE_MAPS_API_KEY or not trip.latitude or not trip.longitude:
-        # Create sample hotel suggestions
-        sample_hotels = [
-            {
-                'name': f'Grand Hotel {trip.destination_city or trip.destination}',
-                'address': f'123 Main Street, {trip.destination}',
-                'rating': 4.5,
-                'price_per_night': trip.daily_budget * 0.4,
-            },
-            {
-                'name': f'Budget Inn {trip.destination_city or trip.destination}',
-                'address': f'456 Budget Ave, {trip.destination}',
-                'rating': 3.8,
-                'price_per_night': trip.daily_budget * 0.2,
-            },
-            {
-                'name': f'Luxury Resort {trip.destination_city or trip.destination}',
-                'address': f'789 Luxury Blvd, {trip.destination}',
-                'rating': 4.8,
-                'price_per_night': trip.daily_budget * 0.6,
-            }
-        ]
-        
-        for hotel_data in sample_hotels:
-            HotelSuggestion.objects.create(
-                trip=trip,
-                **hotel_data
-            )
-        return
+def calendar_feed_etag(request, token):
+    trips = calendar_feed_trips(request, token)
+    return None if trips is None else ical.feed_etag(trips)
+
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=calendar_feed_etag)
+def calendar_feed(request, token):
+    """iCalendar subscription feed of the user's trips; the signed token in the URL stands in for a login"""
+    trips = calendar_feed_trips(request, token)
+    if trips is None:
+        raise Http404('Unknown calendar feed')
+    
+    # Calendar apps poll this; unchanged feeds were already answered with 304 above
+    return HttpResponse(ical.feed(trips), content_type='text/calendar; charset=utf-8')
+
+def search_destinations(request):
+    """AJAX endpoint for destination autocomplete, served from the in-memory gazetteer"""
+    query = request.GET.get('q', '').strip()
+    
+    if not query or len(query) < 2:
+        return JsonResponse({'results': []})
     
     try:
-        # Use Google Places API to find hotels
-        url = 'https://maps.googleapis.com/maps/api/place/nearbysearch/json'
-        params = {
-            'location': f'{trip.latitude},{trip.longitude}',
-            'radius': '5000',  # 5km radius
-            'type': 'lodging',
-            'key': settings.GOOGLE_MAPS_API_KEY
-        }
-        
-        response = requests.get(url, params=params)
-        data = response.json()
-        
-        if data['status'] == 'OK':
-            for place in data['results'][:10]:  # Top 10 results
-                HotelSuggestion.objects.create(
-                    trip=trip,
-                    name=place['name'],
-                    address=place.get('vicinity', ''),
-                    rating=place.get('rating'),
-                    latitude=place['geometry']['location']['lat'],
-                    longitude=place['geometry']['location']['lng'],
-                    google_place_id=place['place_id']
-                )
-                
-    except Exception as e:
-        print(f"Failed to get hotel suggestions: {e}")
+        limit = min(int(request.GET.get('limit', 10)), 25)
+    except ValueError:
+        limit = 10
+    
+    return JsonResponse({'results': gazetteer.search(query, limit=max(limit, 1))})